@@ -1,10 +1,245 @@
 import requests as rq
+import requests.adapters as rqa
 import urllib.robotparser as rp
+import urllib.parse as up
 import bs4
+import lxml.html
+import lxml.etree
 import re
 import time as tm
 import csv
 import sys
+import threading
+import collections
+import collections.abc
+import argparse
+import concurrent.futures as cf
+import functools
+import hashlib
+import os
+import tempfile
+import shutil
+import sqlite3
+import json
+import random
+import gzip
+import bisect
+import contextlib
+import email.utils
+import multiprocessing
+import heapq
+import math
+import string
+
+
+
+class Metriques:
+    """
+    Comptadors i histogrames de temps del crawl, per etapa (robots, connexió, transferència,
+    anàlisi, espera...) i per host. Quan estan desactivades, totes les crides retornen de seguida
+    sense desar res.
+    """
+    # Límits superiors (en segons) dels intèrvals dels histogrames de temps
+    LIMITS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, float('inf'))
+    # Etapes que es mesuren dins d'una altra i que, per tant, no se sumen al temps de treball
+    ETAPES_INTERNES = ('duplicats',)
+
+    def __init__(self, activa = False):
+        """
+        Retorna un objecte de classe Metriques amb els atributs següents:
+            activa : si val False (valor per defecte), no es desa cap mesura
+            t_inici : temps (time.perf_counter()) en què s'han activat les mètriques
+            comptadors : diccionari {(nom, etiquetes) : valor}
+            histogrames : diccionari {(nom, etiquetes) : [recomptes per intèrval, suma, màxim]}
+        on etiquetes és una tupla ordenada de parells (etiqueta, valor), com ara (('host', ...),).
+        """
+        self.activa = False
+        self.t_inici = None
+        self.comptadors = collections.Counter()
+        self.histogrames = {}
+        self._bloqueig = threading.Lock()
+        if activa:
+            self.activa_metriques()
+
+    def activa_metriques(self):
+        """
+        Activa les mètriques i fixa l'inici del temps de l'execució.
+        """
+        self.t_inici = tm.perf_counter()
+        self.activa = True
+
+    @staticmethod
+    def _etiquetes(url, etiquetes):
+        if url is not None:
+            etiquetes['host'] = CauRobots.clau(url)
+        return tuple(sorted((k, str(v)) for k, v in etiquetes.items()))
+
+    def compta(self, nom, valor = 1, url = None, **etiquetes):
+        """
+        Suma valor al comptador nom. Si s'indica url, el comptador és per al host de url; la resta
+        d'arguments amb nom són etiquetes addicionals (per exemple, codi = 200).
+        """
+        if not self.activa:
+            return
+        clau = (nom, self._etiquetes(url, etiquetes))
+        with self._bloqueig:
+            self.comptadors[clau] += valor
+
+    def observa(self, nom, segons, url = None, **etiquetes):
+        """
+        Afegeix una durada de segons segons a l'histograma de l'etapa nom (per host de url, si
+        s'indica, i amb les etiquetes addicionals que s'indiquin).
+        """
+        if not self.activa:
+            return
+        clau = (nom, self._etiquetes(url, etiquetes))
+        i = bisect.bisect_left(self.LIMITS, segons)
+        with self._bloqueig:
+            histograma = self.histogrames.get(clau)
+            if histograma is None:
+                histograma = [[0]*len(self.LIMITS), 0.0, 0.0]
+                self.histogrames[clau] = histograma
+            histograma[0][i] += 1
+            histograma[1] += segons
+            histograma[2] = max(histograma[2], segons)
+
+    def mesura(self, nom, url = None, **etiquetes):
+        """
+        Retorna un gestor de context que afegeix a l'histograma de l'etapa nom el temps que triga
+        a executar-se el bloc with. Si les mètriques estan desactivades, no mesura res.
+        """
+        if not self.activa:
+            return _MESURA_NULA
+        return self._mesura(nom, url, etiquetes)
+
+    @contextlib.contextmanager
+    def _mesura(self, nom, url, etiquetes):
+        t_inici = tm.perf_counter()
+        try:
+            yield
+        finally:
+            self.observa(nom, tm.perf_counter() - t_inici, url, **etiquetes)
+
+    def _quantil(self, recomptes, quantil):
+        # Límit superior de l'intèrval de l'histograma on cau el quantil
+        objectiu = quantil*sum(recomptes)
+        acumulat = 0
+        for limit, recompte in zip(self.LIMITS, recomptes):
+            acumulat += recompte
+            if acumulat >= objectiu:
+                return limit
+        return self.LIMITS[-1]
+
+    def informe(self):
+        """
+        Retorna un diccionari amb el resum de les mètriques:
+            'Temps total (s)' : temps transcorregut des de l'activació de les mètriques
+            'Temps d'espera (s)' : suma dels temps d'espera dels temporitzadors (etapa 'espera')
+            'Temps de treball (s)' : suma dels temps de la resta d'etapes (excepte les de
+                                     ETAPES_INTERNES)
+            'Etapes' : {etapa : {'Nombre', 'Total (s)', 'Mitjana (s)', 'p95 (s)', 'Màxim (s)'}},
+                       amb tots els hosts agregats (el p95 és el límit de l'intèrval de
+                       l'histograma on cau)
+            'Hosts' : {host : {etapa : {...}}}, amb el mateix format
+            'Comptadors' : {nom : {etiquetes en text : valor}}
+        Les etapes que s'executen en paral·lel en diversos fils poden sumar més temps que el total.
+        """
+        with self._bloqueig:
+            histogrames = {clau: [list(h[0]), h[1], h[2]] for clau, h in self.histogrames.items()}
+            comptadors = dict(self.comptadors)
+
+        def agrega(agregat, clau, histograma):
+            if clau not in agregat:
+                agregat[clau] = [[0]*len(self.LIMITS), 0.0, 0.0]
+            agregat[clau][0] = [a + b for a, b in zip(agregat[clau][0], histograma[0])]
+            agregat[clau][1] += histograma[1]
+            agregat[clau][2] = max(agregat[clau][2], histograma[2])
+
+        def resumeix(histograma):
+            nombre = sum(histograma[0])
+            return {'Nombre': nombre, 'Total (s)': histograma[1],
+                    'Mitjana (s)': histograma[1]/nombre if nombre else 0,
+                    'p95 (s)': self._quantil(histograma[0], 0.95), 'Màxim (s)': histograma[2]}
+
+        etapes = {}
+        hosts = {}
+        for (nom, etiquetes), histograma in histogrames.items():
+            agrega(etapes, nom, histograma)
+            host = dict(etiquetes).get('host')
+            if host:
+                agrega(hosts.setdefault(host, {}), nom, histograma)
+
+        resultat_comptadors = {}
+        for (nom, etiquetes), valor in sorted(comptadors.items()):
+            text_etiquetes = ','.join('{}={}'.format(k, v) for k, v in etiquetes)
+            resultat_comptadors.setdefault(nom, {})[text_etiquetes] = valor
+
+        temps_espera = etapes['espera'][1] if 'espera' in etapes else 0
+        return {'Temps total (s)': tm.perf_counter() - self.t_inici if self.t_inici else 0,
+                "Temps d'espera (s)": temps_espera,
+                'Temps de treball (s)': sum(h[1] for nom, h in etapes.items()
+                                            if nom not in self.ETAPES_INTERNES) - temps_espera,
+                'Etapes': {nom: resumeix(h) for nom, h in sorted(etapes.items())},
+                'Hosts': {host: {nom: resumeix(h) for nom, h in sorted(etapes_host.items())}
+                          for host, etapes_host in sorted(hosts.items())},
+                'Comptadors': resultat_comptadors}
+
+    def text_prometheus(self, prefix = 'scraper'):
+        """
+        Retorna les mètriques en el format de text d'exposició de Prometheus: un comptador
+        <prefix>_<nom>_total per a cada comptador i l'histograma <prefix>_etapa_segons amb
+        l'etiqueta etapa.
+        """
+        def text_etiquetes(etiquetes):
+            if not etiquetes:
+                return ''
+            return '{' + ','.join('{}="{}"'.format(k, v.replace('\\', '\\\\').replace('"', '\\"'))
+                                  for k, v in etiquetes) + '}'
+
+        with self._bloqueig:
+            histogrames = sorted((clau, [list(h[0]), h[1], h[2]]) for clau, h in self.histogrames.items())
+            comptadors = sorted(self.comptadors.items())
+
+        linies = []
+        nom_anterior = None
+        for (nom, etiquetes), valor in comptadors:
+            nom_metrica = '{}_{}_total'.format(prefix, nom)
+            if nom != nom_anterior:
+                linies.append('# TYPE {} counter'.format(nom_metrica))
+                nom_anterior = nom
+            linies.append('{}{} {}'.format(nom_metrica, text_etiquetes(etiquetes), valor))
+
+        nom_metrica = prefix + '_etapa_segons'
+        if histogrames:
+            linies.append('# TYPE {} histogram'.format(nom_metrica))
+        for (nom, etiquetes), (recomptes, suma, maxim) in histogrames:
+            etiquetes = (('etapa', nom),) + etiquetes
+            acumulat = 0
+            for limit, recompte in zip(self.LIMITS, recomptes):
+                acumulat += recompte
+                le = '+Inf' if limit == float('inf') else repr(limit)
+                linies.append('{}_bucket{} {}'.format(nom_metrica, text_etiquetes(etiquetes + (('le', le),)),
+                                                      acumulat))
+            linies.append('{}_sum{} {}'.format(nom_metrica, text_etiquetes(etiquetes), suma))
+            linies.append('{}_count{} {}'.format(nom_metrica, text_etiquetes(etiquetes), acumulat))
+        return '\n'.join(linies) + '\n'
+
+    def desa_prometheus(self, cami, prefix = 'scraper'):
+        """
+        Desa text_prometheus() a l'arxiu cami (per exemple, per al node_exporter de Prometheus),
+        reemplaçant-lo atòmicament.
+        """
+        with open(cami + '.part', 'w', encoding = 'utf-8') as f:
+            f.write(self.text_prometheus(prefix))
+        os.replace(cami + '.part', cami)
+
+
+
+# Gestor de context buit que retorna Metriques.mesura() quan les mètriques estan desactivades
+_MESURA_NULA = contextlib.nullcontext()
+
+# Mètriques compartides per defecte per tot el mòdul (desactivades si no s'activen explícitament)
+metriques = Metriques()
 
 
 
@@ -12,7 +247,7 @@ class Temporitzador:
     """
     Temporitzador per a espaiar descàrregues de llocs web.
     """
-    def __init__(self, temps_espera, tipus = 'relatiu'):
+    def __init__(self, temps_espera, tipus = 'relatiu', host = None):
         """
         Retorna un objecte de classe Temporitzador amb els atributs següents:
             darrer_fi_espera : temps d'época (mòdul time) en segons en què va acabar la darrera
@@ -26,10 +261,14 @@ class Temporitzador:
                     serà temps_espera a partir del moment de la crida al mètode espera().
             temps_espera : valor per defecte del temps d'espera (pot ser canviat puntualment a cada
                            crida del mètode espera()). Valors negatius desactiven el temporitzador.
+            host : host (esquema://host) a què s'atribueixen les esperes a les mètriques, o None
         """
         self.temps_espera = temps_espera
         self.tipus = tipus
+        self.host = host
         self.darrer_fi_espera = None
+        # Bloqueig per a que diversos fils que comparteixen el temporitzador esperin per torns
+        self._bloqueig = threading.Lock()
 
     def espera(self, temps_espera = None, tipus = None):
         """
@@ -37,6 +276,10 @@ class Temporitzador:
         especificat en temps_espera, segons el tipus de funcionament especificat per defecte al
         constructor de la classe o el mètode especificat a tipus. 
         """
+        with self._bloqueig:
+            self._espera(temps_espera, tipus)
+
+    def _espera(self, temps_espera, tipus):
         # Si hi ha valors puntuals per a temps_espera o tipus, els emprem en comptes
         #d els valors per defecte. Sinó, emprem els valors per defecte 
         if temps_espera == None:
@@ -63,251 +306,2117 @@ class Temporitzador:
 
         if segons_espera > 0:
             tm.sleep(segons_espera)
+            metriques.observa('espera', segons_espera, url = self.host)
 
         # Desem el moment de fi d'espera per a ús o referència futures
         self.darrer_fi_espera = tm.time()
 
 
 
-def descarrega_url(url, intents = 5, timeout = 10, agent_usuari = 'ua0000', retorna = 'text'):
+class SessioHTTP:
     """
-    Funció que obté els continguts del lloc web indicat per url, si aquest no està desabilitat al fitxer robots.txt
+    Sessió HTTP reutilitzable amb connexions persistents (keep-alive) agrupades per host.
+    """
+    def __init__(self, agent_usuari = 'ua0000', mida_pool = 10, mides_pool_host = None):
+        """
+        Retorna un objecte de classe SessioHTTP amb els atributs següents:
+            agent_usuari : agent usuari per defecte de les peticions GET
+            mida_pool : nombre màxim de connexions obertes per host (valor per defecte, 10)
+            mides_pool_host : diccionari {esquema://host : mida_pool} per a fixar una mida de
+                              pool diferent per a hosts concrets
+            sessio : objecte requests.Session que manté obertes les connexions entre peticions
+        Les peticions negocien compressió gzip/deflate i mantenen viva la connexió.
+        """
+        self.agent_usuari = agent_usuari
+        self.mida_pool = mida_pool
+        self.mides_pool_host = dict(mides_pool_host) if mides_pool_host else {}
 
-    Arguments:
-        url          : url del lloc web del qual obtenir-ne els continguts
-        intents      : nombre d'intents si s'obté un codi de resposta diferent de 200 (per defecte 5 vegades)
-        timeout      : temps màxim durant el qual s'espera resposta del servidor (per defecte 1s)
-        agent_usuari : agent usuari per a la petició GET (per defecte 'ua00')
-        retorna      : format de les dades a retornar, text o binari. Valor per defecte, 'text'. Qualsevol
-                       altre valor fa que es retornin en format binari
-    Retorna:
-        contingut      : dades obtingudes com a resposta del lloc url a la petició GET. No tenen perquè ser codi html,
-                         poden ser una imatge, un arxiu pdf o qualsevol altre conjunt de dades binàries o text.
-        codi_error     :
-                         * 0 si no hi ha hagut cap error
-                         * -1 si el lloc web està prohibit per robots.txt
-                         * -2 si s'ha superat el timeout especificat
-                         * -3 si hi ha hagut algun altre error de transmissió
-                         * el nombre d'error del protocol HTTP si s'ha produït aquest error (si l'error és del
-                           servidor (codis 500 a 599) la funció genera automàticament intents reintents per a mirar
-                           d'obtenir una transmissió correcta)
-        missatge_error : missatge d'error explicatiu de l'error obtingut
-    
-    Nota: Només es generen reintents quan hi ha un error de servidor. Quan hi ha errors de transmissió o de
-    timeout, cal fer la gestió de reintents externament.
-        
+        self.sessio = rq.Session()
+        self.sessio.headers.update({'User-agent': agent_usuari,
+                                    'Accept-Encoding': 'gzip, deflate',
+                                    'Connection': 'keep-alive'})
+        adaptador = rqa.HTTPAdapter(pool_connections = mida_pool, pool_maxsize = mida_pool)
+        self.sessio.mount('http://', adaptador)
+        self.sessio.mount('https://', adaptador)
+        for host, mida in self.mides_pool_host.items():
+            self.sessio.mount(host.rstrip('/') + '/',
+                              rqa.HTTPAdapter(pool_connections = 1, pool_maxsize = mida))
+
+    def get(self, url, timeout = 10, agent_usuari = None, capcalera = None, **kwargs):
+        """
+        Fa una petició GET a url a través de la sessió. Si s'indica agent_usuari, substitueix
+        l'agent usuari per defecte per a aquesta petició; capcalera permet afegir-hi capçaleres.
+        La resta d'arguments es passen a requests.Session.get().
+        """
+        capcalera = dict(capcalera) if capcalera else {}
+        if agent_usuari:
+            capcalera['User-agent'] = agent_usuari
+        return self.sessio.get(url, timeout = timeout, headers = capcalera, **kwargs)
+
+    def tanca(self):
+        """
+        Tanca totes les connexions obertes de la sessió.
+        """
+        self.sessio.close()
+
+
+
+# Sessió HTTP compartida per defecte per totes les funcions de descàrrega
+sessio_per_defecte = SessioHTTP()
+
+
+
+class CauRobots:
+    """
+    Cau compartida de fitxers robots.txt, indexada per esquema i host.
     """
+    def __init__(self, ttl = 3600, timeout = 10, sessio = None):
+        """
+        Retorna un objecte de classe CauRobots amb els atributs següents:
+            ttl : temps en segons durant el qual es considera vàlid un robots.txt descarregat.
+                  Passat aquest temps, es torna a descarregar a la propera consulta del host.
+                  Valors negatius fan que no caduquin mai.
+            timeout : temps màxim en segons d'espera de resposta del servidor en descarregar
+                      el fitxer robots.txt
+            sessio : objecte SessioHTTP amb què es descarreguen els robots.txt. Si és None,
+                     s'empra sessio_per_defecte
+            encerts : nombre de consultes resoltes amb un robots.txt de la cau
+            errades : nombre de consultes que han requerit descarregar el robots.txt
+            robots : diccionari {esquema://host : (objecte RobotFileParser, temps de descàrrega)}
+        """
+        self.ttl = ttl
+        self.timeout = timeout
+        self.sessio = sessio
+        self.encerts = 0
+        self.errades = 0
+        self.robots = {}
+        self._bloqueig = threading.Lock()
+        self._bloquejos_host = {}
 
-    # Comprovem si podem accedir a la pàgina al fitxer robots.txt. Si no podem,
-    # generem un error i retornem sense accedir-hi
-    robot = rp.RobotFileParser()
-    robot.set_url('http://www.uoc.org/robots.txt')
-    robot.read()
-    if not robot.can_fetch(agent_usuari, url):
-        contingut = None
-        codi_error = -1
-        missatge_error = "Lloc web prohibit per robots.txt"
-        return contingut, codi_error, missatge_error
-    
-    # Fem una petició de la pàgina web especificada pel paràmetre url
-    try:
-        capcalera = {'User-agent': agent_usuari}
-        
-        t_inici_peticio = tm.time()
-        pagina = rq.get(url, timeout = timeout, headers = capcalera)
-        t_fi_peticio = tm.time()
-        # Desem el temps de resposta per si cal repetir la petició si hi ha errors de servidor
-        t_resposta = t_fi_peticio - t_inici_peticio
-        
-    except rq.exceptions.Timeout:
-        # Si s'ha superat el time-out sense resposta, retornem un error i sortim
-        contingut = None
-        codi_error = -2
-        missatge_error = "S'ha superat el timeout especificat ({} s)".format(timeout)
-        return contingut, codi_error, missatge_error
+    @staticmethod
+    def clau(url):
+        """
+        Retorna la clau de la cau (esquema://host) corresponent a url.
+        """
+        components = up.urlsplit(url)
+        return components.scheme.lower() + '://' + components.netloc.lower()
 
-    except:
-        # Si hi ha hagut algun altre problema inidentificat, retornem un error i sortim
-        contingut = None
-        codi_error = -3
-        missatge_error = "Hi ha hagut un problema inidentificat amb la connexió"
-        return contingut, codi_error, missatge_error
+    def _descarrega(self, clau):
+        """
+        Descarrega i interpreta el robots.txt del host indicat per clau. Segueix el mateix
+        criteri que RobotFileParser.read(): els codis 401 i 403 prohibeixen tot el lloc i la resta
+        d'errors 4xx el permeten tot. Els errors de servidor, que poden ser transitoris, generen
+        una excepció requests.exceptions.HTTPError, i els errors de connexió una excepció de
+        requests. En tots dos casos no es desa res a la cau.
+        """
+        robot = rp.RobotFileParser()
+        robot.set_url(clau + '/robots.txt')
+        sessio = self.sessio if self.sessio else sessio_per_defecte
+        resposta = sessio.get(clau + '/robots.txt', timeout = self.timeout)
+        if resposta.status_code in (401, 403):
+            robot.disallow_all = True
+        elif 400 <= resposta.status_code < 500:
+            robot.allow_all = True
+        elif resposta.status_code != 200:
+            raise rq.exceptions.HTTPError("S'ha produït l'error HTTP {} en obtenir el robots.txt".format(
+                                          resposta.status_code), response = resposta)
+        else:
+            robot.parse(resposta.text.splitlines())
+        return robot
 
-    # Si hi ha hagut un error de servidor (i intents>0), repetim recursivament fins
-    # a intents vegades la petició, a veure si l'error desapareix
-    if (intents>0) and (500<=pagina.status_code<600):
-        # Esperem un temps equivalent a 10 vegades el temps de resposta i tornem a iniciar
-        # el procés
-        print(intents)
-        temporitzador = Temporitzador(10*t_resposta,'absolut') 
-        temporitzador.espera()
-        
-        return descarrega_url(url, intents = intents-1, timeout = timeout)
+    def obte(self, url):
+        """
+        Retorna l'objecte RobotFileParser del host de url, descarregant-lo només si no és a la
+        cau o si ha caducat.
+        """
+        clau = self.clau(url)
+        with self._bloqueig:
+            entrada = self.robots.get(clau)
+            if entrada and (self.ttl < 0 or tm.time() - entrada[1] < self.ttl):
+                self.encerts += 1
+                return entrada[0]
+            bloqueig_host = self._bloquejos_host.setdefault(clau, threading.Lock())
 
-    # Si hi ha qualsevol error o imprevist detectat pel servidor, retornem un error i sortim
-    if pagina.status_code!=200:
-        contingut = None
-        codi_error = pagina.status_code
-        missatge_error = "S'ha produït l'error HTTP {}".format(pagina.status_code)
-        return contingut, codi_error, missatge_error
+        # La descàrrega es fa amb el bloqueig del host pres perquè diversos fils que consulten
+        # el mateix host no descarreguin el robots.txt alhora, sense bloquejar les consultes
+        # dels altres hosts
+        with bloqueig_host:
+            with self._bloqueig:
+                entrada = self.robots.get(clau)
+                if entrada and (self.ttl < 0 or tm.time() - entrada[1] < self.ttl):
+                    # Un altre fil l'ha descarregat mentre esperàvem
+                    self.encerts += 1
+                    return entrada[0]
+                self.errades += 1
+            with metriques.mesura('robots', url = clau):
+                robot = self._descarrega(clau)
+            with self._bloqueig:
+                self.robots[clau] = (robot, tm.time())
+            return robot
+
+    def pot_descarregar(self, agent_usuari, url):
+        """
+        Retorna True si el robots.txt del host de url permet a agent_usuari accedir-hi.
+        """
+        return self.obte(url).can_fetch(agent_usuari, url)
+
+    def crawl_delay(self, agent_usuari, url):
+        """
+        Retorna el valor de la directiva Crawl-delay del robots.txt del host de url per a
+        agent_usuari, o 0 si no n'hi ha (o si no s'ha pogut obtenir el robots.txt).
+        """
+        try:
+            retard = self.obte(url).crawl_delay(agent_usuari)
+        except rq.exceptions.RequestException:
+            return 0
+        return float(retard) if retard else 0
+
+    def estadistiques(self):
+        """
+        Retorna un diccionari amb els comptadors d'encerts i errades de la cau.
+        """
+        return {'encerts': self.encerts, 'errades': self.errades, 'hosts': len(self.robots)}
 
-    # Finalment, si no hi ha hagut errors, retornem un codi d'error 0 i el contingut.
-    # Si retorna val 'text', es retorna el contingut en format text. Sinó (si val 'binari',
-    # per exemple), es retorna el contingut binari
-    contingut = pagina.text if retorna == 'text' else pagina.content
-    codi_error = 0
-    missatge_error = None
-    return contingut, codi_error, missatge_error
 
 
+# Cau de robots.txt compartida per defecte per totes les crides a descarrega_url()
+cau_robots = CauRobots()
 
-def descarrega_pdf(url, nom_directori = ".\\", nom_arxiu = None, intents = 5, timeout = 10, agent_usuari = 'ua0000'):
+
+
+class RespostaLocal:
     """
-    Funció que descarrega un document en format pdf de l'adreça directa indicada
-    i el desa al directori i amb el nom de fitxer indicats. Empra descarrega_url().
-    Arguments:
-        url : url de l'arxiu en format pdf (o qualsevol altre format binari) 
-              a descarregar
-        nom_directori : nom del directori (existent) on desar l'arxiu. Per defecte,
-                        ".\"
-        nom_arxiu : nom de l'arxiu on es desarà el document. Si no s'indica, es
-                    deduix de la url
-        intents, timeout, agent_usuari : paràmetre que es passen a descarrega_url()
-     Retorna:
-         codi_error, missatge_error : fornits per descarrega_url()
+    Resposta HTTP servida des de disc o memòria en comptes de la xarxa, amb la mateixa interfície
+    que els objectes resposta de requests que empren les funcions de descàrrega.
     """
+    def __init__(self, url, cos = None, cami = None, status_code = 200, headers = None, encoding = None):
+        """
+        Retorna un objecte de classe RespostaLocal amb els atributs següents:
+            url : url de la resposta
+            status_code : codi d'estat HTTP
+            headers : diccionari de capçaleres HTTP
+            encoding : codificació del text del cos
+        El cos de la resposta és cos (bytes) o, si és None, el contingut de l'arxiu cami, que
+        només es llegeix quan cal.
+        """
+        self.url = url
+        self.status_code = status_code
+        self.headers = rq.structures.CaseInsensitiveDict(headers if headers else {})
+        self.encoding = encoding
+        self._cos = cos
+        self._cami = cami
 
-    # Aprofitem la funció descarrega pàgina per a baixar els continguts del
-    # dcoument en format binari
-    doc_pdf, codi_error, missatge_error = descarrega_url(url,
-                                                         intents = intents,
-                                                         timeout = timeout,
-                                                         agent_usuari = agent_usuari, 
-                                                         retorna = 'binari')
-   
-    # Si hi ha hagut algun problema amb la descàrrega del document, retornem
-    # el codi d'error adient i p
-    if codi_error:
-        return codi_error, missatge_error
+    @property
+    def content(self):
+        if self._cos is None:
+            with open(self._cami, 'rb') as f:
+                self._cos = f.read()
+        return self._cos
 
-    # Si no donem un nom, l'inferim de l'adreça url
-    if not nom_arxiu:
-        nom_arxiu = re.sub(r"\A.+/",'', url)
-        
-    # Desem el document pdf
-    with open(nom_directori + nom_arxiu, 'wb') as f:
-        f.write(doc_pdf)
-        
-    return codi_error, missatge_error
+    @property
+    def text(self):
+        return str(self.content, self.encoding if self.encoding else 'utf-8', errors = 'replace')
 
-        
+    def iter_content(self, chunk_size = 65536):
+        if self._cos is not None:
+            for i in range(0, len(self._cos), chunk_size):
+                yield self._cos[i:i+chunk_size]
+        else:
+            with open(self._cami, 'rb') as f:
+                for bloc in iter(lambda: f.read(chunk_size), b''):
+                    yield bloc
+
+    def close(self):
+        pass
 
-def crawlscrape_url_principal():
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+
+class CauHTTP:
     """
-    Funció que retorna una llista amb les adreces de les pàgines web de cadascun dels graus
-    que oferta la UPC, per al seu crawling/scraping posterior.
-    
-    Retorna:
-        graus          : llista amb les url de les pàgines web de cadascun dels graus que oferta la UPC.
-                         Si hi ha hagut algun error, retorna una llista buida
-        codi_error     : codi d'error de la funció descarrega_url()
-        missatge_error : missatge d'error de la funció descarrega_url()
+    Cau de respostes HTTP a disc amb revalidació condicional (ETag / Last-Modified) i
+    expulsió de les entrades menys usades recentment (LRU) quan se supera una mida màxima.
     """
-    
-    html, codi_error, missatge_error = descarrega_url('https://www.upc.edu/ca/graus/',
-                                                      timeout = 10, retorna = 'binari')
+    def __init__(self, directori, mida_maxima = 2*1024**3):
+        """
+        Retorna un objecte de classe CauHTTP amb els atributs següents:
+            directori : directori on es desen els cossos de les respostes i l'índex (index.sqlite).
+                        Es crea si no existeix
+            mida_maxima : mida màxima en bytes del conjunt de cossos desats (per defecte, 2 GiB)
+            encerts : nombre de respostes 304 servides des de la cau
+            revalidacions : nombre de peticions condicionals enviades
+            errades : nombre de peticions d'url que no eren a la cau
+            bytes_estalviats : bytes que no s'han hagut de descarregar gràcies a la cau
+        """
+        self.directori = directori
+        self.mida_maxima = mida_maxima
+        self.encerts = 0
+        self.revalidacions = 0
+        self.errades = 0
+        self.bytes_estalviats = 0
+        self._bloqueig = threading.Lock()
 
-    if codi_error:
-        # Si hi ha hagut algun error, retornem una llista buida
-        graus = []
-        return graus, codi_error, missatge_error
-    
-    # Creem un objecte de BeautifulSoup emprant el parser HTML, "lxml" de la llibreria lxml, instalada.
-    # Com a alternativa es pot emprar el parser "html.parser" de la llibreria estàndard de Python,
-    # més lent
-    bs_UPC = bs4.BeautifulSoup(html,'lxml')
+        os.makedirs(directori, exist_ok = True)
+        self._bd = sqlite3.connect(os.path.join(directori, 'index.sqlite'), check_same_thread = False)
+        self._bd.execute("""CREATE TABLE IF NOT EXISTS entrades (
+                                url TEXT PRIMARY KEY,
+                                etag TEXT,
+                                last_modified TEXT,
+                                codificacio TEXT,
+                                mida INTEGER,
+                                darrer_acces REAL)""")
+        self._bd.execute("CREATE INDEX IF NOT EXISTS idx_darrer_acces ON entrades (darrer_acces)")
+        self._bd.commit()
 
-    # Obeneim els tags dels grups de graus
-    tags_grups = bs_UPC.body.find_all('div', id = re.compile('collapse-images-collapse'))
+    def _cami(self, url):
+        return os.path.join(self.directori, hashlib.sha256(url.encode('utf-8')).hexdigest())
 
-    # Obtenim els graus a dins de cada grup
-    graus_aux = [x.find_all('li') for x in tags_grups]
+    def capcaleres_condicionals(self, url):
+        """
+        Retorna el diccionari de capçaleres If-None-Match / If-Modified-Since per a revalidar
+        l'entrada de url, o un diccionari buit si url no és a la cau.
+        """
+        with self._bloqueig:
+            fila = self._bd.execute("SELECT etag, last_modified FROM entrades WHERE url = ?",
+                                    (url,)).fetchone()
+            if not fila:
+                self.errades += 1
+                return {}
+            self.revalidacions += 1
+        capcalera = {}
+        if fila[0]:
+            capcalera['If-None-Match'] = fila[0]
+        if fila[1]:
+            capcalera['If-Modified-Since'] = fila[1]
+        return capcalera
 
-    # Aplanem la llista
-    tags_graus = [x for subllista in graus_aux for x in subllista]
+    def resposta(self, url):
+        """
+        Retorna un objecte RespostaLocal amb el cos desat per a url (quan el servidor ha
+        respost 304), o None si ja no és a la cau.
+        """
+        with self._bloqueig:
+            fila = self._bd.execute("SELECT etag, last_modified, codificacio, mida FROM entrades "
+                                    "WHERE url = ?", (url,)).fetchone()
+            if not fila or not os.path.exists(self._cami(url)):
+                return None
+            self._bd.execute("UPDATE entrades SET darrer_acces = ? WHERE url = ?", (tm.time(), url))
+            self._bd.commit()
+            self.encerts += 1
+            self.bytes_estalviats += fila[3]
+        capcalera = {'ETag': fila[0], 'Last-Modified': fila[1]}
+        return RespostaLocal(url, cami = self._cami(url), headers = {k: v for k, v in capcalera.items() if v},
+                             encoding = fila[2])
 
-    # Obtenim la llista d'adreces web dels graus i les desem a una llista de diccionaris
-    graus = [i.a['href'] for i in tags_graus]
-    
-    return graus, codi_error, missatge_error
+    def desa(self, url, resposta, cami_cos = None):
+        """
+        Desa a la cau el cos de resposta (objecte resposta de requests amb codi 200) si té
+        validadors ETag o Last-Modified. Si el cos ja s'ha desat a l'arxiu cami_cos (descàrregues
+        per blocs), se'n copia l'arxiu en comptes de llegir resposta.content.
+        """
+        etag = resposta.headers.get('ETag')
+        last_modified = resposta.headers.get('Last-Modified')
+        if not etag and not last_modified:
+            return
+        cami = self._cami(url)
+        descriptor, cami_temporal = tempfile.mkstemp(dir = self.directori, suffix = '.part')
+        with os.fdopen(descriptor, 'wb') as f:
+            if cami_cos:
+                with open(cami_cos, 'rb') as origen:
+                    shutil.copyfileobj(origen, f)
+            else:
+                f.write(resposta.content)
+        mida = os.path.getsize(cami_temporal)
+        codificacio = resposta.encoding if cami_cos else (resposta.encoding or resposta.apparent_encoding)
+        with self._bloqueig:
+            os.replace(cami_temporal, cami)
+            self._bd.execute("INSERT OR REPLACE INTO entrades VALUES (?, ?, ?, ?, ?, ?)",
+                             (url, etag, last_modified, codificacio, mida, tm.time()))
+            self._expulsa()
+            self._bd.commit()
 
+    def elimina(self, url):
+        """
+        Elimina de la cau l'entrada de url, si hi és.
+        """
+        with self._bloqueig:
+            self._bd.execute("DELETE FROM entrades WHERE url = ?", (url,))
+            self._bd.commit()
+            if os.path.exists(self._cami(url)):
+                os.remove(self._cami(url))
+
+    def _expulsa(self):
+        # Eliminem les entrades menys usades recentment fins que la mida total torna a ser
+        # inferior a la màxima
+        mida_total = self._bd.execute("SELECT COALESCE(SUM(mida), 0) FROM entrades").fetchone()[0]
+        if mida_total <= self.mida_maxima:
+            return
+        for url, mida in self._bd.execute("SELECT url, mida FROM entrades ORDER BY darrer_acces").fetchall():
+            if mida_total <= self.mida_maxima:
+                break
+            self._bd.execute("DELETE FROM entrades WHERE url = ?", (url,))
+            if os.path.exists(self._cami(url)):
+                os.remove(self._cami(url))
+            mida_total -= mida
+
+    def estadistiques(self):
+        """
+        Retorna un diccionari amb les estadístiques d'ús de la cau.
+        """
+        with self._bloqueig:
+            entrades, mida = self._bd.execute("SELECT COUNT(*), COALESCE(SUM(mida), 0) FROM entrades").fetchone()
+        return {'encerts': self.encerts,
+                'revalidacions': self.revalidacions,
+                'errades': self.errades,
+                'bytes_estalviats': self.bytes_estalviats,
+                'entrades': entrades,
+                'mida': mida}
+
+    def tanca(self):
+        """
+        Tanca l'índex de la cau.
+        """
+        self._bd.close()
+
+
+
+# Cau HTTP que empra descarrega_url() quan no se n'indica cap. Per defecte, cap (None)
+cau_http = None
 
 
-def crawlscrape_url_grau(url_grau, verbose = True, desa_pdfs = False, nom_directori = ".\\"):
+
+class ArxiuCrawl:
     """
-    Funció que obté, a partir de l'URL de la pàgina web d'un grau oficial  
-    de la UPC,la informació rellevant sobre el mateix.
-    
-    Paràmetres:
-        url_grau : adreça de la pàgina web del grau
-        verbose : si val True (valor per defecte) imprimeix informació sobre el
-                  grau que està tractant i problemes trobats
-        desa_pdfs : si val True, es desen els documents pdf disponibles associats
-                    a les assignatures del grau al directori (existent) especificat. 
-                    Valor per defecte: False.
-        nom_directori : directori on es desaran els documents pdf de les assignatures. 
-                        Valor per defecte: ".\".
+    Arxiu de respostes HTTP d'un crawl (a l'estil WARC), per a poder-lo reproduir sense accedir
+    a la xarxa. Cada resposta (url, codi d'estat, capçaleres i cos) es desa com un membre gzip
+    independent afegit al final de l'arxiu de dades, i la seva posició s'afegeix a un índex
+    (arxiu de dades + '.idx', en format JSON Lines). Si una url es desa diverses vegades,
+    es reprodueix la darrera.
+    """
+    def __init__(self, cami, mode = 'grava'):
+        """
+        Retorna un objecte de classe ArxiuCrawl amb els atributs següents:
+            cami : camí de l'arxiu de dades
+            mode : 'grava' per a afegir-hi les respostes obtingudes de la xarxa (si l'arxiu ja
+                   existeix, s'hi afegeixen) o 'reprodueix' per a servir-ne les respostes
+            index : diccionari {url : (posició, mida)} de les respostes desades
+        """
+        if mode not in ('grava', 'reprodueix'):
+            raise ValueError("El mode de l'arxiu ha de ser 'grava' o 'reprodueix'")
+        self.cami = cami
+        self.mode = mode
+        self.index = {}
+        self._bloqueig = threading.Lock()
+        if os.path.exists(cami + '.idx'):
+            with open(cami + '.idx', encoding = 'utf-8') as f:
+                for linia in f:
+                    entrada = json.loads(linia)
+                    self.index[entrada['url']] = (entrada['posicio'], entrada['mida'])
+        if mode == 'grava':
+            self._dades = open(cami, 'ab')
+            self._index = open(cami + '.idx', 'a', encoding = 'utf-8')
+        else:
+            self._dades = open(cami, 'rb')
+            self._index = None
 
-    Retorna:
-        grau: diccionari amb la informació recopilada amb el format següent:
-                { 'Nom' :             nom del grau
-                  'URL' :      adreça de la pàgina web del grau
-                  'Càrrega lectiva' : nombre de crèdits ECTS del grau
-                  'Assignatures' : [ { 'Nom' :             nom de l'assignatura,
-                                       'Semestre' :        semestre en què s'imparteix,
-                                       'Càrrega lectiva' : càrrega lectiva en crèdits ECTS
-                                       'URL' :      adreça de la pàgina web de l'assignatura,
-                                       'Tipus':            Obligatòria, Optativa o Projecte
-                                       'Menció':           Menció o especialitat de l'assignatura
-                                     },
-                                     ...
-                                   ]
-                }
-        codi_error : 0 si tot és correcte. Sinó, el codi d'error heretat de
-                     descarrega_url() o -4 si no ha pogut obtenir ni el
-                     nom del grau
-        missatge_error : missatge d'error associat a codi_error
+    def desa(self, url, resposta):
+        """
+        Desa resposta (objecte resposta de requests o RespostaLocal) a l'arxiu i en retorna una
+        RespostaLocal equivalent, amb el cos ja llegit, per a continuar-ne el tractament.
+        """
+        cos = resposta.content
+        # El cos ja està descomprimit: les capçaleres de codificació i mida ja no s'hi corresponen
+        capcalera = {k: v for k, v in resposta.headers.items()
+                     if k.lower() not in ('content-encoding', 'content-length', 'transfer-encoding')}
+        codificacio = resposta.encoding
+        if codificacio is None and not isinstance(resposta, RespostaLocal):
+            codificacio = resposta.apparent_encoding
+        metadades = {'url': url,
+                     'status': resposta.status_code,
+                     'headers': capcalera,
+                     'encoding': codificacio,
+                     'temps': tm.time()}
+        registre = gzip.compress(json.dumps(metadades, ensure_ascii = False).encode('utf-8') + b'\n' + cos)
+        with self._bloqueig:
+            posicio = self._dades.tell()
+            self._dades.write(registre)
+            self._dades.flush()
+            self._index.write(json.dumps({'url': url, 'posicio': posicio, 'mida': len(registre)},
+                                         ensure_ascii = False) + '\n')
+            self._index.flush()
+            self.index[url] = (posicio, len(registre))
+        resposta.close()
+        return RespostaLocal(url, cos = cos, status_code = metadades['status'], headers = capcalera,
+                             encoding = codificacio)
 
-    Nota: Per a les dades que manquen retorna el valor ''.
+    def resposta(self, url):
+        """
+        Retorna la resposta desada per a url com a objecte RespostaLocal, o None si no n'hi ha.
+        """
+        entrada = self.index.get(url)
+        if entrada is None:
+            return None
+        with self._bloqueig:
+            self._dades.seek(entrada[0])
+            registre = self._dades.read(entrada[1])
+        metadades, cos = gzip.decompress(registre).split(b'\n', 1)
+        metadades = json.loads(metadades)
+        return RespostaLocal(url, cos = cos, status_code = metadades['status'],
+                             headers = metadades['headers'], encoding = metadades['encoding'])
+
+    def urls(self):
+        """
+        Retorna la llista d'url de les respostes desades, en l'ordre en què s'han desat.
+        """
+        return sorted(self.index, key = lambda url: self.index[url][0])
+
+    def tanca(self):
+        """
+        Tanca l'arxiu.
+        """
+        self._dades.close()
+        if self._index:
+            self._index.close()
+
+
+
+# Arxiu de crawl que empra descarrega_url() quan no se n'indica cap. Per defecte, cap (None)
+arxiu_crawl = None
+
+
+
+class LimitadorHosts:
+    """
+    Limitador de freqüència de peticions per host, format per un Temporitzador relatiu per a
+    cada host.
+    """
+    def __init__(self, temps_espera = 20, robots = None, agent_usuari = 'ua0000', respecta_crawl_delay = True):
+        """
+        Retorna un objecte de classe LimitadorHosts amb els atributs següents:
+            temps_espera : temps mínim per defecte en segons entre peticions al mateix host
+            robots : objecte CauRobots amb què s'obté el Crawl-delay de cada host. Si és None,
+                     s'empra la cau compartida cau_robots
+            agent_usuari : agent usuari per al qual es consulta el Crawl-delay
+            respecta_crawl_delay : si val False, no es consulta el Crawl-delay dels hosts (per
+                                   exemple, en reproduir un crawl arxivat, sense accés a la xarxa)
+            temporitzadors : diccionari {esquema://host : Temporitzador}
+        """
+        self.temps_espera = temps_espera
+        self.robots = robots
+        self.agent_usuari = agent_usuari
+        self.respecta_crawl_delay = respecta_crawl_delay
+        self.temporitzadors = {}
+        self._bloqueig = threading.Lock()
+
+    def espera(self, url, temps_espera = None):
+        """
+        Espera fins que hagin passat, com a mínim, temps_espera segons (o el temps per defecte
+        del limitador, o el Crawl-delay del host si és més gran) des de la darrera petició al
+        host de url. Les esperes de hosts diferents no es bloquegen entre elles.
+        """
+        if temps_espera is None:
+            temps_espera = self.temps_espera
+        if self.respecta_crawl_delay:
+            robots = self.robots if self.robots else cau_robots
+            temps_espera = max(temps_espera, robots.crawl_delay(self.agent_usuari, url))
+
+        clau = CauRobots.clau(url)
+        with self._bloqueig:
+            temporitzador = self.temporitzadors.get(clau)
+            if temporitzador is None:
+                temporitzador = Temporitzador(temps_espera, 'relatiu', host = clau)
+                self.temporitzadors[clau] = temporitzador
+        temporitzador.espera(temps_espera)
+
+    def registra(self, url, codi_error, temps_resposta, espera_servidor = None):
+        """
+        Informa el limitador de la resposta obtinguda de url (vegeu LimitadorAdaptatiu). Aquest
+        limitador espaia les peticions un temps fix, i no en fa res.
+        """
+        pass
+
+
+
+class CubellTokens:
+    """
+    Cubell de tokens d'un host: cada petició en consumeix un, i se'n recupera un cada interval
+    segons, fins a un màxim de capacitat. L'interval s'adapta a les respostes del servidor (vegeu
+    LimitadorAdaptatiu).
+    """
+    def __init__(self, interval, capacitat = 1, host = None):
+        """
+        Retorna un objecte de classe CubellTokens amb els atributs següents:
+            interval : temps en segons en què es recupera un token
+            capacitat : nombre màxim de tokens acumulats (peticions seguides sense esperar)
+            host : host (esquema://host) a què s'atribueixen les esperes a les mètriques
+            tokens : nombre de tokens disponibles. Inicialment, un
+            bloquejat_fins : temps d'època fins al qual no es pot fer cap petició al host (per
+                             exemple, perquè el servidor ha respost amb Retry-After), o 0
+        """
+        self.interval = interval
+        self.capacitat = capacitat
+        self.host = host
+        self.tokens = 1
+        self.bloquejat_fins = 0
+        self._darrera_recarrega = tm.time()
+        self._bloqueig = threading.Lock()
+
+    def _recarrega(self, ara):
+        if self.interval > 0:
+            self.tokens = min(self.capacitat, self.tokens + (ara - self._darrera_recarrega)/self.interval)
+        else:
+            self.tokens = self.capacitat
+        self._darrera_recarrega = ara
+
+    def pren(self):
+        """
+        Espera fins que hi hagi un token disponible (i el host no estigui bloquejat) i el consumeix.
+        """
+        while True:
+            with self._bloqueig:
+                ara = tm.time()
+                self._recarrega(ara)
+                if ara < self.bloquejat_fins:
+                    segons_espera = self.bloquejat_fins - ara
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                else:
+                    segons_espera = (1 - self.tokens)*self.interval
+            # S'espera sense el bloqueig pres, i es torna a comprovar (un altre fil pot haver
+            # consumit el token o el servidor pot haver demanat més temps)
+            tm.sleep(segons_espera)
+            metriques.observa('espera', segons_espera, url = self.host)
+
+    def bloqueja(self, segons):
+        """
+        Impedeix fer peticions al host durant els propers segons segons, i en buida els tokens.
+        """
+        with self._bloqueig:
+            self.bloquejat_fins = max(self.bloquejat_fins, tm.time() + segons)
+            self.tokens = 0
+
+
+
+class LimitadorAdaptatiu(LimitadorHosts):
+    """
+    Limitador de peticions amb un cubell de tokens per host, que accelera mentre el servidor
+    respon ràpid i sense errors i frena quan la latència puja o hi ha errors.
+    """
+    def __init__(self, interval_inicial = 20, interval_minim = 2, interval_maxim = 120,
+                 latencia_objectiu = 1, capacitat = 1, robots = None, agent_usuari = 'ua0000',
+                 respecta_crawl_delay = True):
+        """
+        Retorna un objecte de classe LimitadorAdaptatiu amb els atributs següents:
+            interval_inicial : temps en segons entre peticions a un host abans de conèixer-ne les
+                               respostes
+            interval_minim : temps mínim en segons entre peticions a un host, per ràpid que
+                             respongui. Si el robots.txt del host indica un Crawl-delay més gran
+                             (i respecta_crawl_delay val True), s'empra el Crawl-delay
+            interval_maxim : temps màxim en segons entre peticions a un host
+            latencia_objectiu : temps de resposta en segons per sota del qual es considera que el
+                                servidor no està carregat i es pot reduir l'interval
+            capacitat : nombre de peticions seguides que pot fer un host que ha estat inactiu
+            robots, agent_usuari, respecta_crawl_delay : com a LimitadorHosts
+            cubells : diccionari {esquema://host : CubellTokens}
+        Després de cada resposta correcta i ràpida, l'interval del host es redueix un 20 %; si la
+        resposta és lenta, augmenta un 25 %; i si hi ha un error de servidor (5xx), un 429 o un
+        error de connexió, es duplica i el host es bloqueja durant l'interval (amb una variació
+        aleatòria de fins al 10 %) o el temps indicat a la capçalera Retry-After, si és més gran.
+        """
+        super().__init__(interval_inicial, robots = robots, agent_usuari = agent_usuari,
+                         respecta_crawl_delay = respecta_crawl_delay)
+        self.interval_minim = interval_minim
+        self.interval_maxim = interval_maxim
+        self.latencia_objectiu = latencia_objectiu
+        self.capacitat = capacitat
+        self.cubells = {}
+
+    def _interval_minim(self, url):
+        if self.respecta_crawl_delay:
+            robots = self.robots if self.robots else cau_robots
+            return max(self.interval_minim, robots.crawl_delay(self.agent_usuari, url))
+        return self.interval_minim
+
+    def cubell(self, url):
+        """
+        Retorna el CubellTokens del host de url, creant-lo si encara no existeix.
+        """
+        clau = CauRobots.clau(url)
+        with self._bloqueig:
+            cubell = self.cubells.get(clau)
+            if cubell is None:
+                interval = max(self.temps_espera, self._interval_minim(url))
+                cubell = CubellTokens(interval, self.capacitat, host = clau)
+                self.cubells[clau] = cubell
+        return cubell
+
+    def espera(self, url, temps_espera = None):
+        """
+        Espera fins que el cubell del host de url permeti fer una nova petició. temps_espera
+        s'ignora: l'interval entre peticions el determinen les respostes del host.
+        """
+        self.cubell(url).pren()
+
+    def registra(self, url, codi_error, temps_resposta, espera_servidor = None):
+        """
+        Adapta l'interval del host de url a una resposta: codi_error és el codi de
+        descarrega_url() (0 o 200 si és correcta, 304 si s'ha revalidat la cau), temps_resposta
+        el temps de resposta en segons i espera_servidor els segons de la capçalera Retry-After,
+        si n'hi ha.
+        """
+        cubell = self.cubell(url)
+        minim = self._interval_minim(url)
+        if es_error_transitori(codi_error):
+            with cubell._bloqueig:
+                cubell.interval = min(self.interval_maxim, max(minim, cubell.interval*2))
+                interval = cubell.interval
+            cubell.bloqueja(max(interval*random.uniform(1, 1.1), espera_servidor or 0))
+            metriques.compta('frenades', url = url, codi = codi_error)
+        elif codi_error in (0, 200, 304):
+            with cubell._bloqueig:
+                if temps_resposta <= self.latencia_objectiu:
+                    cubell.interval = max(minim, cubell.interval*0.8)
+                else:
+                    cubell.interval = min(self.interval_maxim, max(minim, cubell.interval*1.25))
+        elif espera_servidor:
+            cubell.bloqueja(espera_servidor)
+
+    def intervals(self):
+        """
+        Retorna un diccionari {esquema://host : interval actual en segons}.
+        """
+        with self._bloqueig:
+            return {clau: cubell.interval for clau, cubell in self.cubells.items()}
+
+
+
+class PlanificadorCrawl:
+    """
+    Planificador que executa tasques de crawling concurrentment en un conjunt de fils,
+    i en retorna els resultats en el mateix ordre en què s'han demanat.
+    """
+    def __init__(self, max_concurrencia = 4, limitador = None):
+        """
+        Retorna un objecte de classe PlanificadorCrawl amb els atributs següents:
+            max_concurrencia : nombre màxim de tasques que s'executen alhora
+            limitador : objecte LimitadorHosts compartit per totes les tasques, que garanteix
+                        l'espera mínima entre peticions al mateix host. Per defecte, un
+                        LimitadorHosts de 20 s
+        """
+        self.max_concurrencia = max(1, max_concurrencia)
+        self.limitador = limitador if limitador else LimitadorHosts(20)
+
+    def executa(self, funcio, elements):
+        """
+        Generador que aplica funcio(element, limitador = self.limitador) a cada element
+        d'elements, amb un màxim de max_concurrencia crides simultànies, i en retorna els
+        resultats en l'ordre d'elements. Només es mantenen en curs unes poques tasques per
+        davant de la que s'està retornant, de manera que la memòria no creix amb el nombre
+        d'elements.
+        """
+        elements = iter(elements)
+        en_curs = collections.deque()
+        with cf.ThreadPoolExecutor(max_workers = self.max_concurrencia) as executor:
+            for element in elements:
+                en_curs.append(executor.submit(funcio, element, limitador = self.limitador))
+                if len(en_curs) >= 2*self.max_concurrencia:
+                    yield en_curs.popleft().result()
+            while en_curs:
+                yield en_curs.popleft().result()
+
+
+
+class DiariCrawl:
+    """
+    Diari persistent (SQLite) del progrés d'un crawl, per a poder-lo reprendre si s'interromp.
+    Hi consten els graus obtinguts (amb les seves dades), els documents pdf desats i els errors.
+    """
+    def __init__(self, cami):
+        """
+        Retorna un objecte de classe DiariCrawl sobre l'arxiu SQLite cami (que es crea si no
+        existeix). Cada registre es confirma a disc en el moment d'escriure'l.
+        """
+        self.cami = cami
+        self._bloqueig = threading.Lock()
+        self._bd = sqlite3.connect(cami, check_same_thread = False)
+        self._bd.execute("PRAGMA journal_mode = WAL")
+        self._bd.execute("""CREATE TABLE IF NOT EXISTS graus (
+                                url TEXT PRIMARY KEY,
+                                codi_error INTEGER,
+                                missatge_error TEXT,
+                                dades TEXT,
+                                intents INTEGER,
+                                actualitzat REAL)""")
+        self._bd.execute("""CREATE TABLE IF NOT EXISTS pdfs (
+                                url TEXT PRIMARY KEY,
+                                codi_error INTEGER,
+                                missatge_error TEXT,
+                                intents INTEGER,
+                                actualitzat REAL)""")
+        self._bd.commit()
+
+    def buida(self):
+        """
+        Esborra tots els registres del diari, per a començar un crawl nou.
+        """
+        with self._bloqueig:
+            self._bd.execute("DELETE FROM graus")
+            self._bd.execute("DELETE FROM pdfs")
+            self._bd.commit()
+
+    def grau(self, url):
+        """
+        Retorna les dades (diccionari amb el format de crawlscrape_url_grau()) del grau de url si
+        ja s'han obtingut sense errors, o None si no consta al diari o va fallar.
+        """
+        with self._bloqueig:
+            fila = self._bd.execute("SELECT dades FROM graus WHERE url = ? AND codi_error = 0",
+                                    (url,)).fetchone()
+        if fila is None:
+            return None
+        dades = json.loads(fila[0])
+        dades['Assignatures'] = [Assignatura.de_diccionari(x) for x in dades['Assignatures']]
+        return dades
+
+    def registra_grau(self, url, dades, codi_error, missatge_error):
+        """
+        Registra el resultat (correcte o no) de l'obtenció del grau de url.
+        """
+        with self._bloqueig:
+            self._bd.execute("""INSERT INTO graus VALUES (?, ?, ?, ?, 1, ?)
+                                ON CONFLICT (url) DO UPDATE SET codi_error = excluded.codi_error,
+                                    missatge_error = excluded.missatge_error, dades = excluded.dades,
+                                    intents = intents + 1, actualitzat = excluded.actualitzat""",
+                             (url, codi_error, missatge_error,
+                              json.dumps(dades, ensure_ascii = False, default = dict) if not codi_error else None,
+                              tm.time()))
+            self._bd.commit()
+
+    def pdf_desat(self, url):
+        """
+        Retorna True si el document pdf de url ja s'ha desat sense errors.
+        """
+        with self._bloqueig:
+            return self._bd.execute("SELECT 1 FROM pdfs WHERE url = ? AND codi_error = 0",
+                                    (url,)).fetchone() is not None
+
+    def registra_pdf(self, url, codi_error, missatge_error):
+        """
+        Registra el resultat (correcte o no) de la descàrrega del document pdf de url.
+        """
+        with self._bloqueig:
+            self._bd.execute("""INSERT INTO pdfs VALUES (?, ?, ?, 1, ?)
+                                ON CONFLICT (url) DO UPDATE SET codi_error = excluded.codi_error,
+                                    missatge_error = excluded.missatge_error,
+                                    intents = intents + 1, actualitzat = excluded.actualitzat""",
+                             (url, codi_error, missatge_error, tm.time()))
+            self._bd.commit()
+
+    def errors(self):
+        """
+        Retorna una llista de tuples (tipus, url, codi_error, missatge_error) amb els graus i
+        documents pdf que han fallat.
+        """
+        with self._bloqueig:
+            return self._bd.execute("""SELECT 'grau', url, codi_error, missatge_error FROM graus
+                                       WHERE codi_error != 0
+                                       UNION ALL
+                                       SELECT 'pdf', url, codi_error, missatge_error FROM pdfs
+                                       WHERE codi_error != 0""").fetchall()
+
+    def tanca(self):
+        """
+        Tanca el diari.
+        """
+        self._bd.close()
+
+
+
+def es_error_transitori(codi_error):
+    """
+    Retorna True si codi_error (de descarrega_url()) correspon a un error que pot desaparèixer
+    en repetir la petició: timeout (-2), error de transmissió (-3), massa peticions (429) o error
+    de servidor (5xx).
+    """
+    return codi_error in (-2, -3, 429) or 500 <= codi_error < 600
+
+
+
+def segons_retry_after(valor):
+    """
+    Retorna el nombre de segons que indica el valor d'una capçalera HTTP Retry-After (un nombre
+    de segons o una data HTTP), o None si valor és buit o no és vàlid.
+    """
+    if not valor:
+        return None
+    valor = valor.strip()
+    if valor.isdigit():
+        return float(valor)
+    try:
+        data = email.utils.parsedate_to_datetime(valor)
+    except (TypeError, ValueError):
+        return None
+    if data is None:
+        return None
+    return max(0, data.timestamp() - tm.time())
+
+
+
+def executa_amb_reintents(funcio, *args, intents = 4, espera_inicial = 30, **kwargs):
+    """
+    Crida funcio(*args, **kwargs), que ha de retornar una tupla amb el codi d'error de
+    descarrega_url() a la penúltima posició, i la repeteix fins a intents vegades més mentre
+    l'error sigui transitori (vegeu es_error_transitori()). Entre intents espera un temps que es
+    duplica a cada reintent (començant per espera_inicial segons), amb una variació aleatòria de
+    fins al 10 % perquè diversos fils no coincideixin.
+    Retorna el resultat del darrer intent.
+    """
+    resultat = funcio(*args, **kwargs)
+    espera = espera_inicial
+    for intent in range(intents):
+        if not es_error_transitori(resultat[-2]):
+            break
+        Temporitzador(espera*random.uniform(1, 1.1), 'absolut').espera()
+        espera *= 2
+        resultat = funcio(*args, **kwargs)
+    return resultat
+
+
+
+def _peticio(url, timeout, agent_usuari, retorna, sessio, cau, arxiu):
+    # Fa una petició GET de url (revalidant la cau i gravant l'arxiu de crawl, si n'hi ha) i
+    # retorna (resposta, temps de resposta, codi_error, missatge_error). Si no hi ha hagut
+    # resposta, resposta és None i codi_error val -2 (timeout) o -3 (altres errors)
+    t_inici_peticio = tm.time()
+    try:
+        capcalera = cau.capcaleres_condicionals(url) if cau else None
+        pagina = sessio.get(url, timeout = timeout, agent_usuari = agent_usuari, capcalera = capcalera,
+                            stream = (retorna == 'flux'))
+        t_fi_peticio = tm.time()
+        t_resposta = t_fi_peticio - t_inici_peticio
+        if metriques.activa:
+            # pagina.elapsed és el temps fins a rebre les capçaleres (inclosa la connexió); la
+            # resta és la transferència del cos (que en les respostes 'flux' es mesura en llegir-lo)
+            t_connexio = pagina.elapsed.total_seconds()
+            metriques.observa('connexio', t_connexio, url = url)
+            if retorna != 'flux':
+                metriques.observa('transferencia', max(t_resposta - t_connexio, 0), url = url)
+                metriques.compta('bytes', len(pagina.content), url = url)
+            metriques.compta('respostes', url = url, codi = pagina.status_code)
+
+    except rq.exceptions.Timeout:
+        # Si s'ha superat el time-out sense resposta, retornem un error
+        metriques.compta('respostes', url = url, codi = -2)
+        return None, timeout, -2, "S'ha superat el timeout especificat ({} s)".format(timeout)
+
+    except:
+        # Si hi ha hagut algun altre problema inidentificat, retornem un error
+        metriques.compta('respostes', url = url, codi = -3)
+        return None, tm.time() - t_inici_peticio, -3, "Hi ha hagut un problema inidentificat amb la connexió"
+
+    # Si el contingut no ha canviat des de la darrera descàrrega, el servim des de la cau
+    if cau and pagina.status_code == 304:
+        resposta_cau = cau.resposta(url)
+        if resposta_cau:
+            pagina.close()
+            pagina = resposta_cau
+            metriques.compta('cau_http_encerts', url = url)
+        elif capcalera:
+            # L'entrada ha desaparegut de la cau entre la revalidació i la resposta (l'ha expulsada
+            # una altra descàrrega, o en falta el cos a disc): n'eliminem el que en quedi i repetim
+            # la petició sense capçaleres condicionals
+            pagina.close()
+            cau.elimina(url)
+            return _peticio(url, timeout, agent_usuari, retorna, sessio, cau, arxiu)
+
+    # Les respostes noves amb validadors es desen a la cau (les de tipus 'flux' les desa qui en
+    # llegeix el cos)
+    if cau and pagina.status_code == 200 and retorna != 'flux' and not isinstance(pagina, RespostaLocal):
+        cau.desa(url, pagina)
+
+    # Si s'està gravant el crawl, desem la resposta a l'arxiu
+    if arxiu:
+        pagina = arxiu.desa(url, pagina)
+
+    return pagina, t_resposta, 0, None
+
+
+
+def descarrega_url(url, intents = 5, timeout = 10, agent_usuari = None, retorna = 'text', robots = None,
+                   sessio = None, cau = None, arxiu = None, limitador = None, espera_maxima = 300):
+    """
+    Funció que obté els continguts del lloc web indicat per url, si aquest no està desabilitat al fitxer robots.txt
+
+    Arguments:
+        url          : url del lloc web del qual obtenir-ne els continguts
+        intents      : nombre d'intents si s'obté un codi de resposta diferent de 200 (per defecte 5 vegades)
+        timeout      : temps màxim durant el qual s'espera resposta del servidor (per defecte 1s)
+        agent_usuari : agent usuari per a la petició GET (per defecte, el de la sessió, 'ua0000')
+        retorna      : format de les dades a retornar, text o binari. Valor per defecte, 'text'. Si val
+                       'flux', es retorna l'objecte resposta de requests sense haver-ne llegit el cos, per
+                       a llegir-lo per blocs amb iter_content() (cal tancar-lo amb close()). Qualsevol
+                       altre valor fa que es retornin en format binari
+        robots       : objecte CauRobots amb què comprovar el fitxer robots.txt del host de url. Si no
+                       s'indica, s'empra la cau compartida cau_robots
+        sessio       : objecte SessioHTTP a través del qual es fa la petició. Si no s'indica, s'empra
+                       la sessió compartida sessio_per_defecte, que reaprofita les connexions obertes
+        cau          : objecte CauHTTP amb què es revaliden les respostes desades d'execucions anteriors
+                       (si el servidor respon 304, el contingut se serveix de la cau). Si no s'indica,
+                       s'empra la cau del mòdul cau_http, si n'hi ha
+        arxiu        : objecte ArxiuCrawl. En mode 'grava', s'hi desen totes les respostes obtingudes; en
+                       mode 'reprodueix', les respostes se n'obtenen en comptes de la xarxa (sense
+                       consultar robots.txt ni la cau). Si no s'indica, s'empra l'arxiu del mòdul
+                       arxiu_crawl, si n'hi ha
+        limitador    : objecte LimitadorHosts a què s'informa de cada resposta (vegeu
+                       LimitadorAdaptatiu.registra()) i amb què s'espaien els reintents: l'espera del
+                       reintent se li passa a registra() i a espera(), en comptes d'esperar-la a part.
+                       Per defecte, cap
+        espera_maxima: temps màxim en segons d'espera abans d'un reintent (per defecte, 300 s)
+    Retorna:
+        contingut      : dades obtingudes com a resposta del lloc url a la petició GET. No tenen perquè ser codi html,
+                         poden ser una imatge, un arxiu pdf o qualsevol altre conjunt de dades binàries o text.
+        codi_error     :
+                         * 0 si no hi ha hagut cap error
+                         * -1 si el lloc web està prohibit per robots.txt
+                         * -2 si s'ha superat el timeout especificat
+                         * -3 si hi ha hagut algun altre error de transmissió
+                         * el nombre d'error del protocol HTTP si s'ha produït aquest error (si l'error és del
+                           servidor (codis 500 a 599) o 429, la funció genera automàticament fins a intents
+                           reintents per a mirar d'obtenir una transmissió correcta, esperant entre intents
+                           10 vegades el temps de resposta (com a mínim 1 s), duplicat a cada reintent i amb
+                           una variació aleatòria de fins al 10 %, o el temps que indiqui la capçalera
+                           Retry-After si és més gran)
+        missatge_error : missatge d'error explicatiu de l'error obtingut
+    
+    Nota: Només es generen reintents quan hi ha un error de servidor o 429. Quan hi ha errors de transmissió o
+    de timeout, cal fer la gestió de reintents externament.
+        
+    """
+
+    if sessio is None:
+        sessio = sessio_per_defecte
+    if not agent_usuari:
+        agent_usuari = sessio.agent_usuari
+    if robots is None:
+        robots = cau_robots
+    if cau is None:
+        cau = cau_http
+    if arxiu is None:
+        arxiu = arxiu_crawl
+
+    if arxiu and arxiu.mode == 'reprodueix':
+        # Reproduïm la resposta desada a l'arxiu, sense accedir a la xarxa (ni reintentar: la
+        # resposta arxivada sempre és la mateixa)
+        pagina = arxiu.resposta(url)
+        if pagina is None:
+            return None, -3, "L'adreça no és a l'arxiu del crawl"
+        intents = 0
+    else:
+        # Comprovem si podem accedir a la pàgina al fitxer robots.txt del seu host (que només es
+        # descarrega la primera vegada, o quan caduca a la cau). Si no podem, generem un error i
+        # retornem sense accedir-hi
+        try:
+            permes = robots.pot_descarregar(agent_usuari, url)
+        except rq.exceptions.Timeout:
+            return None, -2, "S'ha superat el timeout especificat en obtenir el robots.txt"
+        except rq.exceptions.HTTPError as e:
+            # Error de servidor en obtenir el robots.txt: es retorna el codi HTTP, de manera
+            # que es pot reintentar com qualsevol altre error de servidor
+            return None, e.response.status_code, str(e)
+        except rq.exceptions.RequestException:
+            return None, -3, "Hi ha hagut un problema amb la connexió en obtenir el robots.txt"
+        if not permes:
+            contingut = None
+            codi_error = -1
+            missatge_error = "Lloc web prohibit per robots.txt"
+            return contingut, codi_error, missatge_error
+
+    # Si hi ha hagut un error de servidor o 429 (i intents>0), repetim la petició fins a intents
+    # vegades, a veure si l'error desapareix
+    for intent in range(intents + 1):
+        if not (arxiu and arxiu.mode == 'reprodueix'):
+            pagina, t_resposta, codi_error, missatge_error = _peticio(url, timeout, agent_usuari, retorna,
+                                                                      sessio, cau, arxiu)
+            espera_servidor = segons_retry_after(pagina.headers.get('Retry-After')) if pagina else None
+            reintenta = (pagina is not None and intent < intents and
+                         (pagina.status_code == 429 or 500 <= pagina.status_code < 600))
+            if reintenta:
+                # Abans de reintentar, esperem un temps equivalent a 10 vegades el temps de resposta
+                # (com a mínim 1 s), que es duplica a cada reintent, o el que demani el servidor
+                espera = min(espera_maxima, max(10*t_resposta, 1)*2**intent)*random.uniform(1, 1.1)
+                if espera_servidor:
+                    espera = max(espera, min(espera_maxima, espera_servidor))
+            if limitador:
+                # Si es reintenta, el limitador ja bloqueja el host durant l'espera del reintent
+                # (i no només la del Retry-After), de manera que no s'espera dues vegades
+                limitador.registra(url, codi_error if pagina is None else pagina.status_code, t_resposta,
+                                   espera if reintenta else espera_servidor)
+            if pagina is None:
+                return None, codi_error, missatge_error
+        else:
+            reintenta = False
+
+        if not reintenta:
+            break
+
+        # Esperem (amb el limitador, si n'hi ha, que a més espaia les peticions dels altres fils
+        # al host) i tornem a fer la petició
+        metriques.compta('reintents', url = url)
+        pagina.close()
+        if limitador:
+            limitador.espera(url, max(espera, limitador.temps_espera))
+        else:
+            Temporitzador(espera, 'absolut').espera()
+
+    # Si hi ha qualsevol error o imprevist detectat pel servidor, retornem un error i sortim
+    if pagina.status_code!=200:
+        pagina.close()
+        contingut = None
+        codi_error = pagina.status_code
+        missatge_error = "S'ha produït l'error HTTP {}".format(pagina.status_code)
+        return contingut, codi_error, missatge_error
+
+    # Finalment, si no hi ha hagut errors, retornem un codi d'error 0 i el contingut.
+    # Si retorna val 'text', es retorna el contingut en format text. Si val 'flux', la resposta
+    # sense llegir. Sinó (si val 'binari', per exemple), es retorna el contingut binari
+    if retorna == 'text':
+        contingut = pagina.text
+    elif retorna == 'flux':
+        contingut = pagina
+    else:
+        contingut = pagina.content
+    codi_error = 0
+    missatge_error = None
+    return contingut, codi_error, missatge_error
+
+
+
+def desa_url_en_flux(cami, url, mida_bloc = 65536, mida_maxima = None, fsync = False, intents = 5,
+                     timeout = 10, agent_usuari = None, sessio = None, cau = None, limitador = None):
+    """
+    Funció que descarrega el contingut de url directament a l'arxiu cami, per blocs de mida fixa,
+    sense mantenir-lo sencer a memòria. Escriu primer a un arxiu temporal del mateix directori i,
+    quan la descàrrega és completa, el reanomena atòmicament a cami, de manera que mai no queda
+    un arxiu a mig escriure amb el nom definitiu.
+    Arguments:
+        cami : camí de l'arxiu on desar el contingut
+        url : url del contingut a descarregar
+        mida_bloc : mida en bytes dels blocs de lectura (per defecte, 64 KiB)
+        mida_maxima : mida màxima en bytes del contingut. Si se supera, s'avorta la descàrrega.
+                      Si és None (valor per defecte), no hi ha límit
+        fsync : si val True, força l'escriptura a disc de l'arxiu abans de reanomenar-lo
+        intents, timeout, agent_usuari, sessio, cau, limitador : paràmetres que es passen a
+                                                                 descarrega_url()
+    Retorna:
+        info : diccionari {'Camí': cami, 'Mida': mida en bytes, 'SHA-256': resum del contingut en
+               hexadecimal}, o None si hi ha hagut algun error
+        codi_error : el de descarrega_url(), -3 si la transmissió s'interromp a mig descarregar o
+                     -5 si el contingut supera mida_maxima
+        missatge_error : missatge d'error associat a codi_error
+    """
+    resposta, codi_error, missatge_error = descarrega_url(url,
+                                                          intents = intents,
+                                                          timeout = timeout,
+                                                          agent_usuari = agent_usuari,
+                                                          retorna = 'flux',
+                                                          sessio = sessio,
+                                                          cau = cau,
+                                                          limitador = limitador)
+    if codi_error:
+        return None, codi_error, missatge_error
+
+    with resposta:
+        # Si el servidor n'anuncia la mida i ja supera el límit, no cal començar a descarregar
+        mida_anunciada = resposta.headers.get('Content-Length')
+        if mida_maxima is not None and mida_anunciada and mida_anunciada.isdigit() and \
+           int(mida_anunciada) > mida_maxima:
+            return None, -5, "El contingut supera la mida màxima ({} bytes)".format(mida_maxima)
+
+        directori = os.path.dirname(cami) or '.'
+        descriptor, cami_temporal = tempfile.mkstemp(dir = directori, prefix = '.', suffix = '.part')
+        resum = hashlib.sha256()
+        mida = 0
+        # Temps d'escriptura a disc, que es descompta del temps de transferència (només es mesura
+        # si les mètriques estan actives)
+        mesura = metriques.activa
+        t_inici = tm.perf_counter()
+        t_escriptura = 0
+        desat = False
+        massa_gran = False
+        try:
+            with os.fdopen(descriptor, 'wb') as f:
+                for bloc in resposta.iter_content(chunk_size = mida_bloc):
+                    mida += len(bloc)
+                    if mida_maxima is not None and mida > mida_maxima:
+                        massa_gran = True
+                        break
+                    resum.update(bloc)
+                    if mesura:
+                        t_bloc = tm.perf_counter()
+                        f.write(bloc)
+                        t_escriptura += tm.perf_counter() - t_bloc
+                    else:
+                        f.write(bloc)
+                t_bloc = tm.perf_counter()
+                if fsync and not massa_gran:
+                    f.flush()
+                    os.fsync(f.fileno())
+            # L'arxiu temporal s'elimina (al bloc finally) un cop tancat: a Windows no es pot
+            # eliminar un arxiu obert
+            if massa_gran:
+                return None, -5, "El contingut supera la mida màxima ({} bytes)".format(mida_maxima)
+            os.replace(cami_temporal, cami)
+            desat = True
+            if mesura:
+                t_fi = tm.perf_counter()
+                t_escriptura += t_fi - t_bloc
+                metriques.observa('transferencia', t_fi - t_inici - t_escriptura, url = url)
+                metriques.observa('escriptura_pdf', t_escriptura, url = url)
+                metriques.compta('bytes', mida, url = url)
+            if cau is None:
+                cau = cau_http
+            if cau and not isinstance(resposta, RespostaLocal):
+                cau.desa(url, resposta, cami_cos = cami)
+        except rq.exceptions.RequestException:
+            return None, -3, "S'ha interromput la transmissió de " + url
+        finally:
+            # Si no s'ha desat l'arxiu (per qualsevol error, que es propaga si no és de transmissió),
+            # n'eliminem les restes
+            if not desat and os.path.exists(cami_temporal):
+                os.remove(cami_temporal)
+
+    info = {'Camí': cami, 'Mida': mida, 'SHA-256': resum.hexdigest()}
+    return info, 0, None
+
+
+
+def descarrega_pdf(url, nom_directori = ".\\", nom_arxiu = None, intents = 5, timeout = 10, agent_usuari = None,
+                   sessio = None, flux = True, mida_maxima = None, fsync = False, limitador = None,
+                   magatzem = None):
+    """
+    Funció que descarrega un document en format pdf de l'adreça directa indicada
+    i el desa al directori i amb el nom de fitxer indicats. Empra desa_url_en_flux() o,
+    si flux val False, descarrega_url().
+    Arguments:
+        url : url de l'arxiu en format pdf (o qualsevol altre format binari) 
+              a descarregar
+        nom_directori : nom del directori (existent) on desar l'arxiu. Per defecte,
+                        ".\"
+        nom_arxiu : nom de l'arxiu on es desarà el document. Si no s'indica, es
+                    deduix de la url
+        intents, timeout, agent_usuari, sessio, limitador : paràmetres que es passen a descarrega_url()
+        flux : si val True (valor per defecte), el document es descarrega per blocs directament a
+               disc, amb desa_url_en_flux(). Si val False, es descarrega sencer a memòria abans de
+               desar-lo
+        mida_maxima, fsync : paràmetres que es passen a desa_url_en_flux()
+        magatzem : objecte MagatzemPdf. Si s'indica, el document es desa al magatzem (si no hi és
+                   ja vigent) en comptes de a nom_directori, i nom_arxiu i flux s'ignoren
+     Retorna:
+         codi_error, missatge_error : fornits per descarrega_url() o desa_url_en_flux()
+    """
+
+    if magatzem is not None:
+        info, codi_error, missatge_error = magatzem.desa(url,
+                                                         mida_maxima = mida_maxima,
+                                                         fsync = fsync,
+                                                         intents = intents,
+                                                         timeout = timeout,
+                                                         agent_usuari = agent_usuari,
+                                                         sessio = sessio,
+                                                         limitador = limitador)
+        return codi_error, missatge_error
+
+    # Si no donem un nom, l'inferim de l'adreça url
+    if not nom_arxiu:
+        nom_arxiu = re.sub(r"\A.+/",'', url)
+
+    if flux:
+        info, codi_error, missatge_error = desa_url_en_flux(nom_directori + nom_arxiu, url,
+                                                            mida_maxima = mida_maxima,
+                                                            fsync = fsync,
+                                                            intents = intents,
+                                                            timeout = timeout,
+                                                            agent_usuari = agent_usuari,
+                                                            sessio = sessio,
+                                                            limitador = limitador)
+        return codi_error, missatge_error
+
+    # Aprofitem la funció descarrega pàgina per a baixar els continguts del
+    # dcoument en format binari
+    doc_pdf, codi_error, missatge_error = descarrega_url(url,
+                                                         intents = intents,
+                                                         timeout = timeout,
+                                                         agent_usuari = agent_usuari, 
+                                                         retorna = 'binari',
+                                                         sessio = sessio,
+                                                         limitador = limitador)
+   
+    # Si hi ha hagut algun problema amb la descàrrega del document, retornem
+    # el codi d'error adient i p
+    if codi_error:
+        return codi_error, missatge_error
+
+    # Desem el document pdf
+    with open(nom_directori + nom_arxiu, 'wb') as f:
+        f.write(doc_pdf)
+        
+    return codi_error, missatge_error
+
+        
+
+class MagatzemPdf:
+    """
+    Magatzem de documents pdf adreçat per contingut: cada document es desa una sola vegada, amb el
+    seu resum SHA-256 com a nom, i un manifest (SQLite) relaciona cada url amb el resum del
+    document que s'hi va obtenir. Les guies docents compartides entre graus (o campus) només es
+    desen una vegada, i les de noms iguals però continguts diferents no col·lideixen.
+    """
+    def __init__(self, directori, ttl = 7*24*3600):
+        """
+        Retorna un objecte de classe MagatzemPdf sobre directori (que es crea si no existeix),
+        amb els atributs següents:
+            directori : directori arrel del magatzem. Els documents es desen a
+                        objectes/<2 primers caràcters del resum>/<resum>.pdf i el manifest a
+                        manifest.sqlite
+            ttl : temps en segons durant el qual es considera vigent el document d'una url. Mentre
+                  ho és, no es torna a descarregar. Valors negatius fan que no caduquin mai
+            descarregues : nombre de documents descarregats
+            reutilitzats : nombre de documents no descarregats perquè la url ja era al manifest
+            duplicats : nombre de documents descarregats que ja eren al magatzem (amb una altra url)
+        """
+        self.directori = directori
+        self.ttl = ttl
+        self.descarregues = 0
+        self.reutilitzats = 0
+        self.duplicats = 0
+        os.makedirs(os.path.join(directori, 'objectes'), exist_ok = True)
+        os.makedirs(os.path.join(directori, 'entrants'), exist_ok = True)
+        self._bloqueig = threading.Lock()
+        self._bd = sqlite3.connect(os.path.join(directori, 'manifest.sqlite'), check_same_thread = False)
+        self._bd.execute("PRAGMA journal_mode = WAL")
+        self._bd.execute("""CREATE TABLE IF NOT EXISTS manifest (
+                                url TEXT PRIMARY KEY,
+                                sha256 TEXT,
+                                mida INTEGER,
+                                desat REAL)""")
+        self._bd.execute("CREATE INDEX IF NOT EXISTS manifest_sha256 ON manifest (sha256)")
+        self._bd.commit()
+
+    def cami_objecte(self, sha256):
+        """
+        Retorna el camí del document amb resum sha256 dins del magatzem.
+        """
+        return os.path.join(self.directori, 'objectes', sha256[:2], sha256 + '.pdf')
+
+    def entrada(self, url):
+        """
+        Retorna un diccionari {'Camí', 'Mida', 'SHA-256', 'Desat'} amb l'entrada del manifest de
+        url (Desat és el temps d'època de la darrera descàrrega), o None si no n'hi ha.
+        """
+        with self._bloqueig:
+            fila = self._bd.execute("SELECT sha256, mida, desat FROM manifest WHERE url = ?",
+                                    (url,)).fetchone()
+        if fila is None:
+            return None
+        return {'Camí': self.cami_objecte(fila[0]), 'Mida': fila[1], 'SHA-256': fila[0], 'Desat': fila[2]}
+
+    def vigent(self, url):
+        """
+        Retorna True si el document de url és al magatzem i no ha caducat.
+        """
+        entrada = self.entrada(url)
+        return entrada is not None and (self.ttl < 0 or tm.time() - entrada['Desat'] < self.ttl) and \
+               os.path.exists(entrada['Camí'])
+
+    def reutilitza(self, url):
+        """
+        Retorna True (i el compta com a reutilitzat) si el document de url és al magatzem i no ha
+        caducat, de manera que no cal descarregar-lo.
+        """
+        if not self.vigent(url):
+            return False
+        with self._bloqueig:
+            self.reutilitzats += 1
+        return True
+
+    def desa(self, url, forca = False, **kwargs):
+        """
+        Desa el document de url al magatzem, si no hi és ja vigent (o si forca val True). La resta
+        d'arguments es passen a desa_url_en_flux().
+        Retorna:
+            info : diccionari {'Camí', 'Mida', 'SHA-256', 'Reutilitzat'} (Reutilitzat val True si
+                   no s'ha descarregat), o None si hi ha hagut algun error
+            codi_error, missatge_error : els de desa_url_en_flux()
+        """
+        if not forca and self.reutilitza(url):
+            info = self.entrada(url)
+            return {'Camí': info['Camí'], 'Mida': info['Mida'], 'SHA-256': info['SHA-256'],
+                    'Reutilitzat': True}, 0, None
+
+        # Es descarrega a un arxiu provisional i, un cop conegut el resum, es mou al seu lloc (o
+        # s'elimina, si el magatzem ja tenia el mateix document). El nom de l'arxiu provisional el
+        # tria mkstemp(), perquè sigui únic encara que diversos processos (vegeu el mòdul distribuit)
+        # comparteixin el magatzem i descarreguin la mateixa url alhora
+        descriptor, cami_entrant = tempfile.mkstemp(
+            dir = os.path.join(self.directori, 'entrants'),
+            prefix = hashlib.sha256(url.encode('utf-8')).hexdigest() + '-')
+        os.close(descriptor)
+        desat = False
+        try:
+            info, codi_error, missatge_error = desa_url_en_flux(cami_entrant, url, **kwargs)
+            desat = not codi_error
+        finally:
+            if not desat:
+                os.remove(cami_entrant)
+        if codi_error:
+            return None, codi_error, missatge_error
+
+        cami = self.cami_objecte(info['SHA-256'])
+        with self._bloqueig:
+            if os.path.exists(cami):
+                os.remove(cami_entrant)
+                self.duplicats += 1
+            else:
+                os.makedirs(os.path.dirname(cami), exist_ok = True)
+                os.replace(cami_entrant, cami)
+            self.descarregues += 1
+            self._bd.execute("""INSERT INTO manifest VALUES (?, ?, ?, ?)
+                                ON CONFLICT (url) DO UPDATE SET sha256 = excluded.sha256,
+                                    mida = excluded.mida, desat = excluded.desat""",
+                             (url, info['SHA-256'], info['Mida'], tm.time()))
+            self._bd.commit()
+        return {'Camí': cami, 'Mida': info['Mida'], 'SHA-256': info['SHA-256'], 'Reutilitzat': False}, 0, None
+
+    def resums(self):
+        """
+        Retorna la llista dels resums SHA-256 dels documents del manifest (sense repeticions).
+        """
+        with self._bloqueig:
+            return [fila[0] for fila in self._bd.execute("SELECT DISTINCT sha256 FROM manifest")]
+
+    def enllaca(self, url, cami_desti):
+        """
+        Crea a cami_desti un enllaç dur al document de url (o una còpia, si el sistema de fitxers
+        no admet enllaços durs), per a accedir-hi amb un nom llegible. Retorna True si el document
+        és al magatzem.
+        """
+        entrada = self.entrada(url)
+        if entrada is None or not os.path.exists(entrada['Camí']):
+            return False
+        if os.path.exists(cami_desti):
+            os.remove(cami_desti)
+        try:
+            os.link(entrada['Camí'], cami_desti)
+        except OSError:
+            shutil.copyfile(entrada['Camí'], cami_desti)
+        return True
+
+    def estadistiques(self):
+        """
+        Retorna un diccionari amb els comptadors del magatzem, el nombre d'url del manifest i el
+        nombre i la mida total dels documents desats.
+        """
+        with self._bloqueig:
+            urls, = self._bd.execute("SELECT COUNT(*) FROM manifest").fetchone()
+            documents, mida = self._bd.execute("""SELECT COUNT(*), COALESCE(SUM(mida), 0) FROM
+                                                  (SELECT DISTINCT sha256, mida FROM manifest)""").fetchone()
+            return {'descarregues': self.descarregues, 'reutilitzats': self.reutilitzats,
+                    'duplicats': self.duplicats, 'urls': urls, 'documents': documents, 'mida': mida}
+
+    def tanca(self):
+        """
+        Tanca el manifest.
+        """
+        self._bd.close()
+
+
+
+class _NavegadorBs4:
+    """
+    Navegador dels arbres de BeautifulSoup per a analitza_grau() i crawlscrape_url_principal().
+    Si parcial val True, només es construeix el subarbre de les etiquetes que interessen
+    (amb bs4.SoupStrainer) en comptes de l'arbre del document sencer.
+    """
+    def __init__(self, parcial = False):
+        self.parcial = parcial
+
+    def document(self, html, nom, **atributs):
+        # Retorna l'element a partir del qual es busquen les etiquetes nom amb atributs
+        if self.parcial:
+            atributs = {k: (re.compile(re.escape(v)) if k == 'id_conte' else v) for k, v in atributs.items()}
+            atributs = {('id' if k == 'id_conte' else k): v for k, v in atributs.items()}
+            return bs4.BeautifulSoup(html, 'lxml', parse_only = bs4.SoupStrainer(nom, **atributs))
+        return bs4.BeautifulSoup(html, 'lxml').body
+
+    @staticmethod
+    def _atributs(id, classe, sense_id, id_conte):
+        atributs = {}
+        if id is not None:
+            atributs['id'] = id
+        if id_conte is not None:
+            atributs['id'] = re.compile(re.escape(id_conte))
+        if sense_id:
+            atributs['id'] = False
+        if classe is not None:
+            atributs['class'] = classe
+        return atributs
+
+    def cerca(self, element, nom, id = None, classe = None):
+        return element.find(nom, attrs = self._atributs(id, classe, False, None))
+
+    def cerca_tots(self, element, nom, classe = None, sense_id = False, id_conte = None):
+        return element.find_all(nom, attrs = self._atributs(None, classe, sense_id, id_conte))
+
+    def cadena(self, element):
+        return element.string
+
+    def atribut(self, element, nom):
+        return element[nom]
+
+    def classes(self, element):
+        return element['class']
+
+    def continguts(self, element):
+        return element.contents
+
+    def text(self, node):
+        return str(node)
+
+
+
+class _NavegadorLxml:
+    """
+    Navegador dels arbres de lxml per a analitza_grau() i crawlscrape_url_principal(), amb
+    consultes XPath compilades. Reprodueix la semàntica de les operacions de BeautifulSoup
+    que s'hi empren (com la propietat string), de manera que els resultats són els mateixos.
+    """
+    _consultes = {}
+
+    def document(self, html, nom, **atributs):
+        if isinstance(html, bytes):
+            # Com BeautifulSoup, fem cas de la codificació declarada al document i, si no n'hi
+            # ha, suposem UTF-8
+            codificacio = bs4.dammit.EncodingDetector.find_declared_encoding(html, is_html = True)
+            parser = lxml.html.HTMLParser(encoding = codificacio if codificacio else 'utf-8')
+            return lxml.html.document_fromstring(html, parser = parser).find('body')
+        return lxml.html.document_fromstring(html).find('body')
+
+    @classmethod
+    def _consulta(cls, nom, id = None, classe = None, sense_id = False, id_conte = None):
+        clau = (nom, id, classe, sense_id, id_conte)
+        consulta = cls._consultes.get(clau)
+        if consulta is None:
+            condicions = []
+            if id is not None:
+                condicions.append('@id="{}"'.format(id))
+            if id_conte is not None:
+                condicions.append('contains(@id, "{}")'.format(id_conte))
+            if sense_id:
+                condicions.append('not(@id)')
+            if classe is not None:
+                condicions.append('contains(concat(" ", normalize-space(@class), " "), " {} ")'.format(classe))
+            consulta = lxml.etree.XPath('.//' + nom + ''.join('[' + c + ']' for c in condicions))
+            cls._consultes[clau] = consulta
+        return consulta
+
+    def cerca(self, element, nom, id = None, classe = None):
+        # Com a bs4, si element és None es genera una excepció AttributeError
+        if element is None:
+            raise AttributeError("'NoneType' object has no attribute 'find'")
+        resultat = self._consulta(nom, id = id, classe = classe)(element)
+        return resultat[0] if resultat else None
+
+    def cerca_tots(self, element, nom, classe = None, sense_id = False, id_conte = None):
+        if element is None:
+            raise AttributeError("'NoneType' object has no attribute 'find_all'")
+        return self._consulta(nom, classe = classe, sense_id = sense_id, id_conte = id_conte)(element)
+
+    def continguts(self, element):
+        continguts = [element.text] if element.text else []
+        for fill in element:
+            continguts.append(fill)
+            if fill.tail:
+                continguts.append(fill.tail)
+        return continguts
+
+    def cadena(self, element):
+        # Equivalent a la propietat string de bs4: si l'element té un únic fill, el text
+        # d'aquest fill (recursivament, si és una etiqueta). Sinó, None
+        if element is None:
+            raise AttributeError("'NoneType' object has no attribute 'string'")
+        if not isinstance(element.tag, str):
+            # Comentaris
+            return element.text
+        continguts = self.continguts(element)
+        if len(continguts) != 1:
+            return None
+        if isinstance(continguts[0], str):
+            return continguts[0]
+        return self.cadena(continguts[0])
+
+    def atribut(self, element, nom):
+        return element.attrib[nom]
+
+    def classes(self, element):
+        return element.attrib['class'].split()
+
+    def text(self, node):
+        if isinstance(node, str):
+            return node
+        if not isinstance(node.tag, str):
+            return node.text
+        return lxml.html.tostring(node, encoding = 'unicode', with_tail = False)
+
+
+
+# Analitzadors disponibles per a analitza_grau() i crawlscrape_url_principal():
+#   'bs4'         : arbre complet de BeautifulSoup del document
+#   'bs4-parcial' : arbre de BeautifulSoup només de les parts del document que interessen
+#   'lxml'        : arbre de lxml i consultes XPath, sense BeautifulSoup
+ANALITZADORS = {'bs4': _NavegadorBs4(),
+                'bs4-parcial': _NavegadorBs4(parcial = True),
+                'lxml': _NavegadorLxml()}
+
+
+
+# Hosts que serveixen el mateix contingut que un altre host, que és el que s'empra a les url normalitzades
+ALIES_HOSTS = {'upc.edu': 'www.upc.edu'}
+
+_PORTS_PER_DEFECTE = {'http': 80, 'https': 443}
+_ESCAPAMENT = re.compile(r'%[0-9A-Fa-f]{2}')
+_NO_RESERVATS = frozenset(string.ascii_letters + string.digits + '-._~')
+
+
+
+def _elimina_segments_punt(cami):
+    # Resol els segments '.' i '..' del camí d'una url (RFC 3986, 5.2.4)
+    segments = cami.split('/')
+    resultat = []
+    for segment in segments:
+        if segment == '..':
+            if len(resultat) > 1:
+                resultat.pop()
+        elif segment != '.':
+            resultat.append(segment)
+    if segments[-1] in ('.', '..'):
+        resultat.append('')
+    return '/'.join(resultat)
+
+
+
+def _normalitza_escapaments(text):
+    # Descodifica els caràcters no reservats escapats (%7E -> ~) i escriu la resta d'escapaments en majúscules
+    def substitueix(trobat):
+        caracter = chr(int(trobat.group(0)[1:], 16))
+        return caracter if caracter in _NO_RESERVATS else trobat.group(0).upper()
+    return _ESCAPAMENT.sub(substitueix, text)
+
+
+
+def normalitza_url(url, base = None, alies_hosts = None):
+    """
+    Retorna la forma canònica de url, de manera que les adreces equivalents d'un mateix recurs
+    (com https://upc.edu/ca/graus/x#pla i https://www.upc.edu/content/../ca/graus/x) són iguals:
+        * si s'indica base, url es resol relativament a base (com un enllaç de la pàgina base)
+        * l'esquema i el host s'escriuen en minúscules, i el host se substitueix pel seu àlies
+          d'alies_hosts, si en té (per defecte, ALIES_HOSTS)
+        * s'eliminen el port per defecte de l'esquema, les credencials i el fragment
+        * es resolen els segments '.' i '..' del camí, i un camí buit passa a ser '/'
+        * es normalitzen els escapaments del camí i la consulta (%7e -> ~, %2f -> %2F)
+    Les url que no són http ni https només es resolen respecte de base i se'n treu el fragment.
+    """
+    if alies_hosts is None:
+        alies_hosts = ALIES_HOSTS
+    url = url.strip()
+    if base:
+        url = up.urljoin(base, url)
+    parts = up.urlsplit(url)
+    esquema = parts.scheme.lower()
+    if esquema not in _PORTS_PER_DEFECTE:
+        return up.urlunsplit(parts._replace(fragment = ''))
+
+    host = parts.hostname or ''
+    host = alies_hosts.get(host, host)
+    if ':' in host:
+        # Adreça IPv6
+        host = '[' + host + ']'
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    if port is not None and port != _PORTS_PER_DEFECTE[esquema]:
+        host += ':' + str(port)
+    cami = _elimina_segments_punt(_normalitza_escapaments(parts.path)) or '/'
+    return up.urlunsplit((esquema, host, cami, _normalitza_escapaments(parts.query), ''))
+
+
+
+class ConjuntVisitats:
+    """
+    Conjunt d'url visitades que, en comptes de les url, en desa un resum de 64 bits (BLAKE2b):
+    ocupa una mida fixa per url (uns 80 bytes, en comptes dels més de 150 d'una url típica del
+    catàleg) i la probabilitat que dues url diferents tinguin el mateix resum és negligible
+    (menys d'1 entre 10^7 amb 10^6 url).
+    No és segur entre fils: FronteraCrawl el protegeix amb el seu bloqueig.
+    """
+    def __init__(self):
+        self._resums = set()
+
+    @staticmethod
+    def resum(url):
+        """
+        Retorna el resum de 64 bits (enter) de url.
+        """
+        return int.from_bytes(hashlib.blake2b(url.encode('utf-8'), digest_size = 8).digest(), 'little')
+
+    def afegeix(self, url):
+        """
+        Afegeix url al conjunt. Retorna True si no hi era.
+        """
+        resum = self.resum(url)
+        if resum in self._resums:
+            return False
+        self._resums.add(resum)
+        return True
+
+    def __contains__(self, url):
+        return self.resum(url) in self._resums
+
+    def __len__(self):
+        return len(self._resums)
+
+
+
+class FiltreBloom:
+    """
+    Filtre de Bloom per a les url visitades de crawls molt grans: ocupa una mida fixa, calculada a
+    partir de la capacitat i la taxa d'errors (uns 3,4 MiB per a 10^6 url amb una taxa de 10^-6),
+    a canvi que una url nova es pugui prendre per visitada amb probabilitat taxa_errors (i no es
+    visiti). Les url visitades, en canvi, sempre s'hi troben.
+    Té la mateixa interfície que ConjuntVisitats, i tampoc no és segur entre fils.
+    """
+    def __init__(self, capacitat = 10**6, taxa_errors = 1e-6):
+        """
+        Retorna un objecte de classe FiltreBloom dimensionat per a capacitat url amb una
+        probabilitat de falsos positius taxa_errors.
+        """
+        self.bits = max(8, math.ceil(-capacitat*math.log(taxa_errors)/math.log(2)**2))
+        self.funcions = max(1, round(self.bits/capacitat*math.log(2)))
+        self._taula = bytearray((self.bits + 7)//8)
+        self._nombre = 0
+
+    def _posicions(self, url):
+        # Posicions dels bits de url, per doble resum (Kirsch i Mitzenmacher)
+        resum = hashlib.blake2b(url.encode('utf-8'), digest_size = 16).digest()
+        h1 = int.from_bytes(resum[:8], 'little')
+        h2 = int.from_bytes(resum[8:], 'little') | 1
+        return [(h1 + i*h2) % self.bits for i in range(self.funcions)]
+
+    def afegeix(self, url):
+        """
+        Afegeix url al filtre. Retorna True si no hi era (o, amb probabilitat taxa_errors, False
+        encara que no hi fos).
+        """
+        nova = False
+        for posicio in self._posicions(url):
+            byte, bit = divmod(posicio, 8)
+            if not self._taula[byte] & (1 << bit):
+                self._taula[byte] |= 1 << bit
+                nova = True
+        if nova:
+            self._nombre += 1
+        return nova
+
+    def __contains__(self, url):
+        return all(self._taula[posicio//8] & (1 << posicio%8) for posicio in self._posicions(url))
+
+    def __len__(self):
+        return self._nombre
+
+
+
+class FronteraCrawl:
+    """
+    Frontera d'un crawl: cua de prioritat de les url pendents de visitar que normalitza les url
+    (vegeu normalitza_url()), descarta les que ja s'hi han afegit (encara que s'hagin escrit de
+    maneres diferents), les de fora dels dominis permesos i les massa profundes, i retorna la resta
+    per ordre de prioritat (i, a igual prioritat, per ordre d'arribada). És segura entre fils.
+    """
+    def __init__(self, dominis = None, profunditat_maxima = None, prioritat = None, visitats = None,
+                 alies_hosts = None):
+        """
+        Retorna un objecte de classe FronteraCrawl amb els atributs següents:
+            dominis : llista de dominis permesos (cada domini inclou els seus subdominis). Si no
+                      s'indica, s'admeten tots
+            profunditat_maxima : profunditat màxima (nombre d'enllaços des de la url inicial) de
+                                 les url admeses. Si no s'indica, no hi ha límit
+            prioritat : funció que rep una url i la seva profunditat i en retorna la prioritat
+                        (les url amb valors més petits es visiten abans). Per defecte, la
+                        profunditat: el crawl és en amplada
+            visitats : conjunt de les url afegides, ConjuntVisitats (per defecte) o FiltreBloom
+            alies_hosts : àlies dels hosts per a normalitza_url() (per defecte, ALIES_HOSTS)
+        """
+        self.dominis = [domini.lower() for domini in dominis] if dominis else None
+        self.profunditat_maxima = profunditat_maxima
+        self.prioritat = prioritat if prioritat else (lambda url, profunditat: profunditat)
+        self.visitats = visitats if visitats is not None else ConjuntVisitats()
+        self.alies_hosts = alies_hosts
+        self.comptadors = collections.Counter()
+        self._cua = []
+        self._ordre = 0
+        self._bloqueig = threading.Lock()
+
+    def admet_domini(self, url):
+        """
+        Retorna True si el host de url és d'algun dels dominis permesos.
+        """
+        if not self.dominis:
+            return True
+        host = up.urlsplit(url).hostname or ''
+        return any(host == domini or host.endswith('.' + domini) for domini in self.dominis)
+
+    def afegeix(self, url, profunditat = 0, base = None):
+        """
+        Afegeix url (resolta respecte de base, si s'indica) a la frontera amb la profunditat
+        indicada. Retorna la url normalitzada si s'hi ha afegit, o None si s'ha descartat.
+        """
+        url = normalitza_url(url, base, self.alies_hosts)
+        if up.urlsplit(url).scheme not in _PORTS_PER_DEFECTE:
+            motiu = 'Descartades'
+        elif self.profunditat_maxima is not None and profunditat > self.profunditat_maxima:
+            motiu = 'Massa profundes'
+        elif not self.admet_domini(url):
+            motiu = 'Fora de domini'
+        else:
+            motiu = None
+        with self._bloqueig:
+            if motiu is None and not self.visitats.afegeix(url):
+                motiu = 'Repetides'
+            if motiu:
+                self.comptadors[motiu] += 1
+                return None
+            heapq.heappush(self._cua, (self.prioritat(url, profunditat), self._ordre, profunditat, url))
+            self._ordre += 1
+            self.comptadors['Afegides'] += 1
+        return url
+
+    def seguent(self):
+        """
+        Treu de la frontera la url pendent de més prioritat. Retorna una tupla (url, profunditat),
+        o None si la frontera és buida.
+        """
+        with self._bloqueig:
+            if not self._cua:
+                return None
+            _, _, profunditat, url = heapq.heappop(self._cua)
+            return url, profunditat
+
+    def __len__(self):
+        with self._bloqueig:
+            return len(self._cua)
+
+
+
+# Adreça de la pàgina web amb la llista de graus de la UPC
+URL_PRINCIPAL = 'https://www.upc.edu/ca/graus/'
+
+
+
+def crawlscrape_url_principal(sessio = None, analitzador = 'bs4', url = URL_PRINCIPAL):
+    """
+    Funció que retorna una llista amb les adreces de les pàgines web de cadascun dels graus
+    que oferta la UPC, per al seu crawling/scraping posterior.
+
+    Paràmetres:
+        sessio : objecte SessioHTTP que es passa a descarrega_url()
+        analitzador : analitzador HTML a emprar, 'bs4' (valor per defecte), 'bs4-parcial' o 'lxml'
+                      (vegeu ANALITZADORS)
+        url : adreça de la pàgina web amb la llista de graus (per defecte, URL_PRINCIPAL)
+    
+    Retorna:
+        graus          : llista amb les url (normalitzades amb normalitza_url() i sense repeticions)
+                         de les pàgines web de cadascun dels graus que oferta la UPC.
+                         Si hi ha hagut algun error, retorna una llista buida
+        codi_error     : codi d'error de la funció descarrega_url()
+        missatge_error : missatge d'error de la funció descarrega_url()
+    """
+    
+    html, codi_error, missatge_error = descarrega_url(url,
+                                                      timeout = 10, retorna = 'binari',
+                                                      sessio = sessio)
+
+    if codi_error:
+        # Si hi ha hagut algun error, retornem una llista buida
+        graus = []
+        return graus, codi_error, missatge_error
+    
+    # Creem l'arbre del document (o, segons l'analitzador, només dels grups de graus) emprant el
+    # parser HTML de la llibreria lxml, instalada
+    nav = ANALITZADORS[analitzador]
+    doc_UPC = nav.document(html, 'div', id_conte = 'collapse-images-collapse')
+
+    # Obeneim els tags dels grups de graus
+    tags_grups = nav.cerca_tots(doc_UPC, 'div', id_conte = 'collapse-images-collapse')
+
+    # Obtenim els graus a dins de cada grup
+    graus_aux = [nav.cerca_tots(x, 'li') for x in tags_grups]
+
+    # Aplanem la llista
+    tags_graus = [x for subllista in graus_aux for x in subllista]
+
+    # Obtenim la llista d'adreces web dels graus, normalitzades i sense repeticions
+    graus = list(dict.fromkeys(normalitza_url(nav.atribut(nav.cerca(i, 'a'), 'href'), base = url)
+                               for i in tags_graus))
+    
+    return graus, codi_error, missatge_error
+
+
+
+def crawl_cataleg(url_inicial, es_programa, dominis = None, profunditat_maxima = 2, prioritat = None,
+                  max_pagines = 500, visitats = None, sessio = None, limitador = None, analitzador = 'bs4',
+                  verbose = True):
+    """
+    Funció que retorna una llista amb les adreces de les pàgines web dels programes (graus,
+    màsters...) d'un catàleg qualsevol, seguint els enllaços de les pàgines del catàleg a partir
+    de url_inicial amb una FronteraCrawl, en comptes de l'estructura de la pàgina de graus de
+    la UPC que analitza crawlscrape_url_principal().
+
+    Paràmetres:
+        url_inicial : adreça de la pàgina inicial del catàleg
+        es_programa : funció que rep una url (normalitzada) i retorna True si és la pàgina d'un
+                      programa. Les pàgines dels programes no es descarreguen ni se'n segueixen
+                      els enllaços
+        dominis, profunditat_maxima, prioritat, visitats : paràmetres de FronteraCrawl. Si no
+                      s'indiquen dominis, només se segueixen els enllaços al host de url_inicial
+        max_pagines : nombre màxim de pàgines del catàleg que es descarreguen (per defecte, 500)
+        sessio : objecte SessioHTTP que es passa a descarrega_url()
+        limitador : objecte LimitadorHosts amb què s'espaien les peticions a cada host. Per defecte, cap
+        analitzador : analitzador HTML a emprar (vegeu ANALITZADORS)
+        verbose : si val True, es mostren les pàgines que no s'han pogut obtenir
+
+    Retorna:
+        programes      : llista amb les url normalitzades dels programes, sense repeticions i en
+                         l'ordre en què s'han trobat. Si no s'ha pogut obtenir la pàgina inicial,
+                         retorna una llista buida
+        codi_error     : codi d'error de la funció descarrega_url() per a la pàgina inicial
+        missatge_error : missatge d'error de la funció descarrega_url() per a la pàgina inicial
+    """
+    nav = ANALITZADORS[analitzador]
+    if not dominis:
+        dominis = [up.urlsplit(normalitza_url(url_inicial)).hostname]
+    frontera = FronteraCrawl(dominis, profunditat_maxima, prioritat, visitats)
+    frontera.afegeix(url_inicial)
+
+    programes = {}
+    pagines = 0
+    while pagines < max_pagines:
+        seguent = frontera.seguent()
+        if seguent is None:
+            break
+        url, profunditat = seguent
+        if limitador:
+            limitador.espera(url)
+        html, codi_error, missatge_error = descarrega_url(url, timeout = 10, retorna = 'binari',
+                                                          sessio = sessio, limitador = limitador)
+        pagines += 1
+        if codi_error:
+            if pagines == 1:
+                return [], codi_error, missatge_error
+            if verbose:
+                print("No s'ha pogut obtenir la pàgina del catàleg " + url + ": " + str(missatge_error))
+            continue
+
+        with metriques.mesura('analisi', url = url):
+            doc = nav.document(html, 'a')
+            enllacos = nav.cerca_tots(doc, 'a') if doc is not None else []
+            for enllac in enllacos:
+                try:
+                    href = nav.atribut(enllac, 'href')
+                except KeyError:
+                    continue
+                url_enllac = normalitza_url(href, base = url, alies_hosts = frontera.alies_hosts)
+                if es_programa(url_enllac):
+                    if frontera.admet_domini(url_enllac):
+                        programes.setdefault(url_enllac)
+                else:
+                    frontera.afegeix(url_enllac, profunditat + 1)
+
+    return list(programes), 0, None
+
+
+
+@functools.lru_cache(maxsize = 4096)
+def _valor_compacte(text, tipus):
+    # Retorna text convertit a tipus (un objecte compartit per a cada text) si se'n pot tornar a
+    # obtenir el mateix text, o bé el text internat
+    valor = a_nombre(text, tipus)
+    if valor is not None and _text_valor(valor) == text:
+        return valor
+    return sys.intern(text)
+
+
+
+def _text_valor(valor):
+    # Text d'un valor d'Assignatura, tal com apareix a la pàgina web (6.0 -> '6')
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return str(valor)
+
+
+
+class Assignatura(collections.abc.Mapping):
+    """
+    Dades d'una assignatura en una representació compacta: un objecte amb __slots__ en comptes
+    d'un diccionari, amb els crèdits i el semestre en format numèric i el tipus i la menció
+    internats, de manera que els valors que es repeteixen a tot el catàleg només ocupen memòria
+    una vegada (unes 2 vegades menys memòria per assignatura, i unes 5 sense comptar el nom i
+    l'url).
+    Es comporta com el diccionari {'Nom', 'Semestre', 'Càrrega lectiva', 'URL', 'Tipus', 'Menció'}
+    de crawlscrape_url_grau(), amb tots els valors en format text (assignatura['Semestre'] val
+    '3'), i se'n pot modificar qualsevol camp (assignatura['Menció'] = ''). Per a desar-la en
+    format JSON, json.dumps(..., default = dict).
+
+    Atributs:
+        nom, url, tipus, mencio : textos de l'assignatura
+        semestre : semestre (int) o, si no és un nombre enter, el text original
+        credits : càrrega lectiva en crèdits ECTS (float) o, si no és un nombre, el text original
+    """
+    __slots__ = ('nom', 'semestre', 'credits', 'url', 'tipus', 'mencio')
+
+    # Atribut de cada clau del diccionari equivalent
+    ATRIBUTS = {'Nom': 'nom',
+                'Semestre': 'semestre',
+                'Càrrega lectiva': 'credits',
+                'URL': 'url',
+                'Tipus': 'tipus',
+                'Menció': 'mencio'}
+    _TIPUS_NUMERIC = {'semestre': int, 'credits': float}
+    # Atributs de poca cardinalitat, que s'internen. El nom i l'url no: són gairebé únics, i la
+    # taula de textos internats ocuparia més del que s'estalvia
+    _INTERNATS = ('tipus', 'mencio')
+
+    def __init__(self, nom, semestre, carrega_lectiva, url, tipus, mencio):
+        for atribut, valor in zip(self.__slots__, (nom, semestre, carrega_lectiva, url, tipus, mencio)):
+            self._assigna(atribut, valor)
+
+    @classmethod
+    def de_diccionari(cls, dades):
+        """
+        Retorna l'Assignatura amb les dades del diccionari dades (amb les claus de ATRIBUTS).
+        """
+        return cls(dades['Nom'], dades['Semestre'], dades['Càrrega lectiva'], dades['URL'],
+                   dades['Tipus'], dades['Menció'])
+
+    def _assigna(self, atribut, valor):
+        if atribut in self._TIPUS_NUMERIC:
+            if isinstance(valor, str) or valor is None:
+                valor = _valor_compacte(str(valor), self._TIPUS_NUMERIC[atribut])
+        elif atribut in self._INTERNATS:
+            valor = sys.intern(str(valor))
+        else:
+            valor = str(valor)
+        setattr(self, atribut, valor)
+
+    def __getitem__(self, clau):
+        return _text_valor(getattr(self, self.ATRIBUTS[clau]))
+
+    def __setitem__(self, clau, valor):
+        self._assigna(self.ATRIBUTS[clau], valor)
+
+    def __iter__(self):
+        return iter(self.ATRIBUTS)
+
+    def __len__(self):
+        return len(self.ATRIBUTS)
+
+    def __repr__(self):
+        return 'Assignatura({!r})'.format(dict(self))
+
+    def __reduce__(self):
+        # En desserialitzar-la (per exemple, en rebre-la d'un altre procés), els textos es tornen a internar
+        return (self.__class__, tuple(getattr(self, atribut) for atribut in self.__slots__))
+
+
+
+def elimina_duplicats_mencions(assignatures, nombre_mencions):
+    """
+    Funció que, en un grau amb mencions, fusiona les assignatures que apareixen a totes les
+    mencions en una única assignatura sense menció.
+
+    Paràmetres:
+        assignatures : llista d'assignatures (Assignatura o diccionaris), amb el format de crawlscrape_url_grau()
+        nombre_mencions : nombre de mencions del grau
+
+    Retorna:
+        llista d'assignatures sense els duplicats, en el mateix ordre. Quan una assignatura (mateixos
+        'Nom', 'Tipus' i 'URL') apareix nombre_mencions vegades, es conserva la primera d'aquestes
+        aparicions, amb 'Menció' buida, i s'eliminen les posteriors. Si n'hi ha més aparicions
+        (k > nombre_mencions), es conserven les k - nombre_mencions primeres i es fusionen les
+        nombre_mencions darreres, com feia la cerca de duplicats per parells original.
+    """
+    # Agrupem les posicions de cada assignatura en una sola passada
+    posicions = {}
+    for i, assignatura in enumerate(assignatures):
+        posicions.setdefault((assignatura['Nom'], assignatura['Tipus'], assignatura['URL']), []).append(i)
+
+    eliminades = set()
+    for grup in posicions.values():
+        if len(grup) >= nombre_mencions:
+            primera = len(grup) - nombre_mencions
+            assignatures[grup[primera]]['Menció'] = ''
+            eliminades.update(grup[primera+1:])
+
+    return [x for i, x in enumerate(assignatures) if i not in eliminades]
+
+
+
+def genera_grau(html, url_grau, verbose = True, analitzador = 'bs4'):
+    """
+    Generador que extreu la informació d'un grau del codi html de la seva pàgina web, i la va
+    retornant a mesura que l'analitza, sense acumular-la.
+
+    Paràmetres:
+        html : codi html (bytes o text) de la pàgina web del grau
+        url_grau : adreça de la pàgina web del grau
+        verbose : si val True (valor per defecte) imprimeix informació sobre el
+                  grau que està tractant i problemes trobats
+        analitzador : analitzador HTML a emprar, 'bs4' (valor per defecte), 'bs4-parcial' o 'lxml'
+                      (vegeu ANALITZADORS). Tots tres retornen el mateix resultat
+
+    Genera tuples (tipus, dades):
+        ('grau', {'Nom', 'URL', 'Càrrega lectiva'}) : dades generals del grau, en primer lloc
+        ('assignatura', Assignatura)                 : una per assignatura, amb el format de
+                                                        crawlscrape_url_grau(). Es generen en
+                                                        acabar d'analitzar cada semestre (en graus
+                                                        amb mencions, en acabar el pla d'estudis,
+                                                        un cop eliminats els duplicats)
+        ('error', (codi_error, missatge_error))       : si no s'ha pogut obtenir ni el nom del
+                                                        grau (codi_error -4). És l'únic element
+                                                        generat
     """
 
-    # Desarem la informació del grau a un diccionari
+    # Desarem la informació general del grau a un diccionari
     grau = {}
-    
-    #Descarreguem el contingut del lloc web
-    html_aux, codi_error, missatge_error = descarrega_url(url_grau, timeout = 10,
-                                                          retorna = 'binari')
-    
-    # Si hi ha hagut algun problema, n'informem i retornem un diccionari buit amb el
-    # codi i missatge d'error
-    if codi_error:
-        if verbose:
-            print("No s'ha pogut descarregar la informació del lloc web "+url_grau)
-        return grau, codi_error, missatge_error
-    
+
     # Comencem el procés d'scraping
-    bs_aux = bs4.BeautifulSoup(html_aux, 'lxml')
-    bs_aux = bs_aux.body.find('div', id = 'main-container')
+    nav = ANALITZADORS[analitzador]
+    doc_aux = nav.cerca(nav.document(html, 'div', id = 'main-container'), 'div', id = 'main-container')
     
     ###########################
     # Obtenim el nom del grau #
     ###########################
     try:
-        tag_nom = bs_aux.header.find('h1', id = 'degree-name')
+        tag_nom = nav.cerca(nav.cerca(doc_aux, 'header'), 'h1', id = 'degree-name')
         # Per a emprar una cadena fora de bs4, millor assignar-la mitjançant unicode() o str()
         # a una altra cadena. Sinó, conserva el tipus original i una referencia a l'objecte bs4
         # del qual prové, que no es destruieix fins que no ho fa la cadena: es malgasta memòria
-        nom = str(tag_nom.string).strip()
+        nom = str(nav.cadena(tag_nom)).strip()
         grau['Nom'] = nom
         if verbose:
             print(nom.upper())
@@ -316,22 +2425,21 @@ def crawlscrape_url_grau(url_grau, verbose = True, desa_pdfs = False, nom_direct
         # Si hi ha algun problema abandonem la funció sense retornar res
         if verbose:
             print("No s'ha pogut resoldre el nom del grau a " + url_grau)
-        grau = {}
-        codi_error = -4
-        missatge_error
-        return grau, codi_error, missatge_error
+        yield 'error', (-4, "No s'ha pogut resoldre el nom del grau")
+        return
 
     ####################################################################################
     # Obtenim els crèdits del màster (hi ha màsters que no tenen informació acadèmica) #
     ####################################################################################
     try:
-        tag_inf_academ = bs_aux.find('div', id = 'collapse-images-collapse-academic-information').dl
+        tag_inf_academ = nav.cerca(nav.cerca(doc_aux, 'div', id = 'collapse-images-collapse-academic-information'),
+                                   'dl')
         # Noms de la informació
-        tags_dt = tag_inf_academ.find_all('dt')
-        noms_dt = [str(x.string).strip() for x in tags_dt]
+        tags_dt = nav.cerca_tots(tag_inf_academ, 'dt')
+        noms_dt = [str(nav.cadena(x)).strip() for x in tags_dt]
         # valors de la informació
-        tags_dd = tag_inf_academ.find_all('dd')
-        noms_dd = [str(x.string).strip() for x in tags_dd]
+        tags_dd = nav.cerca_tots(tag_inf_academ, 'dd')
+        noms_dd = [str(nav.cadena(x)).strip() for x in tags_dd]
         #Obtenim l'índex de la càrrega lectiva, si hi és, i el seu valor
         index = noms_dt.index('Càrrega lectiva')
         grau['Càrrega lectiva'] = noms_dd[index][0:3]
@@ -340,15 +2448,17 @@ def crawlscrape_url_grau(url_grau, verbose = True, desa_pdfs = False, nom_direct
         grau['Càrrega lectiva'] = ''
         if verbose:
             print("  No s'ha pogut obtenir la càrrega lectiva ")
+
+    yield 'grau', grau
     
     #############################################
     # Si n'hi ha, obtenim les mencions del grau #
     #############################################
-    tags_mencions = bs_aux.find('div', class_ = 'pla-estudis-selector')
-    if tags_mencions:
+    tags_mencions = nav.cerca(doc_aux, 'div', classe = 'pla-estudis-selector')
+    if tags_mencions is not None:
         # Si existeix el tag anterior, n'extraiem les mencions
-        tags_mencions = tags_mencions.ul.find_all('li')
-        mencions = {x['target']: x.string for x in tags_mencions}
+        tags_mencions = nav.cerca_tots(nav.cerca(tags_mencions, 'ul'), 'li')
+        mencions = {nav.atribut(x, 'target'): nav.cadena(x) for x in tags_mencions}
         # Simplifiquem el nom de les mencions amb expressions regulars
         mencions = {k : re.sub(r'^Menció en *', '', re.sub(r'kkk$', '', mencions[k]))
                     for k in mencions.keys()}
@@ -360,125 +2470,957 @@ def crawlscrape_url_grau(url_grau, verbose = True, desa_pdfs = False, nom_direct
     # Hi ha graus que no el tenen, i hi ha graus que tenen formats lleugeramanet     #
     # diferents per a les dades de les assignatures.                                 #
     ##################################################################################
-    grau['Assignatures'] = []
     try:
         # Obtenim la llista de tags de semestres
-        tags_semestres = bs_aux.find('div', id = 'collapse-images-collapse-curriculum')
-        tags_semestres = tags_semestres.find_all('div', attrs = {'class': 'pla-estudis-quadrimestre',
-                                                                 'id': False})
+        tags_semestres = nav.cerca(doc_aux, 'div', id = 'collapse-images-collapse-curriculum')
+        tags_semestres = nav.cerca_tots(tags_semestres, 'div', classe = 'pla-estudis-quadrimestre',
+                                        sense_id = True)
         # Si obtenim una llista buida de semestres, informem que no s'ha pogut obtenir el pla
         # d'estudis i retornem
         if not tags_semestres:
             if verbose:
                 print("  No s'ha pogut obtenir el pla d'estudis")
-            # Tot i que no s'han pogut obtenir les assignatures, es retorna el codi
-            # d'error de descarrega_url que, si s'ha arribat ací, és 0 (sense error)
-            return grau, codi_error, missatge_error
+            return
     except:
         # Si hi ha hagut algun altre problema, també sortim
         if verbose:
             print("  No s'ha pogut obtenir el pla d'estudis")
-        return grau, codi_error, missatge_error
+        return
     
-    # Extraiem les dades d'assignatures de cada semestre, i les desem a la llista
+    # Extraiem les dades d'assignatures de cada semestre, i les desem a una llista per semestre.
+    # En graus amb mencions, cal acumular-les totes per a poder-ne eliminar els duplicats
+    assignatures_mencions = []
     for s in range(len(tags_semestres)):
         semestre = s+1
+        assignatures_semestre = []
         try:
-            tags_assignatures = tags_semestres[s].ul.find_all('li')
+            tags_assignatures = nav.cerca_tots(nav.cerca(tags_semestres[s], 'ul'), 'li')
 
             for assignatura in tags_assignatures:
-                if len(assignatura['class'])==2:
+                classes = nav.classes(assignatura)
+                if len(classes)==2:
                     # En graus sense mencions class té dos atributs, "sense-especialitat" i
                     # "Obligatòria"/"Optativa"/"Projecte"
                     mencio = ''
                 else:
                     # En graus sense mencions class té tres atributs, "especialitat", "especialitat-i" i
                     # "Obligatòria"/"Optativa"/"Projecte"
-                    mencio = mencions[assignatura['class'][1]]
-                tipus = assignatura['class'][-1] # Obligatòria, Optativa o Projecte                
-                carrega_lectiva = str(assignatura.span.string)
+                    mencio = mencions[classes[1]]
+                tipus = classes[-1] # Obligatòria, Optativa o Projecte                
+                carrega_lectiva = str(nav.cadena(nav.cerca(assignatura, 'span')))
                  # Si l'assignatura té el tag a, que conté el nom i adreça web de l'assignatura
-                if assignatura.a:
-                    adreca_web = assignatura.a['href']
-                    nom = str(assignatura.a.string).strip()
+                tag_a = nav.cerca(assignatura, 'a')
+                if tag_a is not None:
+                    adreca_web = normalitza_url(nav.atribut(tag_a, 'href'), base = url_grau)
+                    nom = str(nav.cadena(tag_a)).strip()
                 else:
                     # Sinó, el nom és directament al contingut del tag li, amb altres elements.
                     # Recuperem tots els continguts del tag, eliminant els continguts que són espais
                     # blans, en una llista. El primer element serà el nom de l'assignatura
                     adreca_web = ''
-                    nom = str([x for x in assignatura.contents if x not in [' ']][0]).strip()
-                # Desem les dades a un diccionari per assignatura i l'adjuntem a la llista d'assignatures
-                # del pla d'estudis.
-                grau['Assignatures'].append({'Nom': nom,
-                                             'Semestre': str(semestre),
-                                             'Càrrega lectiva': carrega_lectiva,
-                                             'URL': adreca_web,
-                                             'Tipus': tipus,
-                                             'Menció': mencio})
+                    nom = nav.text([x for x in nav.continguts(assignatura) if x not in [' ']][0]).strip()
+                # Desem les dades a una Assignatura (que es comporta com un diccionari, però ocupa
+                # molta menys memòria) i l'adjuntem a la llista d'assignatures del semestre.
+                assignatures_semestre.append(Assignatura(nom, semestre, carrega_lectiva, adreca_web,
+                                                         tipus, mencio))
         except:
             if verbose:
                 print("  No s'han pogut extreure (algunes de) les assignatures del semestre " + 
                       str(semestre))
+        if mencions:
+            assignatures_mencions.extend(assignatures_semestre)
+        else:
+            for assignatura in assignatures_semestre:
+                yield 'assignatura', assignatura
 
     #######################################################################
     # Per a graus amb mencions, eliminem duplicats d'assignatures comunes # 
     # a TOTES les mencions                                                #
     #######################################################################
-    if mencions and grau['Assignatures']:
-        i = 0
-        while i<len(grau['Assignatures']):
-            # Busquem les posicions dels duplicats d'una assignatura
-            posicions_duplicats = [j for j in range(i+1, len(grau['Assignatures'])) if (
-                                   grau['Assignatures'][j]['Nom'] == grau['Assignatures'][i]['Nom'] and
-                                   grau['Assignatures'][j]['Tipus'] == grau['Assignatures'][i]['Tipus']  and
-                                   grau['Assignatures'][j]['URL'] == grau['Assignatures'][i]['URL'])]
-            # Si n'hi ha un menys que el nombre de mencions, els esborrem i eliminen la referència a la menció
-            if len(posicions_duplicats) == len(mencions)-1:
-                grau['Assignatures'][i]['Menció'] = ''
-                for j in posicions_duplicats[::-1]:
-                    del grau['Assignatures'][j]
-                
-            i += 1
+    if mencions and assignatures_mencions:
+        with metriques.mesura('duplicats'):
+            assignatures_mencions = elimina_duplicats_mencions(assignatures_mencions, len(mencions))
+        for assignatura in assignatures_mencions:
+            yield 'assignatura', assignatura
+
+
+
+def analitza_grau(html, url_grau, verbose = True, analitzador = 'bs4'):
+    """
+    Funció que extreu la informació d'un grau del codi html de la seva pàgina web, recollint
+    els elements generats per genera_grau().
+
+    Paràmetres:
+        html, url_grau, verbose, analitzador : paràmetres que es passen a genera_grau()
+
+    Retorna:
+        grau, codi_error, missatge_error : amb el format de crawlscrape_url_grau(). codi_error val
+                                           0, o -4 si no s'ha pogut obtenir ni el nom del grau
+    """
+    grau = {}
+    with metriques.mesura('analisi', url = url_grau, analitzador = analitzador):
+        for tipus, dades in genera_grau(html, url_grau, verbose = verbose, analitzador = analitzador):
+            if tipus == 'error':
+                codi_error, missatge_error = dades
+                return {}, codi_error, missatge_error
+            if tipus == 'grau':
+                grau = dict(dades)
+                grau['Assignatures'] = []
+            else:
+                grau['Assignatures'].append(dades)
+    return grau, 0, None
+
+
+
+def desa_pdfs_grau(assignatures, nom_directori = ".\\", sessio = None, limitador = None, diari = None,
+                   magatzem = None, intents = 0, verbose = True):
+    """
+    Funció que desa els documents pdf de les assignatures d'un grau (les que en tenen URL), amb els
+    paràmetres de crawlscrape_url_grau(). Si s'indica diari, no es tornen a descarregar els que ja
+    hi consten com a desats, i s'hi registra el resultat de la resta.
+
+    Paràmetres:
+        assignatures : llista d'assignatures, amb el format de crawlscrape_url_grau()
+        nom_directori, sessio, limitador, diari, magatzem, verbose : com a crawlscrape_url_grau()
+        intents : nombre de reintents dels errors transitoris (vegeu executa_amb_reintents())
+    """
+    # Establim un temporitzador relatiu a intèrvals de 5 segons i l'executem
+    # una 1a vegada per a fixar darrer:fi_espera
+    # (o emprem el limitador per host, si n'hi ha)
+    if not limitador:
+        temp2 = Temporitzador(5, 'relatiu')
+        temp2.espera()
+        # El Crawl-delay es consulta per a l'agent usuari amb què es fan les peticions (com el
+        # permís de robots.txt a descarrega_url())
+        agent_usuari = (sessio if sessio else sessio_per_defecte).agent_usuari
+    for assignatura in assignatures:
+        # Si l'assignatura té adreça web del seu document pdf associat,
+        # el descarreguem, respectant el Crawl-delay del robots.txt si és més gran
+        if assignatura['URL'] and not (diari and diari.pdf_desat(assignatura['URL'])) and \
+           not (magatzem and magatzem.reutilitza(assignatura['URL'])):
+            if limitador:
+                limitador.espera(assignatura['URL'], 5)
+            else:
+                temp2.espera(max(temp2.temps_espera,
+                                 cau_robots.crawl_delay(agent_usuari, assignatura['URL'])))
+            try: 
+                # Com que aquest és un procés secundari, informem si hi
+                # ha hagut algun problema, però no passem els codis d'error
+                # cap a nivells superiors de codi ni sortim de la funció
+                codi_error_aux, missatge_error_aux = \
+                  executa_amb_reintents(descarrega_pdf, assignatura['URL'],
+                                        intents = intents,
+                                        espera_inicial = 5,
+                                        nom_directori = nom_directori,
+                                        sessio = sessio,
+                                        limitador = limitador,
+                                        magatzem = magatzem)
+                if diari:
+                    diari.registra_pdf(assignatura['URL'], codi_error_aux, missatge_error_aux)
+                if verbose and codi_error_aux:
+                    print("  Hi ha hagut algun problema amb l'obtenció del document" +
+                            "pdf de la url " + assignatura['URL'])
+            except:
+                if verbose:
+                    print("  No s'han pogut desar el document pdf de la url " + 
+                          assignatura['URL'])
+
+
+
+def crawlscrape_url_grau(url_grau, verbose = True, desa_pdfs = False, nom_directori = ".\\",
+                         sessio = None, limitador = None, analitzador = 'bs4', diari = None,
+                         magatzem = None, executor = None, intents_pdf = None):
+    """
+    Funció que obté, a partir de l'URL de la pàgina web d'un grau oficial  
+    de la UPC,la informació rellevant sobre el mateix.
+    
+    Paràmetres:
+        url_grau : adreça de la pàgina web del grau
+        verbose : si val True (valor per defecte) imprimeix informació sobre el
+                  grau que està tractant i problemes trobats
+        desa_pdfs : si val True, es desen els documents pdf disponibles associats
+                    a les assignatures del grau al directori (existent) especificat. 
+                    Valor per defecte: False.
+        nom_directori : directori on es desaran els documents pdf de les assignatures. 
+                        Valor per defecte: ".\".
+        sessio : objecte SessioHTTP que es passa a descarrega_url() i descarrega_pdf()
+        limitador : objecte LimitadorHosts que espaia les peticions per host. Si s'indica,
+                    s'espera el temps per defecte del limitador abans de descarregar la pàgina
+                    del grau i 5 s entre documents pdf del mateix host. Si no, no s'espera abans
+                    de la pàgina del grau (l'espaiat és responsabilitat de qui crida la funció) i
+                    s'espaien els documents pdf amb un temporitzador propi de 5 s. Amb un
+                    LimitadorAdaptatiu, l'espera la determinen les respostes de cada host, de les
+                    quals se l'informa
+        analitzador : analitzador HTML que es passa a analitza_grau()
+        diari : objecte DiariCrawl on es registren els documents pdf desats. Si s'indica, no
+                es tornen a descarregar els que ja hi consten com a desats, i els errors
+                transitoris es reintenten amb executa_amb_reintents()
+        magatzem : objecte MagatzemPdf on es desen els documents pdf (en comptes de a
+                   nom_directori). Els que ja hi són vigents no es tornen a descarregar
+        executor : objecte concurrent.futures.ProcessPoolExecutor. Si s'indica, l'anàlisi del
+                   codi html (analitza_grau()) es fa en un dels seus processos, i el fil que crida
+                   la funció només descarrega i espera el resultat (sense retenir el GIL)
+        intents_pdf : nombre de reintents dels errors transitoris dels documents pdf. Per defecte,
+                      4 si s'indica diari, i 0 si no
+
+    Retorna:
+        grau: diccionari amb la informació recopilada amb el format següent:
+                { 'Nom' :             nom del grau
+                  'URL' :      adreça de la pàgina web del grau
+                  'Càrrega lectiva' : nombre de crèdits ECTS del grau
+                  'Assignatures' : [ Assignatura, que es comporta com el diccionari
+                                     { 'Nom' :             nom de l'assignatura,
+                                       'Semestre' :        semestre en què s'imparteix,
+                                       'Càrrega lectiva' : càrrega lectiva en crèdits ECTS
+                                       'URL' :      adreça de la pàgina web de l'assignatura,
+                                       'Tipus':            Obligatòria, Optativa o Projecte
+                                       'Menció':           Menció o especialitat de l'assignatura
+                                     },
+                                     ...
+                                   ]
+                }
+        codi_error : 0 si tot és correcte. Sinó, el codi d'error heretat de
+                     descarrega_url() o analitza_grau() (-4 si no ha pogut obtenir ni el
+                     nom del grau)
+        missatge_error : missatge d'error associat a codi_error
+
+    Nota: Per a les dades que manquen retorna el valor ''.
+    """
+
+    #Descarreguem el contingut del lloc web
+    if limitador:
+        limitador.espera(url_grau)
+    html_aux, codi_error, missatge_error = descarrega_url(url_grau, timeout = 10,
+                                                          retorna = 'binari', sessio = sessio,
+                                                          limitador = limitador)
+    
+    # Si hi ha hagut algun problema, n'informem i retornem un diccionari buit amb el
+    # codi i missatge d'error
+    if codi_error:
+        if verbose:
+            print("No s'ha pogut descarregar la informació del lloc web "+url_grau)
+        return {}, codi_error, missatge_error
+    
+    # Extraiem la informació del grau del codi html, en un altre procés si hi ha executor (el
+    # codi html hi passa tal com s'ha descarregat, en bytes, sense descodificar-lo)
+    if executor is None:
+        grau, codi_error, missatge_error = analitza_grau(html_aux, url_grau, verbose = verbose,
+                                                         analitzador = analitzador)
+    else:
+        with metriques.mesura('analisi', url = url_grau, analitzador = analitzador):
+            grau, codi_error, missatge_error = executor.submit(analitza_grau, html_aux, url_grau,
+                                                              verbose, analitzador).result()
+    if codi_error or not grau['Assignatures']:
+        return grau, codi_error, missatge_error
 
     ###########################################################################
     # Si cal desem els documents pdf associats a les assignatures disponibles #
     ###########################################################################
     if desa_pdfs and grau['Assignatures']:
-        # Establim un temporitzador relatiu a intèrvals de 5 segons i l'executem
-        # una 1a vegada per a fixar darrer:fi_espera
-        temp2 = Temporitzador(5, 'relatiu')
-        temp2.espera()
-        for assignatura in grau['Assignatures']:
-            temp2.espera()
-            # Si l'assignatura té adreça web del seu document pdf associat,
-            # el descarreguem
-            if assignatura['URL']:
-                try: 
-                    # Com que aquest és un procés secundari, informem si hi
-                    # ha hagut algun problema, però no passem els codis d'error
-                    # cap a nivells superiors de codi ni sortim de la funció
-                    codi_error_aux, missatge_error_aux = \
-                      descarrega_pdf(assignatura['URL'],
-                                     nom_directori = nom_directori)
-                    if verbose and codi_error_aux:
-                        print("  Hi ha hagut algun problema amb l'obtenció del document" +
-                                "pdf de la url " + assignatura['URL'])
-                except:
-                    if verbose:
-                        print("  No s'han pogut desar el document pdf de la url " + 
-                              assignatura['URL'])
+        desa_pdfs_grau(grau['Assignatures'], nom_directori = nom_directori, sessio = sessio,
+                       limitador = limitador, diari = diari, magatzem = magatzem,
+                       intents = (4 if diari else 0) if intents_pdf is None else intents_pdf,
+                       verbose = verbose)
            
     return grau, codi_error, missatge_error
 
 
 
+# Capçalera dels fitxers de dades (una fila per assignatura, amb les dades del grau repetides)
+CAPCALERA = ['Nom grau',
+             'URL grau',
+             'Crèdtis grau',
+             'Nom assig',
+             'URL assig',
+             'Crèdits assig',
+             'Tipus assig',
+             'Semestre assig',
+             'Menció assig']
+
+
+
+def fila_assignatura(grau, assignatura = None):
+    """
+    Funció que retorna la fila dels fitxers de dades, amb les columnes de CAPCALERA, d'una
+    assignatura amb les dades generals del seu grau (grau, amb les claus 'Nom', 'URL' i 'Càrrega
+    lectiva'). Si no s'indica cap assignatura, retorna la fila amb les dades generals del grau i
+    sense cap dada d'assignatura.
+    """
+    if assignatura is None:
+        return [grau['Nom'], grau['URL'], grau['Càrrega lectiva'], '', '', '', '', '', '']
+    return [grau['Nom'],
+            grau['URL'],
+            grau['Càrrega lectiva'],
+            assignatura['Nom'],
+            assignatura['URL'],
+            assignatura['Càrrega lectiva'],
+            assignatura['Tipus'],
+            assignatura['Semestre'],
+            assignatura['Menció']]
+
+
+
+def files_grau(dades):
+    """
+    Funció que converteix les dades d'un grau (amb el format de crawlscrape_url_grau()) en les
+    files dels fitxers de dades, amb les columnes de CAPCALERA: una fila per assignatura amb les
+    dades generals del grau repetides o, si no s'ha pogut obtenir cap assignatura, una única fila
+    amb les dades generals del grau i sense cap dada d'assignatura.
+    """
+    if dades['Assignatures']:
+        return [fila_assignatura(dades, x) for x in dades['Assignatures']]
+    return [fila_assignatura(dades)]
+
+
+
+def a_nombre(text, tipus = float):
+    """
+    Converteix text al tipus numèric indicat (per defecte, float). Retorna None si text és buit
+    o no és un nombre.
+    """
+    try:
+        return tipus(text)
+    except (TypeError, ValueError):
+        return None
+
+
+
+class Sortida:
+    """
+    Classe base de les sortides de dades (CSV, JSON Lines, Parquet, SQLite). Les sortides reben
+    les files de dades (llistes amb les columnes de CAPCALERA) a mesura que es generen, amb
+    escriu() o escriu_files(), i cal tancar-les amb tanca() (o emprar-les amb with).
+    """
+    def escriu(self, fila):
+        """
+        Escriu una fila de dades.
+        """
+        raise NotImplementedError
+
+    def escriu_files(self, files):
+        """
+        Escriu una llista de files de dades.
+        """
+        for fila in files:
+            self.escriu(fila)
+
+    def escriu_grau(self, dades):
+        """
+        Escriu les files del grau dades (amb el format de crawlscrape_url_grau()).
+        """
+        self.escriu_files(files_grau(dades))
+
+    def tanca(self):
+        """
+        Escriu les dades pendents i tanca la sortida.
+        """
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.tanca()
+
+
+
+class SortidaCSV(Sortida):
+    """
+    Sortida en format CSV, amb el mateix format que dades_graus_upc.csv: capçalera i tots els
+    camps entre cometes.
+    """
+    def __init__(self, cami):
+        self._f = open(cami, 'w', newline='')
+        self._writer = csv.writer(self._f, delimiter = ',', quoting = csv.QUOTE_ALL)
+        self._writer.writerow(CAPCALERA)
+
+    def escriu(self, fila):
+        self._writer.writerow(fila)
+
+    def escriu_files(self, files):
+        self._writer.writerows(files)
+
+    def tanca(self):
+        self._f.close()
+
+
+
+class SortidaJSONL(Sortida):
+    """
+    Sortida en format JSON Lines: un objecte JSON per fila, amb les claus de CAPCALERA.
+    """
+    def __init__(self, cami):
+        self._f = open(cami, 'w', encoding = 'utf-8')
+
+    def escriu(self, fila):
+        self._f.write(json.dumps(dict(zip(CAPCALERA, fila)), ensure_ascii = False) + '\n')
+
+    def tanca(self):
+        self._f.close()
+
+
+
+class SortidaParquet(Sortida):
+    """
+    Sortida en format columnar Parquet, amb els crèdits i el semestre en format numèric i els
+    camps de poca cardinalitat (dades del grau, tipus i menció) codificats com a diccionari
+    (categories). Les dades s'escriuen a mesura que s'obtenen, en grups de files de com a mínim
+    mida_grup files que no parteixen mai un grau.
+    Requereix la llibreria pyarrow.
+    """
+    def __init__(self, cami, mida_grup = 1):
+        """
+        Retorna un objecte de classe SortidaParquet que escriu a l'arxiu cami. Els graus es
+        desen en grups de files quan se n'han acumulat com a mínim mida_grup files (per defecte,
+        1: un grup de files per grau).
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Per a desar les dades en format Parquet cal la llibreria pyarrow")
+        self._pa = pa
+        self.mida_grup = mida_grup
+        text_categoric = pa.dictionary(pa.int32(), pa.string())
+        self.esquema = pa.schema([('Nom grau', text_categoric),
+                                  ('URL grau', text_categoric),
+                                  ('Crèdtis grau', pa.float64()),
+                                  ('Nom assig', pa.string()),
+                                  ('URL assig', pa.string()),
+                                  ('Crèdits assig', pa.float64()),
+                                  ('Tipus assig', text_categoric),
+                                  ('Semestre assig', pa.int16()),
+                                  ('Menció assig', text_categoric)])
+        self._escriptor = pq.ParquetWriter(cami, self.esquema)
+        self._files = []
+
+    def escriu(self, fila):
+        # Si ja hi ha prou files acumulades i comença un grau nou, en desem un grup de files
+        if len(self._files) >= self.mida_grup and fila[1] != self._files[-1][1]:
+            self._buida()
+        fila = list(fila)
+        fila[2] = a_nombre(fila[2])
+        fila[5] = a_nombre(fila[5])
+        fila[7] = a_nombre(fila[7], int)
+        self._files.append(fila)
+
+    def escriu_grau(self, dades):
+        Sortida.escriu_grau(self, dades)
+        if len(self._files) >= self.mida_grup:
+            self._buida()
+
+    def _buida(self):
+        if not self._files:
+            return
+        columnes = list(zip(*self._files))
+        taula = self._pa.Table.from_arrays(
+            [self._pa.array(columna).cast(camp.type) if self._pa.types.is_dictionary(camp.type)
+             else self._pa.array(columna, type = camp.type)
+             for columna, camp in zip(columnes, self.esquema)],
+            schema = self.esquema)
+        self._escriptor.write_table(taula)
+        self._files = []
+
+    def tanca(self):
+        self._buida()
+        self._escriptor.close()
+
+
+
+class SortidaSQLite(Sortida):
+    """
+    Sortida a una base de dades SQLite normalitzada, amb una taula de graus i una
+    d'assignatures (vegeu crea_esquema_sqlite()). Si la base de dades ja conté dades, només s'hi
+    afegeixen les dels graus que no hi consten (les files dels que ja hi són s'ometen), tret que
+    buida valgui True, cas en què se n'esborren abans totes les dades. L'atribut omeses compta
+    les files omeses.
+    """
+    def __init__(self, cami, buida = False):
+        self._bd = sqlite3.connect(cami)
+        crea_esquema_sqlite(self._bd)
+        if buida:
+            self._bd.execute("DELETE FROM assignatures")
+            self._bd.execute("DELETE FROM graus")
+            self._bd.commit()
+        self._id_graus = {}
+        self._existents = {url for url, in self._bd.execute("SELECT url FROM graus")}
+        self.omeses = 0
+
+    def _id_grau(self, fila):
+        id_grau = self._id_graus.get(fila[1])
+        if id_grau is None:
+            cursor = self._bd.execute("INSERT INTO graus (nom, url, credits) VALUES (?, ?, ?)",
+                                      (fila[0], fila[1], a_nombre(fila[2])))
+            id_grau = cursor.lastrowid
+            self._id_graus[fila[1]] = id_grau
+        return id_grau
+
+    def escriu(self, fila):
+        if fila[1] in self._existents:
+            self.omeses += 1
+            return
+        id_grau = self._id_grau(fila)
+        # Les files de graus sense assignatures només donen d'alta el grau
+        if fila[3] or fila[6]:
+            self._bd.execute("""INSERT INTO assignatures (grau_id, nom, url, credits, tipus, semestre, mencio)
+                                VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                             (id_grau, fila[3], fila[4], a_nombre(fila[5]), fila[6],
+                              a_nombre(fila[7], int), fila[8]))
+
+    def escriu_files(self, files):
+        Sortida.escriu_files(self, files)
+        self._bd.commit()
+
+    def tanca(self):
+        self._bd.commit()
+        self._bd.close()
+
+
+
+class SortidaDelta(Sortida):
+    """
+    Sortida que compara les dades del crawl amb la instantània de l'execució anterior i escriu
+    només els canvis, en format JSON Lines, un registre per canvi:
+        {'Tipus': 'grau' o 'assignatura',
+         'Operació': 'alta', 'baixa' o 'modificació',
+         'Clau': clau del grau o l'assignatura (resum hexadecimal de la seva identitat),
+         'Dades': dades actuals (o les anteriors, per a les baixes), amb les claus de CAPCALERA,
+         'Anterior': valors anteriors dels camps modificats (només en les modificacions)}
+    Un grau s'identifica per la seva URL, i una assignatura per l'URL del grau, el seu nom i el
+    nombre d'ordre entre les del grau amb el mateix nom (una assignatura que apareix a diverses
+    mencions hi consta diverses vegades), de manera que un canvi de crèdits, de semestre o de
+    menció és una modificació i no una baixa i una alta.
+    En tancar-la, la sortida desa la instantània actual per a la propera execució.
+    """
+    COLUMNES_GRAU = CAPCALERA[:3]
+    COLUMNES_ASSIGNATURA = CAPCALERA[1:2] + CAPCALERA[3:]
+
+    def __init__(self, cami, cami_instantania, elimina_absents = False):
+        """
+        Retorna un objecte de classe SortidaDelta amb els atributs següents:
+            cami : arxiu JSON Lines on s'escriuen els canvis
+            cami_instantania : arxiu JSON amb la instantània de l'execució anterior (si no
+                               existeix, totes les dades són altes), on es desa l'actual
+            elimina_absents : si val True, els graus de la instantània anterior que no s'han rebut
+                              en aquesta execució es donen de baixa. Si val False (valor per
+                              defecte), es mantenen a la instantània sense generar canvis, perquè
+                              poden ser graus que no s'han pogut obtenir. Es pot canviar abans de
+                              tancar la sortida, quan ja se sap si el crawl ha estat complet
+        """
+        self.cami_instantania = cami_instantania
+        self.elimina_absents = elimina_absents
+        self.canvis = collections.Counter()
+        self._anterior = {'graus': {}, 'assignatures': {}}
+        if os.path.exists(cami_instantania):
+            with open(cami_instantania, encoding = 'utf-8') as f:
+                self._anterior = json.load(f)
+        self._actual = {'graus': {}, 'assignatures': {}}
+        self._ordinals = collections.Counter()
+        self._f = open(cami, 'w', encoding = 'utf-8')
+
+    @staticmethod
+    def clau(*identitat):
+        """
+        Retorna la clau (resum SHA-1 hexadecimal de 16 caràcters) dels valors de identitat.
+        """
+        return hashlib.sha1(json.dumps(identitat, ensure_ascii = False).encode('utf-8')).hexdigest()[:16]
+
+    def _registra(self, tipus, clau, dades):
+        # Compara dades amb l'entrada clau de la instantània anterior i escriu el canvi, si n'hi ha
+        resum = self.clau(*dades.values())
+        taula = 'graus' if tipus == 'grau' else 'assignatures'
+        self._actual[taula][clau] = {'Resum': resum, 'Dades': dades}
+        anterior = self._anterior[taula].get(clau)
+        if anterior is None:
+            self._escriu_canvi(tipus, 'alta', clau, dades)
+        elif anterior['Resum'] != resum:
+            self._escriu_canvi(tipus, 'modificació', clau, dades,
+                               {k: v for k, v in anterior['Dades'].items() if dades.get(k) != v})
+
+    def _escriu_canvi(self, tipus, operacio, clau, dades, anterior = None):
+        registre = {'Tipus': tipus, 'Operació': operacio, 'Clau': clau, 'Dades': dades}
+        if anterior is not None:
+            registre['Anterior'] = anterior
+        self._f.write(json.dumps(registre, ensure_ascii = False) + '\n')
+        self.canvis[(tipus, operacio)] += 1
+
+    def escriu(self, fila):
+        url_grau = fila[1]
+        clau_grau = self.clau(url_grau)
+        if clau_grau not in self._actual['graus']:
+            self._registra('grau', clau_grau, dict(zip(self.COLUMNES_GRAU, fila[:3])))
+        # Les files de graus sense assignatures només donen d'alta el grau
+        if fila[3] or fila[6]:
+            ordinal = self._ordinals[(url_grau, fila[3])]
+            self._ordinals[(url_grau, fila[3])] += 1
+            self._registra('assignatura', self.clau(url_grau, fila[3], ordinal),
+                           dict(zip(self.COLUMNES_ASSIGNATURA, [url_grau] + list(fila[3:]))))
+
+    def tanca(self):
+        graus_rebuts = {entrada['Dades']['URL grau'] for entrada in self._actual['graus'].values()}
+        for taula, tipus in [('assignatures', 'assignatura'), ('graus', 'grau')]:
+            for clau, entrada in self._anterior[taula].items():
+                if clau in self._actual[taula]:
+                    continue
+                if self.elimina_absents or entrada['Dades']['URL grau'] in graus_rebuts:
+                    self._escriu_canvi(tipus, 'baixa', clau, entrada['Dades'])
+                else:
+                    self._actual[taula][clau] = entrada
+        self._f.close()
+
+        with open(self.cami_instantania + '.part', 'w', encoding = 'utf-8') as f:
+            json.dump(self._actual, f, ensure_ascii = False)
+        os.replace(self.cami_instantania + '.part', self.cami_instantania)
+
+
+
+def crea_esquema_sqlite(bd):
+    """
+    Crea (si no existeixen) a la connexió SQLite bd les taules normalitzades de les dades:
+        graus (id, nom, url, credits)
+        assignatures (id, grau_id, nom, url, credits, tipus, semestre, mencio)
+    i els índexs de les assignatures per grau, tipus, menció i semestre.
+    """
+    bd.execute("""CREATE TABLE IF NOT EXISTS graus (
+                      id INTEGER PRIMARY KEY,
+                      nom TEXT,
+                      url TEXT UNIQUE,
+                      credits REAL)""")
+    bd.execute("""CREATE TABLE IF NOT EXISTS assignatures (
+                      id INTEGER PRIMARY KEY,
+                      grau_id INTEGER REFERENCES graus (id),
+                      nom TEXT,
+                      url TEXT,
+                      credits REAL,
+                      tipus TEXT,
+                      semestre INTEGER,
+                      mencio TEXT)""")
+    bd.execute("CREATE INDEX IF NOT EXISTS idx_assignatures_grau ON assignatures (grau_id)")
+    bd.execute("CREATE INDEX IF NOT EXISTS idx_assignatures_tipus ON assignatures (tipus, credits)")
+    bd.execute("CREATE INDEX IF NOT EXISTS idx_assignatures_mencio ON assignatures (mencio)")
+    bd.execute("CREATE INDEX IF NOT EXISTS idx_assignatures_semestre ON assignatures (semestre)")
+    bd.commit()
+
+
+
+def bolca(files, sortides, mida_buffer = 1000):
+    """
+    Funció que escriu les files de dades de l'iterable files a totes les sortides (objectes
+    Sortida) a mesura que es generen, acumulant-ne com a molt mida_buffer a memòria.
+    Retorna el nombre de files escrites.
+    """
+    nombre_files = 0
+    buffer = []
+    for fila in files:
+        buffer.append(fila)
+        if len(buffer) >= mida_buffer:
+            with metriques.mesura('escriptura_sortides'):
+                for sortida in sortides:
+                    sortida.escriu_files(buffer)
+            nombre_files += len(buffer)
+            buffer = []
+    if buffer:
+        with metriques.mesura('escriptura_sortides'):
+            for sortida in sortides:
+                sortida.escriu_files(buffer)
+        nombre_files += len(buffer)
+    return nombre_files
+
+
+
+def crawlscrape_url_grau_amb_diari(url_grau, diari = None, intents = 4, espera_inicial = 30, **kwargs):
+    """
+    Funció que obté la informació d'un grau amb crawlscrape_url_grau(), reintentant-ho amb
+    executa_amb_reintents() si hi ha errors transitoris.
+
+    Paràmetres:
+        url_grau : adreça de la pàgina web del grau
+        diari : objecte DiariCrawl. Si s'indica i el grau ja hi consta com a obtingut, se'n
+                retornen les dades desades sense tornar a descarregar la pàgina (si cal desar els
+                documents pdf, només es descarreguen els que no hi consten com a desats). Sinó,
+                se n'hi registra el resultat
+        intents, espera_inicial : paràmetres que es passen a executa_amb_reintents(). intents
+                                  també és el nombre de reintents dels documents pdf
+        La resta de paràmetres es passen a crawlscrape_url_grau()
+
+    Retorna:
+        grau, codi_error, missatge_error : amb el format de crawlscrape_url_grau()
+    """
+    if diari:
+        dades = diari.grau(url_grau)
+        if dades is not None:
+            # Els documents pdf que van fallar en una execució anterior es tornen a intentar
+            if kwargs.get('desa_pdfs'):
+                desa_pdfs_grau(dades['Assignatures'], nom_directori = kwargs.get('nom_directori', ".\\"),
+                               sessio = kwargs.get('sessio'), limitador = kwargs.get('limitador'),
+                               diari = diari, magatzem = kwargs.get('magatzem'), intents = intents,
+                               verbose = kwargs.get('verbose', True))
+            return dades, 0, None
+
+    resultat = executa_amb_reintents(crawlscrape_url_grau, url_grau, intents = intents,
+                                     espera_inicial = espera_inicial, diari = diari,
+                                     intents_pdf = intents, **kwargs)
+    if diari:
+        diari.registra_grau(url_grau, *resultat)
+    return resultat
+
+
+
+def crawl_graus(webs_graus, sortides, max_concurrencia = 4, limitador = None, diari = None,
+                analitzador = 'bs4', intents = 4, verbose = True, magatzem = None, processos = 0,
+                mida_buffer = 1000):
+    """
+    Funció que obté la informació dels graus de webs_graus concurrentment, amb un
+    PlanificadorCrawl, i n'escriu les files de dades (vegeu files_grau()) a les sortides en el
+    mateix ordre que webs_graus, a mesura que s'obtenen, amb bolca().
+
+    Paràmetres:
+        webs_graus : llista d'adreces de les pàgines web dels graus
+        sortides : llista d'objectes Sortida on escriure les files de dades
+        max_concurrencia : nombre màxim de graus que s'obtenen alhora
+        limitador : objecte LimitadorHosts que espaia les peticions per host. Per defecte, un
+                    LimitadorHosts de 20 s
+        diari : objecte DiariCrawl on es registra el progrés (vegeu crawlscrape_url_grau_amb_diari())
+        analitzador, verbose : paràmetres que es passen a crawlscrape_url_grau()
+        intents : nombre de reintents dels errors transitoris (vegeu executa_amb_reintents())
+        magatzem : objecte MagatzemPdf. Si s'indica, s'hi desen els documents pdf de les
+                   assignatures (vegeu crawlscrape_url_grau())
+        processos : nombre de processos en què s'analitza el codi html de les pàgines. Si val 0
+                    (valor per defecte), l'anàlisi la fa el mateix fil que descarrega la pàgina.
+                    Sinó, els fils del PlanificadorCrawl només descarreguen, i les pàgines
+                    s'analitzen en un ProcessPoolExecutor, de manera que l'anàlisi (limitada per
+                    CPU) escala amb els nuclis. La finestra del planificador limita el nombre de
+                    pàgines pendents d'analitzar
+        mida_buffer : nombre màxim de files que s'acumulen a memòria abans d'escriure-les a les
+                      sortides (vegeu bolca()). Amb 1, cada fila s'escriu tan bon punt s'obté
+
+    Retorna:
+        nombre de files de dades escrites
+    """
+    planificador = PlanificadorCrawl(max_concurrencia, limitador)
+    # Els processos es creen amb 'spawn' perquè el procés principal ja té fils en marxa
+    executor = cf.ProcessPoolExecutor(processos, mp_context = multiprocessing.get_context('spawn')) \
+               if processos > 0 else None
+
+    # Els resultats arriben en el mateix ordre que webs_graus, de manera que el fitxer és
+    # idèntic al d'una execució seqüencial
+    resultats = planificador.executa(functools.partial(crawlscrape_url_grau_amb_diari,
+                                                       diari = diari,
+                                                       analitzador = analitzador,
+                                                       intents = intents,
+                                                       verbose = verbose,
+                                                       desa_pdfs = magatzem is not None,
+                                                       magatzem = magatzem,
+                                                       executor = executor),
+                                     webs_graus)
+
+    def files_resultats():
+        for w, (dades, codi_error, missatge_error) in zip(webs_graus, resultats):
+            # Si no s'ha pogut obtenir ni informació bàsica del grau, no es desa res
+            if codi_error:
+                print("No s'han pogut obtenir les dades de " + w)
+                metriques.compta('graus', codi = codi_error)
+                continue
+            metriques.compta('graus', codi = 0)
+            # Es desa una fila per assignatura amb les dades generals del grau repetides (o una
+            # sola fila amb les dades generals del grau si no se n'ha obtingut cap assignatura)
+            yield from files_grau(dades)
+
+    # Les files s'escriuen a totes les sortides per blocs de com a molt mida_buffer files (a la
+    # sortida SQLite, en una transacció per bloc)
+    try:
+        return bolca(files_resultats(), sortides, mida_buffer = mida_buffer)
+    finally:
+        if executor:
+            executor.shutdown()
+
+
+
+def genera_registres_grau(url_grau, verbose = True, sessio = None, limitador = None, analitzador = 'bs4'):
+    """
+    Generador que descarrega la pàgina web d'un grau i en genera la informació a mesura que
+    l'analitza, amb genera_grau(). Si hi ha hagut algun error de descàrrega, genera un únic
+    element ('error', (codi_error, missatge_error)) amb l'error de descarrega_url().
+
+    Paràmetres:
+        url_grau, verbose, sessio, limitador, analitzador : com a crawlscrape_url_grau()
+    """
+    if limitador:
+        limitador.espera(url_grau)
+    html_aux, codi_error, missatge_error = descarrega_url(url_grau, timeout = 10,
+                                                          retorna = 'binari', sessio = sessio,
+                                                          limitador = limitador)
+    if codi_error:
+        if verbose:
+            print("No s'ha pogut descarregar la informació del lloc web "+url_grau)
+        yield 'error', (codi_error, missatge_error)
+        return
+    yield from genera_grau(html_aux, url_grau, verbose = verbose, analitzador = analitzador)
+
+
+
+def genera_files(webs_graus, verbose = True, sessio = None, limitador = None, analitzador = 'bs4'):
+    """
+    Generador que obté la informació dels graus de webs_graus, un rere l'altre, i en genera les
+    files de dades (llistes amb les columnes de CAPCALERA, com files_grau()) a mesura que
+    s'analitza cada semestre, sense acumular les dades de cap grau sencer (excepte en graus amb
+    mencions, per a eliminar-ne els duplicats). Els graus que no s'han pogut obtenir s'ometen.
+    Es pot passar a bolca() per a escriure-les a les sortides, o consumir-les directament mentre
+    continua el crawl.
+
+    Paràmetres:
+        webs_graus : iterable amb les adreces de les pàgines web dels graus
+        verbose, sessio, analitzador : com a crawlscrape_url_grau()
+        limitador : objecte LimitadorHosts que espaia les peticions per host. Per defecte, un
+                    LimitadorHosts de 20 s
+    """
+    if not limitador:
+        limitador = LimitadorHosts(20)
+    for w in webs_graus:
+        grau = None
+        nombre_assignatures = 0
+        for tipus, dades in genera_registres_grau(w, verbose = verbose, sessio = sessio,
+                                                  limitador = limitador, analitzador = analitzador):
+            if tipus == 'error':
+                print("No s'han pogut obtenir les dades de " + w)
+                metriques.compta('graus', codi = dades[0])
+            elif tipus == 'grau':
+                grau = dades
+                metriques.compta('graus', codi = 0)
+            else:
+                nombre_assignatures += 1
+                yield fila_assignatura(grau, dades)
+        if grau and not nombre_assignatures:
+            yield fila_assignatura(grau)
+
+
+
 ####################################
 ######## PROGRAMA PRINCIPAL ########
 ####################################
 
 if __name__ == '__main__':
-    # Obtenim les url dels llocs webs dels graus de la UPC
-    webs_graus, codi_error, missatge_error = crawlscrape_url_principal()
+    parser = argparse.ArgumentParser(description = "Obté les dades dels graus de la UPC i les desa a "
+                                                   "dades_graus_upc.csv")
+    parser.add_argument('--concurrencia', type = int, default = 4,
+                        help = "nombre màxim de graus que es descarreguen alhora (per defecte, 4). "
+                               "Les peticions a un mateix host s'espaien igualment segons el limitador")
+    parser.add_argument('--limitador', choices = ['adaptatiu', 'fix'], default = 'adaptatiu',
+                        help = "espaiat de les peticions a cada host: 'adaptatiu' (per defecte) comença "
+                               "amb 20 s i l'escurça mentre el servidor respon ràpid i sense errors, i "
+                               "l'allarga si hi ha errors o Retry-After; 'fix' espera sempre 20 s entre "
+                               "graus i 5 s entre documents pdf")
+    parser.add_argument('--interval-minim', type = float, default = 2,
+                        help = "temps mínim en segons entre peticions a un host amb el limitador "
+                               "adaptatiu (per defecte, 2), o el Crawl-delay del robots.txt si és més gran")
+    parser.add_argument('--cau', metavar = 'DIRECTORI',
+                        help = "directori d'una cau HTTP a disc. Les pàgines i documents que no han "
+                               "canviat des de la darrera execució no es tornen a descarregar")
+    parser.add_argument('--mida-cau', type = float, default = 2048,
+                        help = "mida màxima de la cau en MiB (per defecte, 2048)")
+    parser.add_argument('--processos', type = int, default = 0,
+                        help = "nombre de processos en què s'analitzen les pàgines, en paral·lel a "
+                               "les descàrregues (per defecte, 0: s'analitzen als fils de descàrrega)")
+    parser.add_argument('--mida-buffer', type = int, default = 1000,
+                        help = "nombre màxim de files que s'acumulen abans d'escriure-les a les "
+                               "sortides (per defecte, 1000; amb 1, s'escriuen a mesura que s'obtenen)")
+    parser.add_argument('--analitzador', choices = sorted(ANALITZADORS), default = 'bs4',
+                        help = "analitzador HTML de les pàgines (per defecte, 'bs4'). 'bs4-parcial' i "
+                               "'lxml' només construeixen les parts de les pàgines que interessen")
+    parser.add_argument('--diari', default = 'dades_graus_upc.diari.sqlite',
+                        help = "arxiu SQLite on es registra el progrés del crawl (per defecte, "
+                               "dades_graus_upc.diari.sqlite)")
+    parser.add_argument('--resume', action = 'store_true',
+                        help = "repren un crawl interromput: els graus que ja consten al diari com a "
+                               "obtinguts no es tornen a descarregar i només es reintenten els que han fallat")
+    parser.add_argument('--parquet', metavar = 'FITXER',
+                        help = "desa també les dades en format columnar Parquet al fitxer indicat "
+                               "(requereix pyarrow)")
+    parser.add_argument('--jsonl', metavar = 'FITXER',
+                        help = "desa també les dades en format JSON Lines al fitxer indicat")
+    parser.add_argument('--pdfs', metavar = 'DIRECTORI',
+                        help = "desa també les guies docents en pdf de les assignatures al magatzem "
+                               "indicat, adreçat per contingut: cada document es desa una sola vegada "
+                               "encara que el comparteixin diversos graus")
+    parser.add_argument('--vigencia-pdfs', type = float, default = 168,
+                        help = "hores durant les quals no es torna a descarregar un pdf que ja és al "
+                               "magatzem (per defecte, 168)")
+    parser.add_argument('--delta', metavar = 'FITXER',
+                        help = "escriu al fitxer indicat (JSON Lines) només els graus i assignatures que "
+                               "han canviat respecte de l'execució anterior (vegeu --instantania)")
+    parser.add_argument('--instantania', default = 'dades_graus_upc.instantania.json',
+                        help = "instantània de les dades amb què es comparen els canvis de --delta (per "
+                               "defecte, dades_graus_upc.instantania.json)")
+    parser.add_argument('--sqlite', metavar = 'FITXER',
+                        help = "desa també les dades a la base de dades SQLite indicada")
+    grup_arxiu = parser.add_mutually_exclusive_group()
+    grup_arxiu.add_argument('--grava', metavar = 'ARXIU',
+                            help = "desa totes les respostes obtingudes a l'arxiu de crawl indicat")
+    grup_arxiu.add_argument('--reprodueix', metavar = 'ARXIU',
+                            help = "reprodueix el crawl desat a l'arxiu indicat, sense accedir a la "
+                                   "xarxa ni esperar entre peticions")
+    parser.add_argument('--cataleg', metavar = 'URL',
+                        help = "obté les pàgines dels programes seguint els enllaços del catàleg indicat "
+                               "(per exemple, el de màsters) en comptes de la llista de graus de la UPC. "
+                               "Cal indicar --patro-programa")
+    parser.add_argument('--patro-programa', metavar = 'REGEX',
+                        help = "expressió regular de les url de les pàgines dels programes del catàleg "
+                               "(per exemple, '/ca/masters/[^/]+$')")
+    parser.add_argument('--profunditat', type = int, default = 2,
+                        help = "nombre màxim d'enllaços que se segueixen des de la pàgina inicial del "
+                               "catàleg (per defecte, 2)")
+    parser.add_argument('--dominis', nargs = '+', metavar = 'DOMINI',
+                        help = "dominis de les pàgines del catàleg que es visiten (per defecte, el de la "
+                               "pàgina inicial)")
+    parser.add_argument('--metriques', action = 'store_true',
+                        help = "mostra en acabar el temps per etapa (robots, connexió, transferència, "
+                               "anàlisi, espera...) i per host i els comptadors de peticions")
+    parser.add_argument('--prometheus', metavar = 'FITXER',
+                        help = "desa les mètriques en format de text de Prometheus al fitxer indicat")
+    args = parser.parse_args()
+    if args.cataleg and not args.patro_programa:
+        parser.error("--cataleg requereix --patro-programa")
+
+    if args.metriques or args.prometheus:
+        metriques.activa_metriques()
+
+    if args.grava:
+        arxiu_crawl = ArxiuCrawl(args.grava, 'grava')
+    elif args.reprodueix:
+        arxiu_crawl = ArxiuCrawl(args.reprodueix, 'reprodueix')
+
+    # Obrim el diari del crawl. Si no es repren un crawl anterior, el buidem
+    diari = DiariCrawl(args.diari)
+    if not args.resume:
+        diari.buida()
+
+    if args.cau:
+        cau_http = CauHTTP(args.cau, int(args.mida_cau*1024**2))
+
+    # Creem un limitador per host que espaia les peticions a cada host (com a mínim, el Crawl-delay
+    # del seu robots.txt): un cubell de tokens adaptatiu que comença amb 20 s entre peticions, o
+    # un temporitzador relatiu fix de 20 s
+    if args.reprodueix:
+        limitador = LimitadorHosts(0, respecta_crawl_delay = False)
+    elif args.limitador == 'adaptatiu':
+        limitador = LimitadorAdaptatiu(20, interval_minim = args.interval_minim)
+    else:
+        limitador = LimitadorHosts(20)
+
+    # Obtenim les url dels llocs webs dels graus de la UPC o, si s'ha indicat un catàleg, les dels
+    # seus programes
+    if args.cataleg:
+        webs_graus, codi_error, missatge_error = crawl_cataleg(args.cataleg,
+                                                               re.compile(args.patro_programa).search,
+                                                               dominis = args.dominis,
+                                                               profunditat_maxima = args.profunditat,
+                                                               limitador = limitador,
+                                                               analitzador = args.analitzador)
+    else:
+        # Hi registrem la petició de la pàgina principal per a alinear el temporitzador del seu
+        # host amb el temps actual
+        limitador.espera(URL_PRINCIPAL)
+        webs_graus, codi_error, missatge_error = crawlscrape_url_principal(analitzador = args.analitzador)
     
     # Si hi ha hagut algun error, sortim del programa
     if codi_error:
@@ -486,54 +3428,58 @@ if __name__ == '__main__':
         print("Error: ", (codi_error, missatge_error))
         sys.exit()
     
-    # Creem un temporitzador relatiu (espaiarem les peticions un mínim de 20s)
-    temp = Temporitzador(20, 'relatiu')
-    # L'executem una vegada per a alinear l'atribut darrer_fi_espera amb el
-    # temps actual
-    temp.espera()
-    
-    # Creem el fitxer csv de dades
-    with open('dades_graus_upc.csv', 'w', newline='') as f:
-        writer = csv.writer(f, delimiter = ',', quoting = csv.QUOTE_ALL)
-        # Escrivim la capçalera
-        writer.writerow(['Nom grau',
-                         'URL grau',
-                         'Crèdtis grau',
-                         'Nom assig',
-                         'URL assig',
-                         'Crèdits assig',
-                         'Tipus assig',
-                         'Semestre assig',
-                         'Menció assig'])
-        for w in webs_graus:
-            temp.espera()
-            dades, codi_error, missatge_error = crawlscrape_url_grau(w)
-            # Si no s'ha pogut obtenir ni informació bàsica del grau, no es desa res
-            if codi_error:
-                print("No s'han pogut obtenir les dades de " + w)
-                continue
-            # Si s'ha pogut obtenir informació d'assignatures, es genera un iterable amb tants
-            # elements com assignatures al grau i les dades generals del grau repetides per assignatura
-            if dades['Assignatures']:
-                iterable = ([dades['Nom'],
-                             dades['URL'],
-                             dades['Càrrega lectiva'],
-                             x['Nom'],
-                             x['URL'],
-                             x['Càrrega lectiva'],
-                             x['Tipus'],
-                             x['Semestre'],
-                             x['Menció']] for x in dades['Assignatures'])
-                writer.writerows(iterable)
-            # Sinó, s'escriu una fila amb les dades generals del grau i
-            # sense cap dada d'assignatura
-            else:
-                writer.writerow([dades['Nom'],
-                                 dades['URL'],
-                                 dades['Càrrega lectiva'],
-                                 '',
-                                 '',
-                                 '',
-                                 '',
-                                 '',
-                                 ''])
+    # Creem el fitxer csv de dades i, si cal, la resta de sortides
+    sortides = [SortidaCSV('dades_graus_upc.csv')]
+    if args.parquet:
+        sortides.append(SortidaParquet(args.parquet))
+    if args.jsonl:
+        sortides.append(SortidaJSONL(args.jsonl))
+    if args.sqlite:
+        sortides.append(SortidaSQLite(args.sqlite, buida = True))
+    if args.delta:
+        sortides.append(SortidaDelta(args.delta, args.instantania))
+
+    magatzem = MagatzemPdf(args.pdfs, int(args.vigencia_pdfs*3600)) if args.pdfs else None
+
+    crawl_graus(webs_graus, sortides, max_concurrencia = args.concurrencia, limitador = limitador,
+                diari = diari, analitzador = args.analitzador, intents = 0 if args.reprodueix else 4,
+                magatzem = magatzem, processos = args.processos, mida_buffer = args.mida_buffer)
+    errors = diari.errors()
+    for sortida in sortides:
+        # Els graus de la instantània anterior que no s'han rebut només es donen de baixa si no
+        # n'ha fallat cap
+        if isinstance(sortida, SortidaDelta):
+            sortida.elimina_absents = not any(tipus == 'grau' for tipus, *_ in errors)
+        sortida.tanca()
+        if isinstance(sortida, SortidaDelta):
+            print("Canvis respecte de l'execució anterior: ", dict(sortida.canvis))
+
+    if errors:
+        print("Hi ha hagut {} errors. Es poden reintentar amb --resume".format(len(errors)))
+    diari.tanca()
+
+    if magatzem:
+        print("Estadístiques del magatzem de pdf: ", magatzem.estadistiques())
+        magatzem.tanca()
+
+    if cau_http:
+        print("Estadístiques de la cau HTTP: ", cau_http.estadistiques())
+        cau_http.tanca()
+
+    if arxiu_crawl:
+        arxiu_crawl.tanca()
+
+    if args.metriques:
+        informe = metriques.informe()
+        print("Temps total: {:.1f} s (espera: {:.1f} s, treball: {:.1f} s)".format(
+            informe['Temps total (s)'], informe["Temps d'espera (s)"], informe['Temps de treball (s)']))
+        for titol, etapes in [('Totes', informe['Etapes'])] + list(informe['Hosts'].items()):
+            print(titol)
+            for etapa, dades in etapes.items():
+                print("  {:22s} {:6d} x  total {:9.3f} s  mitjana {:8.4f} s  p95 <= {:g} s  màxim {:8.4f} s".format(
+                    etapa, dades['Nombre'], dades['Total (s)'], dades['Mitjana (s)'], dades['p95 (s)'],
+                    dades['Màxim (s)']))
+        for nom, valors in informe['Comptadors'].items():
+            print(nom, valors)
+    if args.prometheus:
+        metriques.desa_prometheus(args.prometheus)
@@ -0,0 +1,145 @@
+import hashlib
+import os
+import pickle
+
+import pandas as pd
+
+
+
+# Versió dels resums. Si canvia resum(), cal augmentar-la perquè no s'empren els resultats desats
+# a la cau amb la versió anterior
+VERSIO_RESUM = 1
+
+
+def carrega_dades(cami):
+    """
+    Funció que carrega un fitxer de dades dels graus (CSV amb el format de dades_graus_upc.csv,
+    o Parquet si l'extensió és .parquet) a un DataFrame, amb els crèdits i el semestre convertits
+    a format numèric una sola vegada (els valors que no són nombres queden com a NaN) i els camps
+    de poca cardinalitat com a categories.
+    """
+    if cami.endswith('.parquet'):
+        df = pd.read_parquet(cami)
+    else:
+        df = pd.read_csv(cami, header = 0, dtype = 'str', keep_default_na = False)
+    for columna in ['Crèdtis grau', 'Crèdits assig', 'Semestre assig']:
+        df[columna] = pd.to_numeric(df[columna], errors = 'coerce')
+    for columna in ['Nom grau', 'URL grau', 'Tipus assig', 'Menció assig']:
+        df[columna] = df[columna].astype('category')
+    return df
+
+
+
+def resum(df):
+    """
+    Funció que calcula els resums habituals de les dades dels graus amb una única agrupació del
+    DataFrame df (carregat amb carrega_dades()), de la qual es deriven tots els altres.
+
+    Retorna un diccionari amb:
+        'Assignatures'                   : nombre total d'assignatures
+        'Optatives'                      : nombre d'assignatures optatives
+        'Optatives i mencions'           : nombre d'assignatures optatives o de menció
+        'Percentatge optatives'          : percentatge d'optatives sobre el total
+        'Percentatge optatives i mencions' : percentatge d'optatives o de menció sobre el total
+        'Crèdits per tipus'              : DataFrame (tipus x crèdits) amb el nombre d'assignatures
+        'Tipus per grau'                 : DataFrame (grau x tipus) amb el nombre d'assignatures
+        'Tipus per menció'               : DataFrame (menció x tipus) amb el nombre d'assignatures
+                                           de menció
+    """
+    # Única passada per les files: comptatge per grau, tipus, menció i crèdits. La resta de resums
+    # s'obtenen d'aquesta taula, que té moltes menys files que les dades
+    assignatures = df[df['Tipus assig'] != '']
+    comptatge = assignatures.groupby(['Nom grau', 'Tipus assig', 'Menció assig', 'Crèdits assig'],
+                                     observed = True, dropna = False).size()
+    comptatge = comptatge[comptatge > 0].rename('Assignatures').reset_index()
+
+    total = int(comptatge['Assignatures'].sum())
+    es_optativa = comptatge['Tipus assig'] == 'Optativa'
+    es_mencio = comptatge['Menció assig'] != ''
+    optatives = int(comptatge.loc[es_optativa, 'Assignatures'].sum())
+    optatives_i_mencions = int(comptatge.loc[es_optativa | es_mencio, 'Assignatures'].sum())
+
+    return {'Assignatures': total,
+            'Optatives': optatives,
+            'Optatives i mencions': optatives_i_mencions,
+            'Percentatge optatives': optatives/total*100 if total else None,
+            'Percentatge optatives i mencions': optatives_i_mencions/total*100 if total else None,
+            'Crèdits per tipus': comptatge.pivot_table(index = 'Tipus assig', columns = 'Crèdits assig',
+                                                       values = 'Assignatures', aggfunc = 'sum',
+                                                       fill_value = 0, observed = True).sort_index(axis = 1),
+            'Tipus per grau': comptatge.pivot_table(index = 'Nom grau', columns = 'Tipus assig',
+                                                    values = 'Assignatures', aggfunc = 'sum',
+                                                    fill_value = 0, observed = True),
+            'Tipus per menció': comptatge[es_mencio].pivot_table(index = 'Menció assig',
+                                                                 columns = 'Tipus assig',
+                                                                 values = 'Assignatures', aggfunc = 'sum',
+                                                                 fill_value = 0, observed = True)}
+
+
+
+def resum_hash(cami):
+    """
+    Retorna el resum SHA-256 (en hexadecimal) del contingut de l'arxiu cami.
+    """
+    resum_sha = hashlib.sha256()
+    with open(cami, 'rb') as f:
+        for bloc in iter(lambda: f.read(1024**2), b''):
+            resum_sha.update(bloc)
+    return resum_sha.hexdigest()
+
+
+
+def resum_fitxer(cami, directori_cau = '.cau_analisi'):
+    """
+    Funció que retorna el resum() del fitxer de dades cami. Els resultats es desen al directori
+    directori_cau indexats pel hash del contingut del fitxer, la versió dels resums (VERSIO_RESUM)
+    i la de pandas, de manera que si es torna a demanar el resum d'un fitxer idèntic (o d'una
+    còpia) no cal tornar-lo a carregar ni calcular. Els resultats desats que no es poden llegir
+    es tornen a calcular. Si directori_cau és None, no s'empra cap cau.
+    """
+    if directori_cau is None:
+        return resum(carrega_dades(cami))
+
+    cami_cau = os.path.join(directori_cau, '{}-v{}-pandas{}.pickle'.format(resum_hash(cami), VERSIO_RESUM,
+                                                                          pd.__version__))
+    if os.path.exists(cami_cau):
+        try:
+            with open(cami_cau, 'rb') as f:
+                return pickle.load(f)
+        except Exception:
+            # Arxiu truncat o desat amb una altra versió de les llibreries: es torna a calcular
+            pass
+
+    resultat = resum(carrega_dades(cami))
+    os.makedirs(directori_cau, exist_ok = True)
+    with open(cami_cau + '.part', 'wb') as f:
+        pickle.dump(resultat, f)
+    os.replace(cami_cau + '.part', cami_cau)
+    return resultat
+
+
+
+def dibuixa_credits_per_tipus(resultat, tipus_assignatura = ('Obligatòria', 'Optativa', 'Projecte')):
+    """
+    Funció que dibuixa un diagrama de barres de la distribució de crèdits de cada tipus
+    d'assignatura de tipus_assignatura, a partir d'un resultat de resum().
+    Retorna una llista de diccionaris {'figura': figura, 'eixos': eixos}. Requereix matplotlib,
+    que només s'importa en cridar aquesta funció.
+    """
+    import matplotlib.pyplot as plt
+
+    figures = []
+    credits_per_tipus = resultat['Crèdits per tipus']
+    for t in tipus_assignatura:
+        if t not in credits_per_tipus.index:
+            continue
+        aux = credits_per_tipus.loc[t]
+        aux = aux[aux > 0]
+        fig = plt.figure()
+        ax = fig.add_subplot(1,1,1, projection = 'rectilinear')
+        ax.bar([str(x) for x in aux.index], aux)
+        ax.set_xlabel('Crèdits ECTS')
+        ax.set_ylabel("Nombre d'assignatures")
+        ax.set_title("Tipus d'assignatures : " + t)
+        figures.append({'figura': fig, 'eixos': ax})
+    return figures
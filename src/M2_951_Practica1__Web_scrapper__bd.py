@@ -0,0 +1,202 @@
+import collections
+import csv
+import json
+import sqlite3
+
+import M2_951_Practica1__Web_scrapper as ws
+
+
+
+def carrega_csv(cami_csv, cami_bd, codificacio = None):
+    """
+    Funció que carrega un fitxer de dades en format CSV (amb el format de dades_graus_upc.csv)
+    a una base de dades SQLite normalitzada i indexada (vegeu ws.crea_esquema_sqlite()).
+
+    Arguments:
+        cami_csv : camí del fitxer CSV
+        cami_bd : camí de la base de dades SQLite. Si no existeix, es crea. Si ja conté dades,
+                  s'hi afegeixen les dels graus que no hi consten
+        codificacio : codificació del fitxer CSV. Si no s'indica, la per defecte del sistema
+                      (la mateixa amb què l'ha escrit el scraper)
+    Retorna:
+        nombre de files del fitxer CSV carregades (sense les dels graus que ja hi constaven)
+    """
+    with open(cami_csv, newline = '', encoding = codificacio) as f:
+        lector = csv.reader(f)
+        next(lector)
+        with ws.SortidaSQLite(cami_bd) as sortida:
+            return ws.bolca(lector, [sortida]) - sortida.omeses
+
+
+
+def _valors_assignatura(dades):
+    # Valors de les columnes nom, url, credits, tipus, semestre i mencio d'una assignatura de delta
+    return (dades['Nom assig'], dades['URL assig'], ws.a_nombre(dades['Crèdits assig']),
+            dades['Tipus assig'], ws.a_nombre(dades['Semestre assig'], int), dades['Menció assig'])
+
+
+
+def aplica_delta(cami_delta, cami_bd):
+    """
+    Funció que aplica els canvis d'un fitxer de delta (escrit amb ws.SortidaDelta) a una base de
+    dades SQLite carregada amb les dades de l'execució anterior (amb carrega_csv() o
+    ws.SortidaSQLite), de manera que no cal tornar-la a carregar sencera.
+    Les assignatures modificades o donades de baixa es localitzen pels seus valors anteriors
+    (si n'hi ha diverses d'idèntiques al grau, se'n modifica o elimina només una).
+
+    Arguments:
+        cami_delta : camí del fitxer de delta (JSON Lines)
+        cami_bd : camí de la base de dades SQLite. Si no existeix, es crea
+    Retorna:
+        collections.Counter {(tipus, operació) : nombre de canvis aplicats}
+    """
+    aplicats = collections.Counter()
+    bd = sqlite3.connect(cami_bd)
+    ws.crea_esquema_sqlite(bd)
+
+    def id_grau(url):
+        fila = bd.execute("SELECT id FROM graus WHERE url = ?", (url,)).fetchone()
+        if fila is None:
+            return bd.execute("INSERT INTO graus (url) VALUES (?)", (url,)).lastrowid
+        return fila[0]
+
+    with open(cami_delta, encoding = 'utf-8') as f:
+        for linia in f:
+            canvi = json.loads(linia)
+            dades, operacio = canvi['Dades'], canvi['Operació']
+            if canvi['Tipus'] == 'grau':
+                if operacio == 'baixa':
+                    bd.execute("DELETE FROM assignatures WHERE grau_id IN (SELECT id FROM graus WHERE url = ?)",
+                               (dades['URL grau'],))
+                    bd.execute("DELETE FROM graus WHERE url = ?", (dades['URL grau'],))
+                else:
+                    bd.execute("UPDATE graus SET nom = ?, credits = ? WHERE id = ?",
+                               (dades['Nom grau'], ws.a_nombre(dades['Crèdtis grau']), id_grau(dades['URL grau'])))
+            else:
+                id_g = id_grau(dades['URL grau'])
+                if operacio != 'alta':
+                    # Per a les modificacions, els valors anteriors són les dades actuals amb els
+                    # camps de 'Anterior'
+                    anterior = _valors_assignatura(dict(dades, **canvi.get('Anterior', {})))
+                    fila = bd.execute("""SELECT id FROM assignatures WHERE grau_id = ? AND nom IS ? AND
+                                         url IS ? AND credits IS ? AND tipus IS ? AND semestre IS ? AND
+                                         mencio IS ? LIMIT 1""", (id_g,) + anterior).fetchone()
+                    if fila is not None:
+                        bd.execute("DELETE FROM assignatures WHERE id = ?", fila)
+                if operacio != 'baixa':
+                    bd.execute("""INSERT INTO assignatures (grau_id, nom, url, credits, tipus, semestre, mencio)
+                                  VALUES (?, ?, ?, ?, ?, ?, ?)""", (id_g,) + _valors_assignatura(dades))
+            aplicats[(canvi['Tipus'], operacio)] += 1
+    bd.commit()
+    bd.close()
+    return aplicats
+
+
+
+class ConsultesGraus:
+    """
+    Consultes habituals sobre les dades dels graus desades en una base de dades SQLite amb
+    ws.SortidaSQLite o carrega_csv(). Totes les consultes es resolen amb els índexs de la base
+    de dades, sense llegir el fitxer de dades sencer.
+    """
+    def __init__(self, cami_bd):
+        """
+        Retorna un objecte de classe ConsultesGraus sobre la base de dades cami_bd.
+        """
+        self._bd = sqlite3.connect(cami_bd)
+
+    def _filtre_grau(self, grau):
+        # Condició SQL i paràmetres per a restringir una consulta al grau indicat (per nom o url)
+        if grau is None:
+            return '', ()
+        return ' AND grau_id IN (SELECT id FROM graus WHERE nom = ? OR url = ?)', (grau, grau)
+
+    def graus(self):
+        """
+        Retorna una llista de tuples (nom, url, crèdits, nombre d'assignatures) dels graus.
+        """
+        return self._bd.execute("""SELECT g.nom, g.url, g.credits, COUNT(a.id)
+                                   FROM graus g LEFT JOIN assignatures a ON a.grau_id = g.id
+                                   GROUP BY g.id ORDER BY g.id""").fetchall()
+
+    def assignatures_per_tipus(self, grau = None):
+        """
+        Retorna un diccionari {tipus : nombre d'assignatures} de tots els graus o, si s'indica,
+        només del grau amb el nom o l'url grau.
+        """
+        condicio, parametres = self._filtre_grau(grau)
+        return dict(self._bd.execute("SELECT tipus, COUNT(*) FROM assignatures WHERE 1" + condicio +
+                                     " GROUP BY tipus", parametres).fetchall())
+
+    def assignatures_per_mencio(self, grau = None):
+        """
+        Retorna un diccionari {menció : nombre d'assignatures} de les assignatures de menció de
+        tots els graus o, si s'indica, només del grau amb el nom o l'url grau.
+        """
+        condicio, parametres = self._filtre_grau(grau)
+        return dict(self._bd.execute("SELECT mencio, COUNT(*) FROM assignatures WHERE mencio != ''" +
+                                     condicio + " GROUP BY mencio", parametres).fetchall())
+
+    def percentatge_optatives(self, grau = None, inclou_mencions = False):
+        """
+        Retorna el percentatge d'assignatures optatives sobre el total d'assignatures de tots els
+        graus (o del grau indicat). Si inclou_mencions val True, compta també com a optatives
+        les assignatures de menció.
+        """
+        condicio, parametres = self._filtre_grau(grau)
+        optativa = "tipus = 'Optativa'" + (" OR mencio != ''" if inclou_mencions else '')
+        optatives, total = self._bd.execute("SELECT SUM(CASE WHEN " + optativa + " THEN 1 ELSE 0 END), "
+                                            "COUNT(*) FROM assignatures WHERE tipus != ''" + condicio,
+                                            parametres).fetchone()
+        return optatives/total*100 if total else None
+
+    def distribucio_credits(self, tipus = None, grau = None):
+        """
+        Retorna una llista de tuples (crèdits, nombre d'assignatures), ordenada per crèdits, de
+        les assignatures del tipus indicat (o de totes) de tots els graus (o del grau indicat).
+        """
+        condicio, parametres = self._filtre_grau(grau)
+        if tipus is not None:
+            condicio = ' AND tipus = ?' + condicio
+            parametres = (tipus,) + parametres
+        return self._bd.execute("SELECT credits, COUNT(*) FROM assignatures WHERE credits IS NOT NULL" +
+                                condicio + " GROUP BY credits ORDER BY credits", parametres).fetchall()
+
+    def credits_per_semestre(self, grau = None):
+        """
+        Retorna una llista de tuples (semestre, crèdits, nombre d'assignatures), ordenada per
+        semestre, de tots els graus (o del grau indicat).
+        """
+        condicio, parametres = self._filtre_grau(grau)
+        return self._bd.execute("SELECT semestre, SUM(credits), COUNT(*) FROM assignatures "
+                                "WHERE semestre IS NOT NULL" + condicio +
+                                " GROUP BY semestre ORDER BY semestre", parametres).fetchall()
+
+    def tanca(self):
+        """
+        Tanca la connexió amb la base de dades.
+        """
+        self._bd.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.tanca()
+
+
+
+####################################
+######## PROGRAMA PRINCIPAL ########
+####################################
+
+if __name__ == '__main__':
+    # Carreguem dades_graus_upc.csv a dades_graus_upc.sqlite i en mostrem alguns resums
+    carrega_csv('dades_graus_upc.csv', 'dades_graus_upc.sqlite')
+    with ConsultesGraus('dades_graus_upc.sqlite') as consultes:
+        print("Percentatge total d'oferta d'assignatures optatives : {:3.2f} %".format(
+            consultes.percentatge_optatives()))
+        print("Percentatge total d'oferta d'assignatures optatives i de menció : {:3.2f} %".format(
+            consultes.percentatge_optatives(inclou_mencions = True)))
+        for t in ['Obligatòria', 'Optativa', 'Projecte']:
+            print("Distribució de crèdits ({}) : ".format(t), consultes.distribucio_credits(t))
@@ -0,0 +1,599 @@
+import random
+import time as tm
+import copy
+import collections
+import threading
+import http.server
+import urllib.parse as up
+import re
+import os
+import tempfile
+import resource
+import argparse
+import json
+import multiprocessing
+
+import M2_951_Practica1__Web_scrapper as ws
+import M2_951_Practica1__Web_scrapper__guies as guies
+
+
+
+def elimina_duplicats_mencions_quadratic(assignatures, nombre_mencions):
+    """
+    Implementació original (de cost quadràtic) de l'eliminació de duplicats d'assignatures comunes
+    a totes les mencions, que es conserva com a referència per a comparar-la amb
+    ws.elimina_duplicats_mencions().
+    """
+    i = 0
+    while i<len(assignatures):
+        posicions_duplicats = [j for j in range(i+1, len(assignatures)) if (
+                               assignatures[j]['Nom'] == assignatures[i]['Nom'] and
+                               assignatures[j]['Tipus'] == assignatures[i]['Tipus']  and
+                               assignatures[j]['URL'] == assignatures[i]['URL'])]
+        if len(posicions_duplicats) == nombre_mencions-1:
+            assignatures[i]['Menció'] = ''
+            for j in posicions_duplicats[::-1]:
+                del assignatures[j]
+        i += 1
+    return assignatures
+
+
+
+def pla_estudis_sintetic(nombre_assignatures, nombre_mencions, llavor = 0):
+    """
+    Genera una llista d'assignatures amb el format de crawlscrape_url_grau() per a un grau amb
+    nombre_mencions mencions. Cada assignatura pot ser comuna a totes les mencions, a algunes o
+    pròpia d'una sola menció, i algunes es repeteixen més vegades que mencions hi ha.
+    """
+    aleatori = random.Random(llavor)
+    mencions = ['Menció {}'.format(m) for m in range(nombre_mencions)]
+    assignatures = []
+    for i in range(nombre_assignatures):
+        tipus = aleatori.choice(['Obligatòria', 'Optativa', 'Projecte'])
+        semestre = str(aleatori.randint(1, 8))
+        presencia = aleatori.random()
+        if presencia < 0.5:
+            mencions_assig = mencions
+        elif presencia < 0.9:
+            mencions_assig = aleatori.sample(mencions, aleatori.randint(1, nombre_mencions))
+        else:
+            mencions_assig = mencions + aleatori.sample(mencions, 1)
+        for m in mencions_assig:
+            assignatures.append({'Nom': 'Assignatura {}'.format(i),
+                                 'Semestre': semestre,
+                                 'Càrrega lectiva': '6',
+                                 'URL': 'https://www.upc.edu/grau/guiadocent/pdf/cat/{}.pdf'.format(i),
+                                 'Tipus': tipus,
+                                 'Menció': m})
+    aleatori.shuffle(assignatures)
+    return assignatures
+
+
+
+def benchmark_duplicats(mides = (50, 200, 800, 3200), nombre_mencions = 4, repeticions = 3):
+    """
+    Compara el temps de l'eliminació de duplicats original i de la lineal per a plans d'estudis
+    sintètics de mides creixents, i comprova que els resultats són idèntics.
+    Retorna una llista de diccionaris amb els temps (en segons) per mida.
+    """
+    resultats = []
+    for mida in mides:
+        assignatures = pla_estudis_sintetic(mida, nombre_mencions)
+        temps = {}
+        sortides = {}
+        for nom, funcio in [('quadràtic', elimina_duplicats_mencions_quadratic),
+                            ('lineal', ws.elimina_duplicats_mencions)]:
+            millor = float('inf')
+            for r in range(repeticions):
+                copia = copy.deepcopy(assignatures)
+                t_inici = tm.perf_counter()
+                sortides[nom] = funcio(copia, nombre_mencions)
+                millor = min(millor, tm.perf_counter() - t_inici)
+            temps[nom] = millor
+        if sortides['quadràtic'] != sortides['lineal']:
+            raise AssertionError("Els resultats de l'eliminació de duplicats difereixen per a mida " + str(mida))
+        resultats.append({'Files': len(assignatures), 'Quadràtic (s)': temps['quadràtic'],
+                          'Lineal (s)': temps['lineal']})
+    return resultats
+
+
+
+def verifica_analitzadors(cami_arxiu):
+    """
+    Comprova que tots els analitzadors de ws.ANALITZADORS obtenen el mateix resultat per a
+    cadascuna de les pàgines desades a l'arxiu de crawl cami_arxiu (vegeu ws.ArxiuCrawl), i
+    mesura el temps d'anàlisi de cadascun. Les respostes que no són pàgines de grau (pdf, etc.)
+    es descarten perquè cap analitzador no en pot obtenir el nom del grau.
+    Retorna un diccionari {analitzador : temps total en segons} i genera una excepció
+    AssertionError amb l'url de la primera pàgina on els resultats difereixen.
+    """
+    arxiu = ws.ArxiuCrawl(cami_arxiu, 'reprodueix')
+    temps = {analitzador: 0 for analitzador in ws.ANALITZADORS}
+    try:
+        for url in arxiu.urls():
+            resposta = arxiu.resposta(url)
+            if resposta.status_code != 200 or b'<html' not in resposta.content[:4096].lower():
+                continue
+            resultats = {}
+            for analitzador in ws.ANALITZADORS:
+                t_inici = tm.perf_counter()
+                resultats[analitzador] = ws.analitza_grau(resposta.content, url, verbose = False,
+                                                          analitzador = analitzador)
+                temps[analitzador] += tm.perf_counter() - t_inici
+            if any(r != resultats['bs4'] for r in resultats.values()):
+                raise AssertionError("Els analitzadors obtenen resultats diferents per a " + url)
+    finally:
+        arxiu.tanca()
+    return temps
+
+
+
+def verifica_pagines(directori):
+    """
+    Comprova que tots els analitzadors de ws.ANALITZADORS obtenen, per a cadascuna de les
+    pàgines de grau desades al directori (vegeu html/), el mateix resultat entre ells i el que
+    hi ha desat a resultats_esperats.json ({fitxer : {'URL' : url del grau, 'Resultat' : sortida
+    de ws.analitza_grau()}}), i mesura el temps d'anàlisi de cadascun.
+    Retorna un diccionari {analitzador : temps total en segons} i genera una excepció
+    AssertionError amb el nom del primer fitxer on els resultats difereixen.
+    """
+    with open(os.path.join(directori, 'resultats_esperats.json'), encoding = 'utf-8') as f:
+        esperats = json.load(f)
+    temps = {analitzador: 0 for analitzador in ws.ANALITZADORS}
+    for fitxer, esperat in sorted(esperats.items()):
+        with open(os.path.join(directori, fitxer), 'rb') as f:
+            html = f.read()
+        resultats = {}
+        for analitzador in ws.ANALITZADORS:
+            t_inici = tm.perf_counter()
+            resultats[analitzador] = ws.analitza_grau(html, esperat['URL'], verbose = False,
+                                                      analitzador = analitzador)
+            temps[analitzador] += tm.perf_counter() - t_inici
+        if any(r != resultats['bs4'] for r in resultats.values()):
+            raise AssertionError("Els analitzadors obtenen resultats diferents per a " + fitxer)
+        # Les assignatures (ws.Assignatura) es comparen com a diccionaris
+        if json.loads(json.dumps(list(resultats['bs4']), default = dict)) != esperat['Resultat']:
+            raise AssertionError("El resultat de " + fitxer + " no coincideix amb l'esperat")
+    return temps
+
+
+
+def verifica_guies(directori):
+    """
+    Comprova que guies.analitza_text_guia() obté, per a cadascun dels textos de guies docents
+    desats al directori (vegeu guies/), els camps desats a camps_esperats.json ({fitxer : camps}),
+    i mesura el temps d'anàlisi.
+    Retorna el temps total en segons i genera una excepció AssertionError amb el nom del primer
+    fitxer i la primera columna on els camps difereixen.
+    """
+    with open(os.path.join(directori, 'camps_esperats.json'), encoding = 'utf-8') as f:
+        esperats = json.load(f)
+    temps = 0
+    for fitxer, camps_esperats in sorted(esperats.items()):
+        with open(os.path.join(directori, fitxer), encoding = 'utf-8') as f:
+            text = f.read()
+        t_inici = tm.perf_counter()
+        camps = guies.analitza_text_guia(text)
+        temps += tm.perf_counter() - t_inici
+        for columna in guies.CAPCALERA_GUIA:
+            if camps[columna] != camps_esperats[columna]:
+                raise AssertionError("{}, {}: s'ha obtingut {!r} en comptes de {!r}".format(
+                    fitxer, columna, camps[columna], camps_esperats[columna]))
+    return temps
+
+
+
+class ServidorFixtures:
+    """
+    Servidor HTTP local que imita l'estructura de https://www.upc.edu/ca/graus/: una pàgina
+    principal amb els grups de graus, pàgines de grau sintètiques (nom, informació acadèmica,
+    selector de mencions i blocs pla-estudis-quadrimestre) i documents pdf de les assignatures.
+    Permet simular latència i errors del servidor (5xx) i timeouts, i compta les peticions
+    rebudes per tipus ('robots', 'principal', 'grau', 'pdf', 'altres').
+    """
+    def __init__(self, nombre_graus = 20, semestres = 8, assignatures_per_semestre = 6,
+                 proporcio_mencions = 0.3, nombre_mencions = 3, mida_pdf = 200*1024,
+                 mida_farciment = 50*1024, latencia = 0, taxa_5xx = 0, taxa_timeouts = 0,
+                 temps_timeout = 11, llavor = 0):
+        """
+        Retorna un objecte de classe ServidorFixtures (sense iniciar) amb els atributs següents:
+            nombre_graus : nombre de graus de la pàgina principal
+            semestres, assignatures_per_semestre : mida del pla d'estudis de cada grau
+            proporcio_mencions : proporció de graus amb mencions
+            nombre_mencions : nombre de mencions dels graus que en tenen
+            mida_pdf : mida en bytes dels documents pdf
+            mida_farciment : bytes de codi html addicional (sense interès) de cada pàgina de grau,
+                             per a imitar la mida de les pàgines reals
+            latencia : temps en segons que triga el servidor a respondre cada petició
+            taxa_5xx : proporció de peticions que responen amb l'error 503
+            taxa_timeouts : proporció de peticions que triguen temps_timeout segons a respondre
+            llavor : llavor dels generadors aleatoris (les pàgines són sempre les mateixes)
+            comptadors : diccionari {tipus de petició : nombre de peticions rebudes}
+        """
+        self.nombre_graus = nombre_graus
+        self.semestres = semestres
+        self.assignatures_per_semestre = assignatures_per_semestre
+        self.proporcio_mencions = proporcio_mencions
+        self.nombre_mencions = nombre_mencions
+        self.mida_pdf = mida_pdf
+        self.mida_farciment = mida_farciment
+        self.latencia = latencia
+        self.taxa_5xx = taxa_5xx
+        self.taxa_timeouts = taxa_timeouts
+        self.temps_timeout = temps_timeout
+        self.llavor = llavor
+        self.comptadors = collections.Counter()
+        self._bloqueig = threading.Lock()
+        self._aleatori = random.Random(llavor)
+        self._servidor = None
+        self._fil = None
+
+    @property
+    def url(self):
+        """
+        Adreça base del servidor (http://127.0.0.1:port).
+        """
+        return 'http://127.0.0.1:{}'.format(self._servidor.server_address[1])
+
+    @property
+    def url_principal(self):
+        return self.url + '/ca/graus/'
+
+    def pagina_principal(self):
+        """
+        Retorna el codi html (bytes) de la pàgina principal, amb els graus repartits en grups.
+        """
+        grups = []
+        for g in range(0, self.nombre_graus, 10):
+            items = ''.join('<li><a href="{}/ca/graus/grau-{}">Grau {}</a></li>'.format(self.url, i, i)
+                            for i in range(g, min(g + 10, self.nombre_graus)))
+            grups.append('<div id="collapse-images-collapse-{}"><ul>{}</ul></div>'.format(g, items))
+        return ('<!DOCTYPE html><html><head><meta charset="utf-8"><title>Graus</title></head><body>' +
+                ''.join(grups) + '</body></html>').encode('utf-8')
+
+    def pagina_grau(self, i):
+        """
+        Retorna el codi html (bytes) de la pàgina del grau i.
+        """
+        aleatori = random.Random((self.llavor, i).__hash__())
+        mencions = self.nombre_mencions if aleatori.random() < self.proporcio_mencions else 0
+        selector = ''
+        if mencions:
+            selector = ('<div class="pla-estudis-selector"><ul>' +
+                        ''.join('<li target="especialitat-{}">Menció en Menció {}</li>'.format(m, m)
+                                for m in range(1, mencions + 1)) +
+                        '</ul></div>')
+        semestres = []
+        for s in range(1, self.semestres + 1):
+            items = []
+            for j in range(self.assignatures_per_semestre):
+                tipus = aleatori.choice(['Obligatòria', 'Obligatòria', 'Optativa'])
+                if s == self.semestres and j == 0:
+                    tipus = 'Projecte'
+                credits = aleatori.choice(['3', '4.5', '6', '6', '7.5', '12'])
+                enllac = '<a href="{}/grau/guiadocent/pdf/cat/{}/{}{}.pdf">Assignatura {}.{}.{}</a>'.format(
+                    self.url, i, s, j, i, s, j)
+                if mencions and s > self.semestres//2:
+                    # A la segona meitat del pla d'estudis, les assignatures es repeteixen per
+                    # mencions: les optatives a totes les mencions, la resta a una sola
+                    mencions_assig = range(1, mencions + 1) if tipus == 'Optativa' else \
+                                     [aleatori.randint(1, mencions)]
+                    for m in mencions_assig:
+                        items.append('<li class="especialitat especialitat-{} {}">{} <span>{}</span></li>'.format(
+                            m, tipus, enllac, credits))
+                elif j == self.assignatures_per_semestre - 1 and s == 1:
+                    # Assignatura sense pdf associat
+                    items.append('<li class="sense-especialitat {}"> Assignatura {}.{}.{} <span>{}</span></li>'.format(
+                        tipus, i, s, j, credits))
+                else:
+                    items.append('<li class="sense-especialitat {}">{} <span>{}</span></li>'.format(
+                        tipus, enllac, credits))
+            semestres.append('<div class="pla-estudis-quadrimestre"><h4>Quadrimestre {}</h4><ul>\n{}\n</ul></div>'.format(
+                s, '\n'.join(items)))
+        farciment = '<p class="soroll">Text sense interès <b>per a</b> omplir la pàgina.</p>\n'
+        farciment = farciment*(self.mida_farciment//len(farciment))
+        return ('<!DOCTYPE html><html><head><meta charset="utf-8"><title>Grau {}</title></head><body>'
+                '<nav>{}</nav><div id="main-container"><header><h1 id="degree-name">Grau en Estudis {}</h1></header>'
+                '<div id="collapse-images-collapse-academic-information"><dl><dt>Durada</dt><dd>4 anys</dd>'
+                '<dt>Càrrega lectiva</dt><dd>240 ECTS</dd></dl></div>{}'
+                '<div id="collapse-images-collapse-curriculum">'
+                '<div class="pla-estudis-quadrimestre" id="capcalera-pla">Pla d\'estudis</div>{}</div>'
+                '</div><footer>{}</footer></body></html>').format(
+                    i, farciment, i, selector, ''.join(semestres), farciment).encode('utf-8')
+
+    def document_pdf(self, cami):
+        """
+        Retorna el contingut (bytes) del document pdf de cami.
+        """
+        aleatori = random.Random(cami)
+        return b'%PDF-1.4\n' + aleatori.randbytes(max(0, self.mida_pdf - 9))
+
+    def _respon(self, peticio):
+        cami = up.urlsplit(peticio.path).path
+        if cami == '/robots.txt':
+            tipus, contingut, mime = 'robots', b'User-agent: *\nDisallow:\n', 'text/plain'
+        elif cami == '/ca/graus/':
+            tipus, contingut, mime = 'principal', self.pagina_principal(), 'text/html; charset=utf-8'
+        elif re.fullmatch(r'/ca/graus/grau-\d+', cami):
+            tipus = 'grau'
+            contingut, mime = self.pagina_grau(int(cami.rsplit('-', 1)[1])), 'text/html; charset=utf-8'
+        elif cami.endswith('.pdf'):
+            tipus, contingut, mime = 'pdf', self.document_pdf(cami), 'application/pdf'
+        else:
+            tipus, contingut, mime = 'altres', None, None
+
+        with self._bloqueig:
+            self.comptadors[tipus] += 1
+            atzar = self._aleatori.random()
+        if self.latencia > 0:
+            tm.sleep(self.latencia)
+        if tipus != 'robots':
+            if atzar < self.taxa_5xx:
+                contingut, mime = None, 503
+            elif atzar < self.taxa_5xx + self.taxa_timeouts:
+                tm.sleep(self.temps_timeout)
+
+        if contingut is None:
+            peticio.send_response(mime if mime else 404)
+            peticio.send_header('Content-Length', '0')
+            peticio.end_headers()
+            return
+        peticio.send_response(200)
+        peticio.send_header('Content-Type', mime)
+        peticio.send_header('Content-Length', str(len(contingut)))
+        peticio.end_headers()
+        peticio.wfile.write(contingut)
+
+    def inicia(self):
+        """
+        Inicia el servidor en un port lliure de 127.0.0.1, en un fil a part.
+        """
+        servidor_fixtures = self
+
+        class GestorPeticions(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                try:
+                    servidor_fixtures._respon(self)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        self._servidor = http.server.ThreadingHTTPServer(('127.0.0.1', 0), GestorPeticions)
+        self._servidor.daemon_threads = True
+        self._fil = threading.Thread(target = self._servidor.serve_forever, daemon = True)
+        self._fil.start()
+        return self
+
+    def atura(self):
+        """
+        Atura el servidor.
+        """
+        self._servidor.shutdown()
+        self._servidor.server_close()
+
+    def __enter__(self):
+        return self.inicia()
+
+    def __exit__(self, *args):
+        self.atura()
+
+
+
+class LimitadorSenseEspera(ws.LimitadorHosts):
+    """
+    Limitador per host que no espera mai (ni els 5 segons entre documents pdf que fixa
+    ws.crawlscrape_url_grau()), per a mesurar només el cost de les descàrregues i l'anàlisi.
+    """
+    def __init__(self):
+        super().__init__(0, respecta_crawl_delay = False)
+
+    def espera(self, url, temps_espera = None):
+        pass
+
+
+
+def rss_maxim():
+    """
+    Retorna la memòria resident màxima (en MiB) que ha emprat el procés fins ara, o la d'algun
+    dels seus processos fills (p. ex. els d'anàlisi de ws.crawl_graus()) si és més gran.
+    """
+    return max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)/1024
+
+
+
+def _executa_fill(funcio, connexio):
+    # Cos del procés fill de _mesura(): envia pel canal el resultat (o l'excepció) de funcio(),
+    # el temps transcorregut i la memòria resident màxima del fill
+    try:
+        t_inici = tm.perf_counter()
+        resultat = funcio()
+        connexio.send((resultat, None, tm.perf_counter() - t_inici, rss_maxim()))
+    except BaseException as e:
+        connexio.send((None, e, 0, rss_maxim()))
+    finally:
+        connexio.close()
+
+
+
+def _mesura(servidor, funcio):
+    # Executa funcio() en un procés fill i retorna el seu resultat, el temps transcorregut, les
+    # peticions rebudes pel servidor durant l'execució i la memòria resident màxima (MiB) del
+    # fill. Així la memòria és la de cada objectiu, i no inclou la del servidor ni la dels
+    # objectius mesurats abans. El fill es crea amb 'fork' (com resource, només a Unix) perquè
+    # funcio pot ser una clausura; els fils i les connexions que calguin els crea funcio dins del fill
+    comptadors_inici = collections.Counter(servidor.comptadors)
+    receptor, emissor = multiprocessing.Pipe(duplex = False)
+    fill = multiprocessing.get_context('fork').Process(target = _executa_fill, args = (funcio, emissor))
+    fill.start()
+    emissor.close()
+    try:
+        resultat, excepcio, temps, rss = receptor.recv()
+    finally:
+        receptor.close()
+        fill.join()
+    if excepcio is not None:
+        raise excepcio
+    peticions = collections.Counter(servidor.comptadors)
+    peticions.subtract(comptadors_inici)
+    return resultat, temps, dict(+peticions), rss
+
+
+
+def benchmark_principal(servidor, analitzador = 'bs4', repeticions = 5):
+    """
+    Mesura el temps d'obtenció de la llista de graus amb ws.crawlscrape_url_principal().
+    """
+    temps = []
+    rss = []
+    for r in range(repeticions):
+        (graus, codi_error, missatge_error), t, peticions, rss_fill = _mesura(
+            servidor, lambda: ws.crawlscrape_url_principal(analitzador = analitzador,
+                                                           url = servidor.url_principal))
+        temps.append(t)
+        rss.append(rss_fill)
+    return {'Graus': len(graus), 'Temps (s)': min(temps), 'Peticions': peticions,
+            'RSS màxim (MiB)': max(rss)}
+
+
+
+def benchmark_analisi(servidor, analitzador = 'bs4'):
+    """
+    Mesura el temps d'anàlisi de cada pàgina de grau amb ws.analitza_grau(), sense descàrrega.
+    """
+    pagines = [servidor.pagina_grau(i) for i in range(servidor.nombre_graus)]
+    t_inici = tm.perf_counter()
+    for i, html in enumerate(pagines):
+        ws.analitza_grau(html, str(i), verbose = False, analitzador = analitzador)
+    temps = tm.perf_counter() - t_inici
+    return {'Pàgines': len(pagines), 'Anàlisi per pàgina (ms)': temps/len(pagines)*1000,
+            'Mida mitjana (KiB)': sum(len(x) for x in pagines)/len(pagines)/1024}
+
+
+
+def benchmark_graus(servidor, analitzador = 'bs4', desa_pdfs = False, directori = None):
+    """
+    Mesura l'obtenció seqüencial de tots els graus del servidor amb ws.crawlscrape_url_grau(),
+    sense espera entre peticions. Si desa_pdfs val True, es descarreguen també els documents pdf
+    al directori indicat (per defecte, un directori temporal).
+    """
+    webs_graus, codi_error, missatge_error = ws.crawlscrape_url_principal(url = servidor.url_principal)
+    limitador = LimitadorSenseEspera()
+
+    def crawl(directori):
+        return [ws.crawlscrape_url_grau(w, verbose = False, desa_pdfs = desa_pdfs,
+                                        nom_directori = directori + os.sep, limitador = limitador,
+                                        analitzador = analitzador)
+                for w in webs_graus]
+
+    with tempfile.TemporaryDirectory() as directori_temporal:
+        resultats, temps, peticions, rss = _mesura(servidor,
+                                                   lambda: crawl(directori or directori_temporal))
+    return {'Graus': len(resultats),
+            'Errors': sum(1 for r in resultats if r[1]),
+            'Temps (s)': temps,
+            'Graus/s': len(resultats)/temps,
+            'Pdfs/s': peticions.get('pdf', 0)/temps,
+            'Peticions': peticions,
+            'RSS màxim (MiB)': rss}
+
+
+
+def benchmark_crawl_complet(servidor, analitzador = 'bs4', max_concurrencia = 4, processos = 0,
+                            magatzem = False):
+    """
+    Mesura el bucle principal complet (llista de graus i ws.crawl_graus() amb sortida CSV),
+    sense espera entre peticions. processos és el nombre de processos d'anàlisi de ws.crawl_graus().
+    Si magatzem val True, es descarreguen també els documents pdf a un ws.MagatzemPdf dins d'un
+    directori temporal.
+    """
+    def crawl(directori):
+        webs_graus, codi_error, missatge_error = ws.crawlscrape_url_principal(analitzador = analitzador,
+                                                                               url = servidor.url_principal)
+        magatzem_pdf = ws.MagatzemPdf(os.path.join(directori, 'pdf')) if magatzem else None
+        try:
+            with ws.SortidaCSV(os.path.join(directori, 'dades.csv')) as sortida:
+                return ws.crawl_graus(webs_graus, [sortida], max_concurrencia = max_concurrencia,
+                                      limitador = LimitadorSenseEspera(), analitzador = analitzador,
+                                      intents = 0, verbose = False, magatzem = magatzem_pdf,
+                                      processos = processos)
+        finally:
+            if magatzem_pdf is not None:
+                magatzem_pdf.tanca()
+
+    with tempfile.TemporaryDirectory() as directori:
+        files, temps, peticions, rss = _mesura(servidor, lambda: crawl(directori))
+    return {'Files': files,
+            'Temps (s)': temps,
+            'Graus/s': peticions.get('grau', 0)/temps,
+            'Pdfs/s': peticions.get('pdf', 0)/temps,
+            'Peticions': peticions,
+            'RSS màxim (MiB)': rss}
+
+
+
+####################################
+######## PROGRAMA PRINCIPAL ########
+####################################
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "Mesura el rendiment del scraper contra un servidor "
+                                                   "local que imita upc.edu")
+    parser.add_argument('--graus', type = int, default = 20, help = "nombre de graus (per defecte, 20)")
+    parser.add_argument('--assignatures', type = int, default = 6,
+                        help = "assignatures per semestre (per defecte, 6)")
+    parser.add_argument('--mida-pdf', type = int, default = 200, help = "mida dels pdf en KiB (per defecte, 200)")
+    parser.add_argument('--latencia', type = float, default = 0,
+                        help = "latència del servidor en mil·lisegons (per defecte, 0)")
+    parser.add_argument('--taxa-5xx', type = float, default = 0,
+                        help = "proporció de respostes 503 (per defecte, 0)")
+    parser.add_argument('--taxa-timeouts', type = float, default = 0,
+                        help = "proporció de respostes que superen el timeout (per defecte, 0)")
+    parser.add_argument('--analitzador', choices = sorted(ws.ANALITZADORS), default = 'bs4',
+                        help = "analitzador HTML (per defecte, 'bs4')")
+    parser.add_argument('--concurrencia', type = int, default = 4,
+                        help = "concurrència del crawl complet (per defecte, 4)")
+    parser.add_argument('--processos', type = int, default = 0,
+                        help = "processos d'anàlisi del crawl complet (per defecte, 0)")
+    parser.add_argument('--pdfs', action = 'store_true', help = "descarrega també els documents pdf")
+    parser.add_argument('--duplicats', action = 'store_true',
+                        help = "mesura també l'eliminació de duplicats de mencions")
+    parser.add_argument('--verifica-pagines', metavar = 'DIRECTORI',
+                        help = "només comprova els analitzadors amb les pàgines de grau desades al "
+                               "directori (p. ex. ../html) i en mostra els temps")
+    parser.add_argument('--verifica-arxiu', metavar = 'CAMI',
+                        help = "només comprova els analitzadors amb les pàgines d'un arxiu de crawl")
+    parser.add_argument('--verifica-guies', metavar = 'DIRECTORI',
+                        help = "només comprova l'extracció dels camps amb els textos de guies docents "
+                               "desats al directori (p. ex. ../guies) i en mostra el temps")
+    args = parser.parse_args()
+
+    if args.verifica_pagines or args.verifica_arxiu or args.verifica_guies:
+        if args.verifica_pagines:
+            print("Pàgines de " + args.verifica_pagines + " (s): ", verifica_pagines(args.verifica_pagines))
+        if args.verifica_arxiu:
+            print("Arxiu " + args.verifica_arxiu + " (s): ", verifica_analitzadors(args.verifica_arxiu))
+        if args.verifica_guies:
+            print("Guies de " + args.verifica_guies + " (s): ", verifica_guies(args.verifica_guies))
+        raise SystemExit(0)
+
+    with ServidorFixtures(nombre_graus = args.graus, assignatures_per_semestre = args.assignatures,
+                          mida_pdf = args.mida_pdf*1024, latencia = args.latencia/1000,
+                          taxa_5xx = args.taxa_5xx, taxa_timeouts = args.taxa_timeouts) as servidor:
+        print("Servidor de proves a " + servidor.url)
+        print("crawlscrape_url_principal : ", benchmark_principal(servidor, args.analitzador))
+        print("analitza_grau             : ", benchmark_analisi(servidor, args.analitzador))
+        print("crawlscrape_url_grau      : ", benchmark_graus(servidor, args.analitzador, args.pdfs))
+        print("crawl complet             : ", benchmark_crawl_complet(servidor, args.analitzador,
+                                                                      args.concurrencia, args.processos,
+                                                                      args.pdfs))
+
+    if args.duplicats:
+        print("Eliminació de duplicats d'assignatures de mencions")
+        for r in benchmark_duplicats():
+            print("  {:6d} files   quadràtic: {:9.4f} s   lineal: {:9.4f} s".format(
+                r['Files'], r['Quadràtic (s)'], r['Lineal (s)']))
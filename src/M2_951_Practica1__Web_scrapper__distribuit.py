@@ -0,0 +1,403 @@
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import time as tm
+
+import M2_951_Practica1__Web_scrapper as ws
+
+
+
+class CuaTreball:
+    """
+    Cua de treball compartida (SQLite en mode WAL) per a repartir un crawl entre diversos
+    processos, de la mateixa màquina o de màquines que comparteixin el sistema de fitxers.
+    Cada tasca (un grau o un document pdf) la reclama un treballador amb un lloguer de durada
+    limitada: si el treballador mor abans de completar-la, en vèncer el lloguer un altre la
+    torna a reclamar. La cua també guarda, per host, el moment a partir del qual s'hi pot fer la
+    propera petició, de manera que tots els treballadors respecten conjuntament l'espera entre
+    peticions al mateix host.
+    """
+    def __init__(self, cami, timeout = 60):
+        """
+        Retorna un objecte de classe CuaTreball sobre l'arxiu SQLite cami (que es crea si no
+        existeix). Cada procés ha d'obrir el seu propi objecte CuaTreball. timeout és el temps
+        màxim en segons que s'espera si un altre procés té la base de dades bloquejada.
+        """
+        self.cami = cami
+        self._bd = sqlite3.connect(cami, timeout = timeout, isolation_level = None)
+        self._bd.execute("PRAGMA journal_mode = WAL")
+        self._bd.execute("""CREATE TABLE IF NOT EXISTS tasques (
+                                id INTEGER PRIMARY KEY,
+                                tipus TEXT,
+                                url TEXT,
+                                estat TEXT DEFAULT 'pendent',
+                                treballador TEXT,
+                                venciment REAL,
+                                intents INTEGER DEFAULT 0,
+                                codi_error INTEGER,
+                                missatge_error TEXT,
+                                resultat TEXT,
+                                UNIQUE (tipus, url))""")
+        self._bd.execute("CREATE INDEX IF NOT EXISTS tasques_estat ON tasques (estat, id)")
+        self._bd.execute("""CREATE TABLE IF NOT EXISTS hosts (
+                                host TEXT PRIMARY KEY,
+                                seguent REAL)""")
+
+    def _transaccio(self, funcio):
+        # Executa funcio() dins d'una transacció que bloqueja l'escriptura dels altres processos
+        # des del principi, de manera que dos treballadors no poden reclamar la mateixa tasca
+        self._bd.execute("BEGIN IMMEDIATE")
+        try:
+            resultat = funcio()
+        except:
+            self._bd.execute("ROLLBACK")
+            raise
+        self._bd.execute("COMMIT")
+        return resultat
+
+    def buida(self):
+        """
+        Esborra totes les tasques i els temps dels hosts, per a començar un crawl nou.
+        """
+        def buida():
+            self._bd.execute("DELETE FROM tasques")
+            self._bd.execute("DELETE FROM hosts")
+        self._transaccio(buida)
+
+    def afegeix(self, tipus, urls):
+        """
+        Afegeix a la cua una tasca del tipus indicat ('grau' o 'pdf') per a cada url de urls que
+        encara no hi consti. Retorna el nombre de tasques afegides.
+        """
+        def afegeix():
+            return self._bd.executemany("INSERT OR IGNORE INTO tasques (tipus, url) VALUES (?, ?)",
+                                        [(tipus, url) for url in urls]).rowcount
+        return self._transaccio(afegeix)
+
+    def reclama(self, treballador, durada_lloguer = 300, tipus = ('grau', 'pdf')):
+        """
+        Reclama per a treballador la tasca pendent més antiga (o una d'assignada amb el lloguer
+        vençut) d'algun dels tipus indicats durant durada_lloguer segons. Retorna una tupla
+        (id, tipus, url), o None si no n'hi ha cap de disponible.
+        """
+        def reclama():
+            ara = tm.time()
+            fila = self._bd.execute("""SELECT id, tipus, url FROM tasques
+                                       WHERE (estat = 'pendent' OR (estat = 'assignada' AND venciment < ?))
+                                             AND tipus IN ({})
+                                       ORDER BY id LIMIT 1""".format(', '.join('?'*len(tipus))),
+                                    (ara,) + tuple(tipus)).fetchone()
+            if fila:
+                self._bd.execute("""UPDATE tasques SET estat = 'assignada', treballador = ?, venciment = ?
+                                    WHERE id = ?""", (treballador, ara + durada_lloguer, fila[0]))
+            return fila
+        return self._transaccio(reclama)
+
+    def renova(self, id_tasca, treballador, durada_lloguer = 300):
+        """
+        Allarga durada_lloguer segons el lloguer de la tasca id_tasca. Retorna False si la tasca
+        ja no és de treballador (perquè el lloguer ha vençut i l'ha reclamada un altre).
+        """
+        return self._bd.execute("""UPDATE tasques SET venciment = ?
+                                   WHERE id = ? AND treballador = ? AND estat = 'assignada'""",
+                                (tm.time() + durada_lloguer, id_tasca, treballador)).rowcount == 1
+
+    def completa(self, id_tasca, treballador, codi_error, missatge_error, resultat = None, intents = 0,
+                 reintenta = None):
+        """
+        Registra el resultat de la tasca id_tasca, si encara és de treballador. Si codi_error
+        correspon a un error transitori (vegeu ws.es_error_transitori()), o reintenta val True, i
+        la tasca s'ha intentat menys de intents vegades, torna a quedar pendent. Sinó, queda com a
+        'feta' (o 'error'). resultat ha de ser serialitzable en JSON. Retorna False si la tasca ja
+        no és de treballador.
+        """
+        if reintenta is None:
+            reintenta = ws.es_error_transitori(codi_error)
+
+        def completa():
+            if codi_error and reintenta:
+                actualitzades = self._bd.execute("""UPDATE tasques SET estat = 'pendent', treballador = NULL,
+                                                        intents = intents + 1, codi_error = ?, missatge_error = ?
+                                                    WHERE id = ? AND treballador = ? AND estat = 'assignada'
+                                                        AND intents < ?""",
+                                                 (codi_error, missatge_error, id_tasca, treballador,
+                                                  intents)).rowcount
+                if actualitzades:
+                    return True
+            return self._bd.execute("""UPDATE tasques SET estat = ?, intents = intents + 1, codi_error = ?,
+                                           missatge_error = ?, resultat = ?
+                                       WHERE id = ? AND treballador = ? AND estat = 'assignada'""",
+                                    ('error' if codi_error else 'feta', codi_error, missatge_error,
+                                     json.dumps(resultat, ensure_ascii = False, default = dict) if resultat is not None else None,
+                                     id_tasca, treballador)).rowcount == 1
+        return self._transaccio(completa)
+
+    def reserva_host(self, url, interval):
+        """
+        Reserva el proper torn de petició al host de url, interval segons després del torn
+        anterior reservat per qualsevol treballador. Retorna els segons que cal esperar fins al torn.
+        """
+        host = ws.CauRobots.clau(url)
+        def reserva():
+            ara = tm.time()
+            fila = self._bd.execute("SELECT seguent FROM hosts WHERE host = ?", (host,)).fetchone()
+            torn = max(ara, fila[0]) if fila else ara
+            self._bd.execute("INSERT OR REPLACE INTO hosts VALUES (?, ?)", (host, torn + interval))
+            return torn - ara
+        return self._transaccio(reserva)
+
+    def pendents(self, tipus = ('grau', 'pdf')):
+        """
+        Retorna el nombre de tasques pendents o assignades (encara no acabades) dels tipus indicats.
+        """
+        return self._bd.execute("""SELECT COUNT(*) FROM tasques
+                                   WHERE estat IN ('pendent', 'assignada') AND tipus IN ({})"""
+                                .format(', '.join('?'*len(tipus))), tuple(tipus)).fetchone()[0]
+
+    def estat(self):
+        """
+        Retorna un diccionari {(tipus, estat) : nombre de tasques}.
+        """
+        return {(tipus, estat): n for tipus, estat, n in
+                self._bd.execute("SELECT tipus, estat, COUNT(*) FROM tasques GROUP BY tipus, estat")}
+
+    def resultats(self, tipus = 'grau'):
+        """
+        Genera tuples (url, resultat, codi_error, missatge_error) de les tasques acabades del tipus
+        indicat, en l'ordre en què es van afegir a la cua.
+        """
+        for url, resultat, codi_error, missatge_error in self._bd.execute(
+                """SELECT url, resultat, codi_error, missatge_error FROM tasques
+                   WHERE tipus = ? AND estat IN ('feta', 'error') ORDER BY id""", (tipus,)):
+            yield url, json.loads(resultat) if resultat else None, codi_error, missatge_error
+
+    def tanca(self):
+        """
+        Tanca la connexió amb la cua.
+        """
+        self._bd.close()
+
+
+
+class LimitadorCua(ws.LimitadorHosts):
+    """
+    Limitador per host compartit entre processos a través d'una CuaTreball: totes les peticions
+    al mateix host, les faci el treballador que les faci, s'espaien com a mínim temps_espera
+    segons (o el Crawl-delay del robots.txt del host, si és més gran). Si s'indica la tasca en
+    curs (tupla (id, treballador, durada_lloguer)), se'n renova el lloguer després de cada espera.
+    """
+    def __init__(self, cua, temps_espera = 20, robots = None, agent_usuari = 'ua0000',
+                 respecta_crawl_delay = True):
+        super().__init__(temps_espera, robots = robots, agent_usuari = agent_usuari,
+                         respecta_crawl_delay = respecta_crawl_delay)
+        self.cua = cua
+        self.tasca = None
+
+    def espera(self, url, temps_espera = None):
+        if temps_espera is None:
+            temps_espera = self.temps_espera
+        if self.respecta_crawl_delay:
+            robots = self.robots if self.robots else ws.cau_robots
+            temps_espera = max(temps_espera, robots.crawl_delay(self.agent_usuari, url))
+        segons_espera = self.cua.reserva_host(url, temps_espera)
+        if segons_espera > 0:
+            tm.sleep(segons_espera)
+            ws.metriques.observa('espera', segons_espera, url = url)
+            if self.tasca:
+                self.cua.renova(*self.tasca)
+
+
+
+def treballa(cami_cua, nom = None, temps_espera = 20, analitzador = 'bs4', directori_pdfs = None,
+             durada_lloguer = 300, intents = 3, espera_buida = 1, verbose = True):
+    """
+    Funció que executa un treballador: reclama tasques de la cua cami_cua fins que no en queda
+    cap de pendent, i en desa el resultat a la mateixa cua.
+
+    Paràmetres:
+        cami_cua : camí de la CuaTreball
+        nom : nom del treballador. Per defecte, <màquina>-<pid>
+        temps_espera : temps mínim en segons entre peticions al mateix host, entre tots els
+                       treballadors
+        analitzador : analitzador HTML que es passa a ws.crawlscrape_url_grau()
+        directori_pdfs : directori d'un ws.MagatzemPdf. Si s'indica, per cada grau obtingut
+                         s'afegeixen a la cua els documents pdf de les seves assignatures, que es
+                         desen al magatzem. Si no, el treballador només reclama tasques de grau, i
+                         deixa les de pdf per als treballadors que tenen magatzem
+        durada_lloguer : durada en segons del lloguer de cada tasca (que es renova després de
+                         cada espera per host). Ha de ser més llarga que el temps que pot trigar
+                         cada petició
+        intents : nombre màxim d'intents de les tasques amb errors transitoris, o en què s'ha
+                  produït una excepció (que es registra a la tasca amb codi_error -6 en comptes
+                  d'aturar el treballador)
+        espera_buida : segons que s'espera abans de tornar a mirar la cua quan no hi ha cap tasca
+                       disponible però n'hi ha d'assignades a altres treballadors (que poden fallar)
+    Retorna:
+        nombre de tasques completades pel treballador
+    """
+    if nom is None:
+        nom = '{}-{}'.format(socket.gethostname(), os.getpid())
+    cua = CuaTreball(cami_cua)
+    limitador = LimitadorCua(cua, temps_espera)
+    magatzem = ws.MagatzemPdf(directori_pdfs) if directori_pdfs else None
+    tipus_tasques = ('grau', 'pdf') if magatzem else ('grau',)
+    completades = 0
+    try:
+        while True:
+            tasca = cua.reclama(nom, durada_lloguer, tipus_tasques)
+            if tasca is None:
+                if not cua.pendents(tipus_tasques):
+                    break
+                tm.sleep(espera_buida)
+                continue
+
+            id_tasca, tipus, url = tasca
+            limitador.tasca = (id_tasca, nom, durada_lloguer)
+            reintenta = None
+            try:
+                if tipus == 'grau':
+                    dades, codi_error, missatge_error = ws.crawlscrape_url_grau(url, verbose = verbose,
+                                                                                limitador = limitador,
+                                                                                analitzador = analitzador)
+                    if magatzem and not codi_error:
+                        cua.afegeix('pdf', [a['URL'] for a in dades['Assignatures'] if a['URL']])
+                    resultat = dades if not codi_error else None
+                else:
+                    if magatzem.reutilitza(url):
+                        codi_error, missatge_error = 0, None
+                    else:
+                        limitador.espera(url)
+                        codi_error, missatge_error = ws.descarrega_pdf(url, magatzem = magatzem)
+                    entrada = magatzem.entrada(url)
+                    resultat = entrada['SHA-256'] if entrada and not codi_error else None
+            except Exception as e:
+                # Una pàgina inesperada no ha d'aturar el treballador (ni els següents que
+                # reclamin la tasca): l'excepció es registra a la tasca, que es reintenta fins a
+                # intents vegades i després queda com a 'error'
+                codi_error, missatge_error, resultat = -6, "{}: {}".format(type(e).__name__, e), None
+                reintenta = True
+                if verbose:
+                    print("Error en processar la tasca {}: {}".format(url, missatge_error))
+
+            if cua.completa(id_tasca, nom, codi_error, missatge_error, resultat, intents, reintenta):
+                completades += 1
+            elif verbose:
+                print("El lloguer de la tasca {} ha vençut abans d'acabar-la".format(url))
+    finally:
+        if magatzem:
+            magatzem.tanca()
+        cua.tanca()
+    return completades
+
+
+
+def fusiona(cami_cua, sortides, verbose = True):
+    """
+    Funció que escriu a les sortides (objectes ws.Sortida) les files de dades de tots els graus
+    obtinguts de la cua cami_cua, en l'ordre en què el coordinador els hi va afegir (el mateix
+    que una execució seqüencial). Retorna el nombre de files escrites.
+    """
+    cua = CuaTreball(cami_cua)
+
+    def files():
+        for url, dades, codi_error, missatge_error in cua.resultats('grau'):
+            if codi_error:
+                if verbose:
+                    print("No s'han pogut obtenir les dades de " + url)
+                continue
+            yield from ws.files_grau(dades)
+
+    try:
+        return ws.bolca(files(), sortides)
+    finally:
+        cua.tanca()
+
+
+
+def coordina(cami_cua, nombre_treballadors = 4, url_principal = ws.URL_PRINCIPAL, temps_espera = 20,
+             analitzador = 'bs4', directori_pdfs = None, durada_lloguer = 300, intents = 3,
+             repren = False, verbose = True):
+    """
+    Funció que coordina un crawl distribuït: obté les adreces dels graus de url_principal, les
+    afegeix a la cua cami_cua i hi fa treballar nombre_treballadors processos locals (amb
+    treballa()). Es poden afegir treballadors d'altres màquines que comparteixin l'arxiu de la
+    cua executant aquest mòdul amb l'ordre 'treballa'.
+    Si repren val True, no es buida la cua (les tasques acabades no es tornen a fer).
+    Retorna un diccionari {(tipus, estat) : nombre de tasques} (vegeu CuaTreball.estat()).
+    """
+    webs_graus, codi_error, missatge_error = ws.crawlscrape_url_principal(analitzador = analitzador,
+                                                                           url = url_principal)
+    if codi_error:
+        raise RuntimeError("No s'han pogut obtenir les url dels graus: {} {}".format(codi_error,
+                                                                                    missatge_error))
+    cua = CuaTreball(cami_cua)
+    if not repren:
+        cua.buida()
+    cua.afegeix('grau', webs_graus)
+    # La petició de la pàgina principal compta per a l'espera del seu host
+    cua.reserva_host(url_principal, temps_espera)
+    cua.tanca()
+
+    context = multiprocessing.get_context('spawn')
+    processos = [context.Process(target = treballa,
+                                 args = (cami_cua, None, temps_espera, analitzador, directori_pdfs,
+                                         durada_lloguer, intents, 1, verbose))
+                 for i in range(nombre_treballadors)]
+    for proces in processos:
+        proces.start()
+    for proces in processos:
+        proces.join()
+
+    cua = CuaTreball(cami_cua)
+    try:
+        return cua.estat()
+    finally:
+        cua.tanca()
+
+
+
+####################################
+######## PROGRAMA PRINCIPAL ########
+####################################
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "Crawl distribuït dels graus de la UPC amb una cua "
+                                                   "de treball SQLite compartida")
+    parser.add_argument('ordre', choices = ['coordina', 'treballa', 'fusiona'],
+                        help = "'coordina' omple la cua i hi posa a treballar --treballadors processos; "
+                               "'treballa' afegeix un treballador a una cua existent (des de qualsevol "
+                               "màquina que comparteixi l'arxiu); 'fusiona' escriu els resultats de la "
+                               "cua a --csv")
+    parser.add_argument('--cua', default = 'dades_graus_upc.cua.sqlite',
+                        help = "arxiu SQLite de la cua (per defecte, dades_graus_upc.cua.sqlite)")
+    parser.add_argument('--treballadors', type = int, default = 4,
+                        help = "nombre de processos treballadors locals (per defecte, 4)")
+    parser.add_argument('--espera', type = float, default = 20,
+                        help = "segons mínims entre peticions al mateix host, entre tots els "
+                               "treballadors (per defecte, 20)")
+    parser.add_argument('--analitzador', choices = sorted(ws.ANALITZADORS), default = 'bs4',
+                        help = "analitzador HTML de les pàgines (per defecte, 'bs4')")
+    parser.add_argument('--pdfs', metavar = 'DIRECTORI',
+                        help = "descarrega també els documents pdf de les assignatures al magatzem indicat")
+    parser.add_argument('--url', default = ws.URL_PRINCIPAL,
+                        help = "pàgina principal amb la llista de graus (per defecte, " + ws.URL_PRINCIPAL + ")")
+    parser.add_argument('--resume', action = 'store_true',
+                        help = "no buida la cua: només es fan les tasques que no s'havien acabat")
+    parser.add_argument('--csv', default = 'dades_graus_upc.csv',
+                        help = "fitxer CSV on 'coordina' i 'fusiona' escriuen les dades (per defecte, "
+                               "dades_graus_upc.csv)")
+    args = parser.parse_args()
+
+    if args.ordre == 'treballa':
+        print("Tasques completades: ", treballa(args.cua, temps_espera = args.espera,
+                                               analitzador = args.analitzador, directori_pdfs = args.pdfs))
+    else:
+        if args.ordre == 'coordina':
+            print("Estat de la cua: ", coordina(args.cua, args.treballadors, url_principal = args.url,
+                                                temps_espera = args.espera, analitzador = args.analitzador,
+                                                directori_pdfs = args.pdfs, repren = args.resume))
+        with ws.SortidaCSV(args.csv) as sortida:
+            print("Files escrites: ", fusiona(args.cua, [sortida]))
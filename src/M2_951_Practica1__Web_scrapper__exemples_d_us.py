@@ -1,46 +1,28 @@
-import numpy as np
-import pandas as pd
+import os
 import matplotlib.pyplot as plt
 
-df = pd.read_csv('dades_graus_upc.csv', header = 0, engine = 'python',
-                 dtype = 'str', keep_default_na = False)
+import M2_951_Practica1__Web_scrapper__analisi as an
 
-# Percentatge total d'optativitat
-total_optatives = df.loc[df.loc[:,'Tipus assig'] == 'Optativa',:].shape[0]
-total_assignatures = df.loc[df.loc[:,'Tipus assig'] != '',:].shape[0]
+# Si s'han desat les dades també en format Parquet (opció --parquet del scraper), les carreguem
+# d'aquest fitxer, amb els crèdits en format numèric i els camps de text com a categories.
+# Sinó, les carreguem del fitxer csv. Tots els resums es calculen amb una única agrupació de les
+# dades, i es desen en una cau indexada pel hash del fitxer (no es recalculen si no canvia)
+if os.path.exists('dades_graus_upc.parquet'):
+    resultat = an.resum_fitxer('dades_graus_upc.parquet')
+else:
+    resultat = an.resum_fitxer('dades_graus_upc.csv')
 
-print("Percentatge total d'oferta d'assignatures optatives : {:3.2} %".format(total_optatives/total_assignatures*100))
+# Percentatge total d'optativitat
+print("Percentatge total d'oferta d'assignatures optatives : {:3.2} %".format(resultat['Percentatge optatives']))
 
 # Percentatge total d'optativitat incloent-hi mencions
-total_optatives_i_mencions = df.loc[(df.loc[:,'Tipus assig'] == 'Optativa') | \
-                                    (df.loc[:,'Menció assig'] !=''),:].shape[0]
-
 print("Percentatge total d'ofertad'assignatures optatives i de menció : {:3.2} %".format(
-    total_optatives_i_mencions/total_assignatures*100))
+    resultat['Percentatge optatives i mencions']))
 
 
 # Distribució de crèdits de les assignatures obligatòries, optatives i treballs finals de grau
 
 # Llista per a desar les figures i eixos, per tal que no es perdin
-figures = []
-
-tipus_assignatura = ['Obligatòria', 'Optativa', 'Projecte']
-
-for t in tipus_assignatura:
-    aux = df.loc[df.loc[:,'Tipus assig']==t ,'Crèdits assig'].value_counts()
-
-    # Ordenen els valors de value_counts() passant l'índex de la sèrie resultant a tipus float
-    aux.index = [float(x) for x in aux.index]
-    aux = aux.sort_index()
-    aux.index = [str(x) for x in aux.index]
-    
-    fig = plt.figure()
-    ax = fig.add_subplot(1,1,1, projection = 'rectilinear')
-    ax.bar(aux.index, aux)
-    ax.set_xlabel('Crèdits ECTS')
-    ax.set_ylabel("Nombre d'assignatures")
-    ax.set_title("Tipus d'assignatures : " + t)
-
-    figures.append({'figura': fig, 'eixos': ax})
+figures = an.dibuixa_credits_per_tipus(resultat, ['Obligatòria', 'Optativa', 'Projecte'])
 
 plt.show()
@@ -0,0 +1,276 @@
+import argparse
+import concurrent.futures as cf
+import csv
+import json
+import os
+import re
+import sqlite3
+import time as tm
+
+import M2_951_Practica1__Web_scrapper as ws
+
+
+
+# Versió de l'extracció. Si canvia analitza_text_guia(), cal augmentar-la perquè es tornin a
+# analitzar les guies desades a la cau amb la versió anterior
+VERSIO_EXTRACCIO = 2
+
+# Columnes que s'afegeixen a les files de dades (vegeu ws.CAPCALERA) amb els camps de les guies
+CAPCALERA_GUIA = ['Competències guia',
+                  'Hores totals guia',
+                  'Hores grup gran guia',
+                  'Hores grup mitjà guia',
+                  'Hores grup petit guia',
+                  'Hores activitats dirigides guia',
+                  'Hores aprenentatge autònom guia',
+                  'Avaluació guia']
+
+# Expressions regulars de les hores de dedicació de les guies docents, per columna. Les hores
+# van seguides de 'h' o, a la taula de dedicació, de la columna del percentatge
+_HORES = {'Hores totals guia': r'Dedicaci[óo] total',
+          'Hores grup gran guia': r'Hores grup gran',
+          'Hores grup mitjà guia': r'Hores grup mitj[àa]',
+          'Hores grup petit guia': r'Hores grup petit',
+          'Hores activitats dirigides guia': r'Hores activitats dirigides',
+          'Hores aprenentatge autònom guia': r'Hores aprenentatge aut[òo]nom'}
+_HORES = {columna: re.compile(patro + r'\s*:?\s*(\d+(?:[.,]\d+)?)(?=\s*h\b|\s+\d)', re.IGNORECASE)
+          for columna, patro in _HORES.items()}
+# Codis de competències (específiques, genèriques, transversals, bàsiques...), com ara CE12, CT3
+# o CEC2.1
+_COMPETENCIA = re.compile(r'\b(C[BEGT][A-Z]?\d+(?:\.\d+)?)\b')
+# Seccions de la guia
+_SECCIO_COMPETENCIES = re.compile(r'Compet[èe]ncies de la titulaci[óo].*?(?=Metodologies docents|'
+                                  r'Objectius d.aprenentatge|$)', re.IGNORECASE | re.DOTALL)
+_SECCIO_QUALIFICACIO = re.compile(r'Sistema de qualificaci[óo](.*?)(?=Normes de realitzaci[óo]|'
+                                  r'Bibliografia|$)', re.IGNORECASE | re.DOTALL)
+# Pesos de l'avaluació: una etiqueta seguida (a la mateixa línia) d'un percentatge
+_PES = re.compile(r'([^\n:=%]*?[A-Za-zÀ-ÿ][^\n:=%]*?)\s*[:=(]?\s*(\d{1,3}(?:[.,]\d+)?)\s*%')
+
+
+
+def extreu_text_pdf(cami):
+    """
+    Retorna el text de totes les pàgines del document pdf cami. Requereix pypdf, que només
+    s'importa en cridar aquesta funció.
+    """
+    import pypdf
+
+    lector = pypdf.PdfReader(cami)
+    return '\n'.join(pagina.extract_text() or '' for pagina in lector.pages)
+
+
+
+def analitza_text_guia(text):
+    """
+    Funció que extreu els camps estructurats del text d'una guia docent de la UPC.
+    Retorna un diccionari amb les claus de CAPCALERA_GUIA:
+        'Competències guia' : codis de les competències a què contribueix l'assignatura,
+                              separats per ';' i en l'ordre en què apareixen
+        'Hores ... guia' : hores de dedicació de cada tipus (text numèric amb punt decimal)
+        'Avaluació guia' : pesos de l'avaluació del sistema de qualificació, amb el format
+                           'etiqueta=pes;...' (el pes en percentatge)
+    Els camps que no es troben valen ''.
+    """
+    camps = {columna: '' for columna in CAPCALERA_GUIA}
+
+    seccio = _SECCIO_COMPETENCIES.search(text)
+    codis = _COMPETENCIA.findall(seccio.group(0) if seccio else text)
+    camps['Competències guia'] = ';'.join(dict.fromkeys(codis))
+
+    for columna, patro in _HORES.items():
+        trobat = patro.search(text)
+        if trobat:
+            camps[columna] = trobat.group(1).replace(',', '.')
+
+    seccio = _SECCIO_QUALIFICACIO.search(text)
+    if seccio:
+        pesos = []
+        for etiqueta, pes in _PES.findall(seccio.group(1)):
+            etiqueta = ' '.join(etiqueta.replace(';', ',').split()).strip(' -·•,.')
+            if etiqueta:
+                pesos.append('{}={}'.format(etiqueta, pes.replace(',', '.')))
+        camps['Avaluació guia'] = ';'.join(pesos)
+    return camps
+
+
+
+def extreu_guia(cami):
+    """
+    Funció que extreu els camps d'una guia docent en pdf (vegeu analitza_text_guia()). S'executa
+    als processos de extreu_magatzem().
+    Retorna:
+        camps : diccionari amb els camps de la guia, o None si hi ha hagut algun error
+        missatge_error : None, o el missatge de l'error
+    """
+    try:
+        return analitza_text_guia(extreu_text_pdf(cami)), None
+    except ImportError:
+        raise
+    except Exception as e:
+        return None, "{}: {}".format(type(e).__name__, e)
+
+
+
+class CauGuies:
+    """
+    Cau persistent (SQLite) dels camps extrets de les guies docents, indexada pel resum SHA-256
+    del document: una guia amb el mateix contingut (encara que sigui d'una altra url, o d'una
+    altra execució) no es torna a analitzar mai. Les guies que no s'han pogut analitzar es
+    tornen a intentar en execucions posteriors, fins a max_intents vegades.
+    """
+    def __init__(self, cami, max_intents = 3):
+        """
+        Retorna un objecte de classe CauGuies sobre l'arxiu SQLite cami (que es crea si no existeix).
+        max_intents és el nombre màxim d'intents d'anàlisi de cada guia amb la versió d'extracció
+        actual, si n'hi ha errors.
+        """
+        self.cami = cami
+        self.max_intents = max_intents
+        self._bd = sqlite3.connect(cami)
+        self._bd.execute("PRAGMA journal_mode = WAL")
+        self._bd.execute("""CREATE TABLE IF NOT EXISTS guies (
+                                sha256 TEXT PRIMARY KEY,
+                                versio INTEGER,
+                                camps TEXT,
+                                missatge_error TEXT,
+                                extret REAL,
+                                intents INTEGER)""")
+        # Les caus creades abans que es comptessin els intents no tenen la columna
+        if 'intents' not in [fila[1] for fila in self._bd.execute("PRAGMA table_info(guies)")]:
+            self._bd.execute("ALTER TABLE guies ADD COLUMN intents INTEGER DEFAULT 1")
+        self._bd.commit()
+
+    def camps(self, sha256):
+        """
+        Retorna el diccionari de camps de la guia amb resum sha256, o None si no és a la cau (o
+        no se n'han pogut extreure).
+        """
+        fila = self._bd.execute("SELECT camps FROM guies WHERE sha256 = ? AND versio = ?",
+                                (sha256, VERSIO_EXTRACCIO)).fetchone()
+        return json.loads(fila[0]) if fila and fila[0] else None
+
+    def pendents(self, resums):
+        """
+        Retorna la llista dels resums de resums que no són a la cau amb la versió d'extracció actual,
+        o que no se n'han pogut extreure els camps i encara no s'han intentat max_intents vegades.
+        """
+        fets = {fila[0] for fila in self._bd.execute("""SELECT sha256 FROM guies
+                                                         WHERE versio = ? AND (camps IS NOT NULL OR
+                                                                               intents >= ?)""",
+                                                      (VERSIO_EXTRACCIO, self.max_intents))}
+        return [resum for resum in resums if resum not in fets]
+
+    def desa(self, sha256, camps, missatge_error = None):
+        """
+        Desa a la cau els camps (o l'error) de la guia amb resum sha256, i en compta l'intent.
+        """
+        self._bd.execute("""INSERT INTO guies (sha256, versio, camps, missatge_error, extret, intents)
+                            VALUES (?, ?, ?, ?, ?, 1)
+                            ON CONFLICT (sha256) DO UPDATE SET versio = excluded.versio,
+                                camps = excluded.camps, missatge_error = excluded.missatge_error,
+                                extret = excluded.extret,
+                                intents = CASE WHEN versio = excluded.versio THEN intents + 1 ELSE 1 END""",
+                         (sha256, VERSIO_EXTRACCIO,
+                          json.dumps(camps, ensure_ascii = False) if camps is not None else None,
+                          missatge_error, tm.time()))
+        self._bd.commit()
+
+    def tanca(self):
+        """
+        Tanca la cau.
+        """
+        self._bd.close()
+
+
+
+def extreu_magatzem(magatzem, cau, processos = None, verbose = True):
+    """
+    Funció que extreu els camps de totes les guies docents d'un ws.MagatzemPdf que encara no són
+    a la cau (objecte CauGuies), repartint-les entre processos processos (per defecte, tants com
+    nuclis). Cada resultat es desa a la cau en el moment d'obtenir-lo, de manera que si
+    l'execució s'interromp no es perd la feina feta.
+    Retorna un diccionari {'Guies', 'Extretes', 'Errors'}: nombre de documents del magatzem,
+    nombre de documents analitzats en aquesta execució i nombre d'errors.
+    """
+    resums = magatzem.resums()
+    pendents = [resum for resum in cau.pendents(resums) if os.path.exists(magatzem.cami_objecte(resum))]
+    errors = 0
+    if pendents:
+        with cf.ProcessPoolExecutor(processos) as executor:
+            camins = [magatzem.cami_objecte(resum) for resum in pendents]
+            for resum, (camps, missatge_error) in zip(pendents,
+                                                      executor.map(extreu_guia, camins, chunksize = 8)):
+                cau.desa(resum, camps, missatge_error)
+                if missatge_error:
+                    errors += 1
+                    if verbose:
+                        print("No s'ha pogut analitzar la guia " + magatzem.cami_objecte(resum) +
+                              ": " + missatge_error)
+    return {'Guies': len(resums), 'Extretes': len(pendents), 'Errors': errors}
+
+
+
+def enriqueix_files(files, magatzem, cau):
+    """
+    Funció que genera les files de dades de l'iterable files (amb les columnes de ws.CAPCALERA)
+    amb les columnes de CAPCALERA_GUIA afegides al final, a partir de la guia docent de l'URL de
+    l'assignatura desada al magatzem (ws.MagatzemPdf) i analitzada a la cau (CauGuies). Si
+    l'assignatura no en té, les columnes afegides valen ''.
+    """
+    columna_url = ws.CAPCALERA.index('URL assig')
+    buides = [''] * len(CAPCALERA_GUIA)
+    for fila in files:
+        camps = None
+        if fila[columna_url]:
+            entrada = magatzem.entrada(fila[columna_url])
+            if entrada:
+                camps = cau.camps(entrada['SHA-256'])
+        yield list(fila) + ([camps[columna] for columna in CAPCALERA_GUIA] if camps else buides)
+
+
+
+def enriqueix_csv(cami_csv, cami_sortida, magatzem, cau, codificacio = None):
+    """
+    Funció que escriu a cami_sortida el fitxer de dades cami_csv (amb el format de
+    dades_graus_upc.csv) amb les columnes de les guies docents afegides (vegeu enriqueix_files()),
+    amb tots els camps entre cometes com a ws.SortidaCSV.
+    Retorna el nombre de files escrites.
+    """
+    with open(cami_csv, newline = '', encoding = codificacio) as f_entrada, \
+         open(cami_sortida, 'w', newline = '', encoding = codificacio) as f_sortida:
+        lector = csv.reader(f_entrada)
+        next(lector)
+        escriptor = csv.writer(f_sortida, delimiter = ',', quoting = csv.QUOTE_ALL)
+        escriptor.writerow(ws.CAPCALERA + CAPCALERA_GUIA)
+        nombre_files = 0
+        for fila in enriqueix_files(lector, magatzem, cau):
+            escriptor.writerow(fila)
+            nombre_files += 1
+        return nombre_files
+
+
+
+####################################
+######## PROGRAMA PRINCIPAL ########
+####################################
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "Extreu els camps de les guies docents del magatzem de "
+                                                   "pdf i els afegeix a les files de dades de les assignatures")
+    parser.add_argument('magatzem', help = "directori del magatzem de pdf (opció --pdfs del scraper)")
+    parser.add_argument('--csv', default = 'dades_graus_upc.csv',
+                        help = "fitxer de dades d'entrada (per defecte, dades_graus_upc.csv)")
+    parser.add_argument('--sortida', default = 'dades_graus_upc_guies.csv',
+                        help = "fitxer de dades de sortida (per defecte, dades_graus_upc_guies.csv)")
+    parser.add_argument('--cau', default = 'dades_graus_upc.guies.sqlite',
+                        help = "cau dels camps extrets (per defecte, dades_graus_upc.guies.sqlite)")
+    parser.add_argument('--processos', type = int, default = None,
+                        help = "nombre de processos d'extracció (per defecte, tants com nuclis)")
+    args = parser.parse_args()
+
+    magatzem = ws.MagatzemPdf(args.magatzem)
+    cau = CauGuies(args.cau)
+    print("Extracció de les guies: ", extreu_magatzem(magatzem, cau, args.processos))
+    print("Files escrites: ", enriqueix_csv(args.csv, args.sortida, magatzem, cau))
+    cau.tanca()
+    magatzem.tanca()